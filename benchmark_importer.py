@@ -0,0 +1,108 @@
+"""Rows per second of the perp_location insert strategies against the local
+SQLite backend.
+
+    python benchmark_importer.py --rows 20000 --latency 0.02
+
+Strategies:
+    single   one insert request per row (insert_perp_locations.py --insert)
+    batched  one request per --batch-size rows (--insert --batch-size N)
+    async    batches sent from --workers threads at once, so the round trips overlap
+
+--latency adds that many seconds to every request to stand in for the
+PostgREST round trip, which is what dominates against Supabase.  With no
+latency the numbers only compare SQLite's own per-statement cost.
+"""
+
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from importer_backends import SqliteBackend, chunks
+
+STRATEGIES = ('single', 'batched', 'async')
+
+
+def make_rows(backend: SqliteBackend, count: int, seed: int = 1) -> List[dict]:
+    """count perp_location rows over a small set of perps and locations."""
+    rng = random.Random(seed)
+    perps = [backend.add_perp(f"Perp {i}") for i in range(200)]
+    locations = [backend.add_location('Canada', f"Province {i % 10}", f"Town {i}") for i in range(500)]
+    rows = []
+    for _ in range(count):
+        year = rng.randint(1900, 2000)
+        rows.append({
+            'perp_recid': rng.choice(perps),
+            'location_recid': rng.choice(locations),
+            'start_date': f"{year}-01-01",
+            'end_date': f"{year}-12-31",
+            'note': rng.choice((None, 'Convention', 'Workers List', "Visiting O'Brien\tfamily")),
+            'created_by': 'script',
+            'changed_by': 'script',
+            'created_date': '2024-01-01',
+            'changed_date': '2024-01-01',
+        })
+    return rows
+
+
+def insert_single(backend: SqliteBackend, rows: List[dict], batch_size: int, workers: int) -> None:
+    for row in rows:
+        backend.insert_perp_locations([row])
+
+
+def insert_batched(backend: SqliteBackend, rows: List[dict], batch_size: int, workers: int) -> None:
+    for batch in chunks(rows, batch_size):
+        backend.insert_perp_locations(batch)
+
+
+def insert_async(backend: SqliteBackend, rows: List[dict], batch_size: int, workers: int) -> None:
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(backend.insert_perp_locations, batch) for batch in chunks(rows, batch_size)]:
+            future.result()
+
+
+INSERTERS: Dict[str, Callable] = {
+    'single': insert_single,
+    'batched': insert_batched,
+    'async': insert_async,
+}
+
+
+def run(strategy: str, rows: int, batch_size: int, workers: int, latency: float) -> Dict:
+    """Time one strategy on a fresh in-memory database."""
+    backend = SqliteBackend(':memory:', latency=latency)
+    data = make_rows(backend, rows)
+    backend.requests = 0
+    started = time.perf_counter()
+    INSERTERS[strategy](backend, data, batch_size, workers)
+    elapsed = time.perf_counter() - started
+    inserted = backend.count_perp_locations()
+    backend.close()
+    if inserted != rows:
+        raise RuntimeError(f"{strategy}: inserted {inserted} of {rows} rows")
+    return {'strategy': strategy, 'rows': rows, 'requests': backend.requests, 'seconds': elapsed,
+            'rows_per_sec': rows / elapsed if elapsed else float('inf')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark perp_location insert strategies against SQLite')
+    parser.add_argument('--rows', type=int, default=10000, help='Rows to insert (default: 10000)')
+    parser.add_argument('--batch-size', type=int, default=500, help='Rows per request for batched and async (default: 500)')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent requests for async (default: 4)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request (default: 0)')
+    parser.add_argument('--strategy', choices=STRATEGIES, action='append',
+                        help='Strategy to run, may be repeated (default: all)')
+    args = parser.parse_args()
+
+    print(f"{'strategy':<10} {'rows':>8} {'requests':>9} {'seconds':>9} {'rows/sec':>10}")
+    for strategy in args.strategy or STRATEGIES:
+        result = run(strategy, args.rows, args.batch_size, args.workers, args.latency)
+        print(f"{result['strategy']:<10} {result['rows']:>8} {result['requests']:>9} "
+              f"{result['seconds']:>9.3f} {result['rows_per_sec']:>10.0f}")
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
 import math
+import os
 import re
+import sys
+import tempfile
 import countries_data
 from collections import defaultdict
 import argparse
@@ -7,6 +10,8 @@ import argparse
 YELLOW = '\033[93m'
 RESET = '\033[0m'
 
+NO_STATE = '--No State--'
+
 # Global flags for command line options
 args = None
 
@@ -30,6 +35,8 @@ def parse_args():
     parser.add_argument('--detail', action='store_true', help='Show detailed processing information')
     parser.add_argument('--deduped', action='store_true', help='Show deduplicated location data')
     parser.add_argument('--countries', action='store_true', help='Show countries data structure')
+    parser.add_argument('--input', default='wl.txt', help='Workers list file to read (default: wl.txt)')
+    parser.add_argument('--output', help='With --countries, write the new countries_data.py here instead of the console')
     
     args = parser.parse_args()
     
@@ -93,15 +100,14 @@ def add_note(the_note, after_params):
         return after_params
     return f"{the_note}, {after_params}"
 
-def process_line(line, line_number, data_structure):
+def parse_line(line):
     """
-    Process a single line from the file and store in data structure
+    Parse a single line from the workers list
     Args:
         line (str): The line to process
-        line_number (int): The line number in the file
-        data_structure (dict): The nested dictionary to store the data
     Returns:
-        tuple: (length of the_front, length of everything_else)
+        tuple: (country, state, location, note, length of the_front, length of everything_else)
+               or None if nothing is left once the months are removed
     """
 
     original_line = line
@@ -129,7 +135,7 @@ def process_line(line, line_number, data_structure):
     
     # Skip if line is empty after pattern removal
     if not line:
-        return 0, 0
+        return None
         
     # Check if any patterns were removed
     pattern_removed = line != original_line.strip()
@@ -402,13 +408,29 @@ def process_line(line, line_number, data_structure):
     the_field = ', '.join(parts)
 
 
-    # Instead of printing, store in data structure
     country = the_country if the_country else '--No Country--'
-    state = the_front if len(the_front) else '--No State--'
+    state = the_front if len(the_front) else NO_STATE
     location = the_field
 
+    return country, state, location, the_note, len(the_front), len(everything_else)
+
+def process_line(line, line_number, data_structure):
+    """
+    Process a single line from the file and store in data structure
+    Args:
+        line (str): The line to process
+        line_number (int): The line number in the file
+        data_structure (dict): The nested dictionary to store the data
+    Returns:
+        tuple: (length of the_front, length of everything_else)
+    """
+    record = parse_line(line)
+    if record is None:
+        return 0, 0
+    country, state, location, the_note, front_length, everything_else_length = record
+
     if args.detail:
-        print(f"{country}|{state}|{location}|{the_note}|{original_line}")
+        print(f"{country}|{state}|{location}|{the_note}|{line}")
     
     # Create nested structure if it doesn't exist
     if country not in data_structure:
@@ -422,35 +444,49 @@ def process_line(line, line_number, data_structure):
 
     data_structure[country][state].add(location)
     
-    return len(the_front), len(everything_else)
+    return front_length, everything_else_length
+
+def format_city_states(states):
+    """
+    Format the value of a cities entry: a list of states, or a single state in older data
+    """
+    if isinstance(states, str):
+        return f"'{states}'"
+    return "[" + ", ".join(f"'{state}'" for state in states) + "]"
 
-def print_countries(data_structure):
+def print_countries(data_structure, out=None):
     """
     Print the data structure in sorted order with pipe separators
     Args:
         data_structure (dict): The nested dictionary containing the data
+        out (file): Where to write, defaults to the console
     """
+    out = out if out is not None else sys.stdout
+
+    def emit(text):
+        out.write(text + "\n")
+
     def word_count_sort_key(text):
         # Count words considering both spaces and forward slashes as delimiters
         word_count = len(re.split(r'[\s/]+', text))
         # Return tuple for sorting - word count first (negative for reverse sort), then alphabetical
         return (-word_count, text)
 
-    print('"""Data structure containing country information including states, variations, and cities."""')
+    emit('"""Data structure containing country information including states, variations, and cities."""')
 
-    print("\ncountries = {")
+    emit("\ncountries = {")
 
     # Sort countries by word count and then alphabetically
     sorted_countries = sorted(data_structure.keys(), key=word_count_sort_key)
     
     for country in sorted_countries:
         country_info = data_structure[country]
-        print(f"   '{country}': {{")
-        print(f"      'name': '{country_info['name']}',")
+        emit(f"   '{country}': {{")
+        emit(f"      'name': '{country_info['name']}',")
         
         # Print states if they exist
         if 'states' in country_info:
-            print("      'states': [")
+            emit("      'states': [")
             # Sort states by word count and then alphabetically
             states = sorted(country_info['states'], key=word_count_sort_key)
             
@@ -464,7 +500,7 @@ def print_countries(data_structure):
                 # If word count changes, print current line and start new line
                 if current_word_count is not None and word_count != current_word_count:
                     if current_line_states:
-                        print("        " + ", ".join(f"'{state}'" for state in current_line_states) + ",")
+                        emit("        " + ", ".join(f"'{state}'" for state in current_line_states) + ",")
                         current_line_states = []
                 
                 current_word_count = word_count
@@ -472,18 +508,18 @@ def print_countries(data_structure):
                 
                 # Print line when we have 7 states
                 if len(current_line_states) == 7:
-                    print("        " + ", ".join(f"'{state}'" for state in current_line_states) + ",")
+                    emit("        " + ", ".join(f"'{state}'" for state in current_line_states) + ",")
                     current_line_states = []
             
             # Print any remaining states
             if current_line_states:
-                print("        " + ", ".join(f"'{state}'" for state in current_line_states) + ",")
+                emit("        " + ", ".join(f"'{state}'" for state in current_line_states) + ",")
                 
-            print("      ],")
+            emit("      ],")
         
         # Print cities if they exist
         if 'cities' in country_info:
-            print("      'cities': {")
+            emit("      'cities': {")
             
             # Sort cities by word count and then alphabetically
             city_items = sorted(country_info['cities'].items(), key=lambda x: word_count_sort_key(x[0]))
@@ -499,9 +535,9 @@ def print_countries(data_structure):
                 if current_word_count is not None and word_count != current_word_count:
                     for c, s in current_cities:
                         escaped_city = c.replace("'", "\\'")
-                        print(f"        '{escaped_city}': '{s}',")
+                        emit(f"        '{escaped_city}': {format_city_states(s)},")
                     if word_count != -len(re.split(r'[\s/]+', city_items[-1][0])):  # Don't print newline after last group
-                        print("")
+                        emit("")
                     current_cities = []
                 
                 current_word_count = word_count
@@ -511,33 +547,128 @@ def print_countries(data_structure):
             if current_cities:
                 for city, state in current_cities:
                     escaped_city = city.replace("'", "\\'")
-                    print(f"        '{escaped_city}': '{state}',")
+                    emit(f"        '{escaped_city}': {format_city_states(state)},")
                 
-            print("      },")
+            emit("      },")
         
         # Print special_location if it exists
         if 'special_location' in country_info:
-            print(f"      'special_location': '{country_info['special_location']}',")
+            emit(f"      'special_location': '{country_info['special_location']}',")
         
         # Print variations if they exist
         if 'variations' in country_info:
-            print("      'variations': [")
-            print("        " + ", ".join(f"'{var}'" for var in sorted(country_info['variations'])))
-            print("      ],")
+            emit("      'variations': [")
+            emit("        " + ", ".join(f"'{var}'" for var in sorted(country_info['variations'])))
+            emit("      ],")
         
         # Print state_variations if they exist
         if 'state_variations' in country_info:
-            print("      'state_variations': {")
+            emit("      'state_variations': {")
             # Sort state variations by code and print each on a new line with comma
             sorted_variations = sorted(country_info['state_variations'].items())
             for i, (var, full) in enumerate(sorted_variations):
                 # Add comma if not the last item
                 comma = "," if i < len(sorted_variations) - 1 else ""
-                print(f"        '{var}': '{full}'{comma}")
-            print("      },")
+                emit(f"        '{var}': '{full}'{comma}")
+            emit("      },")
             
-        print("   },")
-    print("}")
+        emit("   },")
+    emit("}")
+
+def slash_sort_key(state):
+    # Count the number of slashes in the state name
+    slash_count = state.count('/')
+    # Return a tuple where first element is negative slash count (so higher counts come first)
+    # and second element is the state name for alphabetical sorting within same slash count
+    return (-slash_count, state)
+
+def country_sort_key(country):
+    # Return a tuple where first element is negative word count (so higher counts come first)
+    # and second element is the country name for alphabetical sorting within same word count
+    return (-len(country.split()), country)
+
+class GazetteerMerge:
+    """
+    Merges workers list records into a countries dict one record at a time.
+    Only the countries that gain a state or city, or have cities with an
+    empty state fixed, are re-sorted by finish(), everything else is left as
+    it was loaded.
+    """
+    def __init__(self, countries):
+        self.countries = countries
+        self.changed = set()
+        self.added = False
+        self._states = {}  # country -> set of its states, built on first use
+        self._checked_empty_states = False  # add() never stores an empty state, so all countries are checked once
+
+    def add(self, country, state, location):
+        """
+        Add one (country, state, location) record
+        """
+        country_info = self.countries.get(country)
+        if country_info is None:
+            country_info = self.countries[country] = {'name': country, 'states': [], 'cities': {}}
+            self.added = True
+            self.changed.add(country)
+
+        states = self._states.get(country)
+        if states is None:
+            states = self._states[country] = set(country_info['states'])
+
+        # If state is blank or empty string, use "--No State--"
+        effective_state = state if state and state.strip() else NO_STATE
+        if effective_state not in states:
+            states.add(effective_state)
+            country_info['states'].append(effective_state)
+            self.changed.add(country)
+
+        if location not in country_info['cities']:
+            country_info['cities'][location] = [effective_state]
+            self.changed.add(country)
+
+    def finish(self):
+        """
+        Sort the changed countries and return the countries dict
+        """
+        if not self._checked_empty_states:
+            for country, country_info in self.countries.items():
+                if self._fix_empty_states(country, country_info):
+                    self.changed.add(country)
+            self._checked_empty_states = True
+
+        for country in self.changed:
+            country_info = self.countries[country]
+            self._fix_empty_states(country, country_info)
+
+            # Sort states by slash count and then alphabetically
+            country_info['states'].sort(key=slash_sort_key)
+            # Sort cities by state then city name
+            country_info['cities'] = dict(sorted(country_info['cities'].items(), key=lambda item: (item[1], item[0])))
+            # Sort state_variations by code if they exist
+            if 'state_variations' in country_info:
+                country_info['state_variations'] = dict(sorted(country_info['state_variations'].items()))
+
+        # Countries only need reordering when one was added
+        if self.added:
+            self.countries = dict(sorted(self.countries.items(), key=lambda x: country_sort_key(x[0])))
+        self.changed.clear()
+        self.added = False
+        return self.countries
+
+    def _fix_empty_states(self, country, country_info):
+        """
+        Put cities with an empty state under --No State--.  Returns True if any were fixed
+        """
+        fixed = False
+        for city, state in list(country_info['cities'].items()):
+            if not state or (isinstance(state, str) and not state.strip()):
+                country_info['cities'][city] = [NO_STATE]
+                fixed = True
+                if NO_STATE not in country_info['states']:
+                    country_info['states'].append(NO_STATE)
+                    if country in self._states:
+                        self._states[country].add(NO_STATE)
+        return fixed
 
 def update_countries_data(data_structure):
     """
@@ -545,86 +676,46 @@ def update_countries_data(data_structure):
     Args:
         data_structure (dict): The nested dictionary containing the new data
     """
-    def slash_sort_key(state):
-        # Count the number of slashes in the state name
-        slash_count = state.count('/')
-        # Return a tuple where first element is negative slash count (so higher counts come first)
-        # and second element is the state name for alphabetical sorting within same slash count
-        return (-slash_count, state)
-
-    def word_count_sort_key(country):
-        # Return a tuple where first element is negative word count (so higher counts come first)
-        # and second element is the country name for alphabetical sorting within same word count
-        return (-len(country.split()), country)
-
-    # Step 1: Add any missing countries
-    for country in data_structure:
-        if country not in countries_data.countries:
-            countries_data.countries[country] = {
-                'name': country,
-                'states': [],
-                'cities': {}
-            }
-    
-    # Step 2: Add any missing states and cities
+    merge = GazetteerMerge(countries_data.countries)
     for country, states in data_structure.items():
-        country_info = countries_data.countries[country]
-        
-        # Add any missing states
-        for state in states:
-            if state not in country_info['states']:
-                country_info['states'].append(state)
-        
-        # Add any missing cities
         for state, cities in states.items():
             for city in cities:
-                if city not in country_info['cities']:
-                    # If state is blank or empty string, use "--No State--"
-                    effective_state = state if state and state.strip() else "--No State--"
-                    country_info['cities'][city] = effective_state
-                    # Ensure "--No State--" exists in states list if needed
-                    if effective_state == "--No State--" and effective_state not in country_info['states']:
-                        country_info['states'].append(effective_state)
-    
-    # Step 3: Fix any existing cities with empty states
-    for country_info in countries_data.countries.values():
-        # Fix any cities with empty states
-        for city, state in list(country_info['cities'].items()):
-            if not state or not state.strip():
-                country_info['cities'][city] = "--No State--"
-                if "--No State--" not in country_info['states']:
-                    country_info['states'].append("--No State--")
-    
-    # Step 4: Sort and organize the data
-    # First, sort countries by word count and then alphabetically
-    countries_data.countries = dict(sorted(countries_data.countries.items(), key=lambda x: word_count_sort_key(x[0])))
-    
-    for country_info in countries_data.countries.values():
-        # Sort states by slash count and then alphabetically
-        country_info['states'].sort(key=slash_sort_key)
-        
-        # Sort cities by state then city name
-        # First, create a list of tuples (state, city) for sorting
-        city_tuples = [(state, city) for city, state in country_info['cities'].items()]
-        city_tuples.sort()  # This sorts by state first, then city
-        
-        # Reconstruct the cities dictionary in sorted order
-        country_info['cities'] = {city: state for state, city in city_tuples}
-        
-        # Sort state_variations by code if they exist
-        if 'state_variations' in country_info:
-            country_info['state_variations'] = dict(sorted(country_info['state_variations'].items()))
+                merge.add(country, state, city)
+    countries_data.countries = merge.finish()
+
+def write_countries_file(countries, path):
+    """
+    Write countries_data.py content to path.  It is written to a temporary
+    file in the same directory first and then renamed over path, so a failed
+    run never leaves a half written gazetteer behind.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.countries_data.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            print_countries(countries, out)
+        # mkstemp makes the file owner only, give it the mode countries_data.py already has,
+        # or the umask default for a new file
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
 
 def process_wl_file():
     try:
-        # Initialize the data structure as a simple dictionary
-        data_structure = {}
+        merge = GazetteerMerge(countries_data.countries)
+        # Only kept for --deduped, which has to see every location
+        data_structure = {} if args.deduped else None
         
-        max_front_length = 0
-        max_everything_else_length = 0
-        
-        with open('wl.txt', 'r', encoding='utf-8') as file:
-            for line_number, line in enumerate(file, 1):
+        with open(args.input, 'r', encoding='utf-8') as file:
+            for line in file:
                 # Remove trailing whitespace and newlines
                 line = line.strip()
                 
@@ -632,23 +723,32 @@ def process_wl_file():
                 if not line:
                     continue
                     
-                # Process each line using the process_line function
-                front_length, everything_else_length = process_line(line, line_number, data_structure)
-                if front_length > max_front_length:
-                    max_front_length = front_length
-                if everything_else_length > max_everything_else_length:
-                    max_everything_else_length = everything_else_length
+                record = parse_line(line)
+                if record is None:
+                    continue
+                country, state, location, the_note, _, _ = record
+
+                if args.detail:
+                    print(f"{country}|{state}|{location}|{the_note}|{line}")
+                    continue
+
+                merge.add(country, state, location)
+                if data_structure is not None:
+                    data_structure.setdefault(country, {}).setdefault(state, set()).add(location)
         
         # Handle output based on command line flags
         if not args.detail:
-            update_countries_data(data_structure)
+            countries_data.countries = merge.finish()
             if args.countries:
-                print_countries(countries_data.countries)
+                if args.output:
+                    write_countries_file(countries_data.countries, args.output)
+                else:
+                    print_countries(countries_data.countries)
             if args.deduped:
                 print_deduped_data(data_structure)
                 
     except FileNotFoundError:
-        print("Error: wl.txt file not found")
+        print(f"Error: {args.input} file not found")
     except Exception as e:
         print(f"Error processing file: {str(e)}")
 
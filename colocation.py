@@ -0,0 +1,113 @@
+"""Every pair of perps that were at the same place in overlapping periods.
+
+Reads the same resolved rows as interval_index.py (process_locations.py
+output or an insert_perp_locations.py --resolved-csv file), groups them by
+location (or state, or country), and sweeps each group in start date order.
+The rows still open are kept in a heap by end date and grouped by perp, so
+each row is paired with exactly the other perps' rows it overlaps.  The whole corpus costs
+O(n log n + pairs) instead of comparing every row with every other row.
+
+    python colocation.py abc2.txt
+    python colocation.py abc2.txt --type "Workers List" --type Convention --level state
+
+Output is pipe delimited, one line per pair of overlapping rows:
+perp|other perp|country|state|location|overlap start|overlap end|type|other type
+The number of overlapping rows per pair of perps goes to stderr.
+"""
+
+import argparse
+import heapq
+import sys
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from interval_index import LEVELS, Interval, level_key, read_intervals
+
+OUTPUT_COLUMNS = ('perp', 'other_perp', 'country', 'state', 'location', 'overlap_start', 'overlap_end',
+                  'type', 'other_type')
+
+
+class Colocation(NamedTuple):
+    place: Tuple[str, ...]
+    first: Interval     # the row of the perp whose name sorts first
+    second: Interval
+    start: str          # overlap window
+    end: str
+
+
+def _pair(place: Tuple[str, ...], a: Interval, b: Interval) -> Colocation:
+    if (b.perp, b.start) < (a.perp, a.start):
+        a, b = b, a
+    return Colocation(place, a, b, max(a.start, b.start), min(a.end, b.end))
+
+
+def sweep(place: Tuple[str, ...], intervals: Sequence[Interval]) -> Iterator[Colocation]:
+    """Overlapping pairs of rows of different perps within one place.  The
+    open rows are grouped by perp, so a perp's own open rows are skipped in
+    one step and every row visited yields a pair."""
+    ordered = sorted(intervals)
+    active: Dict[str, Dict[int, Interval]] = {}   # perp -> its open rows
+    ends: List[Tuple[str, int]] = []
+    for i, interval in enumerate(ordered):
+        # Close the rows that ended before this one starts
+        while ends and ends[0][0] < interval.start:
+            closed = heapq.heappop(ends)[1]
+            perp = ordered[closed].perp
+            del active[perp][closed]
+            if not active[perp]:
+                del active[perp]
+        for perp, rows in active.items():
+            if perp != interval.perp:
+                for other in rows.values():
+                    yield _pair(place, other, interval)
+        active.setdefault(interval.perp, {})[i] = interval
+        heapq.heappush(ends, (interval.end, i))
+
+
+def colocations(intervals: Iterable[Interval], level: str = 'location',
+                types: Optional[Iterable[str]] = None) -> Iterator[Colocation]:
+    """All overlapping pairs at the same place, place by place in name order.
+    types limits both rows of a pair to those types."""
+    wanted = set(types) if types else None
+    groups: Dict[Tuple[str, ...], List[Interval]] = {}
+    for interval in intervals:
+        if wanted is None or interval.type in wanted:
+            groups.setdefault(level_key(interval, level), []).append(interval)
+    for place in sorted(groups):
+        yield from sweep(place, groups[place])
+
+
+def format_colocation(colocation: Colocation) -> str:
+    place = list(colocation.place) + [''] * (3 - len(colocation.place))
+    return '|'.join([colocation.first.perp, colocation.second.perp, *place, colocation.start, colocation.end,
+                     colocation.first.type, colocation.second.type])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pairs of perps at the same place in overlapping periods')
+    parser.add_argument('input', help='process_locations.py output or an insert_perp_locations.py --resolved-csv file')
+    parser.add_argument('--level', choices=LEVELS, default='location', help='Place level to compare at (default: location)')
+    parser.add_argument('--type', action='append', dest='types', metavar='TYPE',
+                        help='Only rows of this type, e.g. "Workers List", Convention, "Special Meeting".  May be repeated')
+    args = parser.parse_args()
+
+    try:
+        intervals = list(read_intervals(args.input))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    pair_counts: Counter = Counter()
+    out = sys.stdout
+    out.write('|'.join(OUTPUT_COLUMNS) + '\n')
+    for colocation in colocations(intervals, args.level, args.types):
+        out.write(format_colocation(colocation) + '\n')
+        pair_counts[(colocation.first.perp, colocation.second.perp)] += 1
+
+    print(f"{sum(pair_counts.values())} overlapping rows between {len(pair_counts)} pairs of perps", file=sys.stderr)
+    for (perp, other), count in pair_counts.most_common():
+        print(f"{count:>8}  {perp} / {other}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
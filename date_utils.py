@@ -0,0 +1,110 @@
+"""Month and season names and the date resolution shared by
+process_locations.py and insert_perp_locations.py.
+
+process_locations.py writes Year ('1950' or '1950-1952'), Start Date and
+End Date ('MM/DD') and Month ('Jul', 'Jan-July', 'Winter-Spring') as found
+in the line.  resolve_dates() turns those into the ISO start and end dates
+stored in perp_location.  The parser calls it once per row and writes the
+result in the ISO Start Date and ISO End Date columns, so the importer
+only has to pass them through.
+"""
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+MONTH_NUMBERS: Dict[str, int] = {
+    'Jan': 1, 'January': 1,
+    'Feb': 2, 'February': 2,
+    'Mar': 3, 'March': 3,
+    'Apr': 4, 'April': 4,
+    'May': 5,
+    'Jun': 6, 'June': 6,
+    'Jul': 7, 'July': 7,
+    'Aug': 8, 'August': 8,
+    'Sep': 9, 'Sept': 9, 'September': 9,
+    'Oct': 10, 'October': 10,
+    'Nov': 11, 'November': 11,
+    'Dec': 12, 'December': 12
+}
+
+# Season to (first month, last month)
+SEASON_MONTHS: Dict[str, Tuple[int, int]] = {
+    'Spring': (3, 5),  # March to May
+    'Summer': (6, 8),  # June to August
+    'Autumn': (9, 11), # September to November
+    'Fall': (9, 11),   # Alternative for Autumn
+    'Winter': (12, 2)  # December to February
+}
+
+# Day used for the end of a month range, valid in every month
+MONTH_END_DAY = 28
+
+DateRange = Tuple[Optional[str], Optional[str]]
+
+
+def parse_year_range(year: str) -> Tuple[int, Optional[int]]:
+    """'1950' -> (1950, None), '1950-1952' -> (1950, 1952).  Raises ValueError."""
+    if '-' in year:
+        start_year, end_year = (int(part) for part in year.split('-'))
+        return start_year, end_year
+    return int(year), None
+
+
+def _name(text: str) -> str:
+    return text.strip().rstrip('.').capitalize()
+
+
+def parse_month_range(month: str) -> Tuple[Optional[int], Optional[int]]:
+    """First and last month number of a month, season or range of either.
+    A single month has no last month; unknown names give (None, None)."""
+    parts = [_name(part) for part in month.split('-')]
+    if all(part in SEASON_MONTHS for part in parts):
+        if len(parts) == 1:
+            return SEASON_MONTHS[parts[0]]
+        if len(parts) == 2:
+            return SEASON_MONTHS[parts[0]][0], SEASON_MONTHS[parts[1]][1]
+        return None, None
+    if len(parts) == 2:
+        return MONTH_NUMBERS.get(parts[0]), MONTH_NUMBERS.get(parts[1])
+    return MONTH_NUMBERS.get(parts[0]), None
+
+
+def _month_day(text: str) -> Tuple[int, int]:
+    month, day = text.split('/')
+    return int(month), int(day)
+
+
+@lru_cache(maxsize=4096)
+def resolve_dates(year: str, start_date: str = '', end_date: str = '', month: str = '') -> DateRange:
+    """ISO start and end date for the Year, Start Date, End Date and Month columns.
+
+    - a year range covers the whole range
+    - a start and end date ('MM/DD') are used as is
+    - a month or season starts on the 1st; a range of them ends on the
+      MONTH_END_DAY of the last month, in the next year when it wraps
+    - otherwise the whole year
+    Raises ValueError when year is not a year or year range.
+    """
+    start_year, end_year = parse_year_range(year)
+    if end_year:
+        return f"{start_year}-01-01", f"{end_year}-12-31"
+
+    if start_date and end_date:
+        try:
+            start_month, start_day = _month_day(start_date)
+            end_month, end_day = _month_day(end_date)
+            return (f"{start_year}-{start_month:02d}-{start_day:02d}",
+                    f"{start_year}-{end_month:02d}-{end_day:02d}")
+        except ValueError:
+            pass
+
+    if month:
+        start_month, end_month = parse_month_range(month)
+        if start_month:
+            if not end_month:
+                return f"{start_year}-{start_month:02d}-01", None
+            # Handle year wrap-around for seasons like Winter (Dec-Feb)
+            last_year = start_year + 1 if end_month < start_month else start_year
+            return f"{start_year}-{start_month:02d}-01", f"{last_year}-{end_month:02d}-{MONTH_END_DAY:02d}"
+
+    return f"{start_year}-01-01", f"{start_year}-12-31"
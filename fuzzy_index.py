@@ -0,0 +1,206 @@
+"""Fuzzy lookup of gazetteer names for typo tolerance.
+
+A SymSpell style deletion index: every name is stored under each string
+that can be made by deleting up to max_distance characters from its
+prefix.  A lookup generates the same deletions for the query, collects the
+names stored under them and keeps those whose real edit distance
+(Damerau-Levenshtein, adjacent swaps count as one edit) is small enough.
+That is a handful of dict lookups per query, no matter how big the
+gazetteer is.
+
+The parser's hot path stays exact.  process_locations.py only asks this
+index for suggestions on lines that did not resolve to a gazetteer city
+(--suggest), so new misspellings show up in the logs instead of another
+text_fixes entry being needed before anyone notices them.
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Only the first PREFIX_LENGTH characters of a name are used for the deletions
+PREFIX_LENGTH = 7
+DEFAULT_MAX_DISTANCE = 2
+# Words shorter than this are never looked up, they match too much
+MIN_TERM_LENGTH = 4
+
+# (name, kind, country) where kind is country, state or city
+Entry = Tuple[str, str, str]
+
+_COMPOUND_SEPARATORS = re.compile(r'\s*(?:,|/|\band\b|&)\s*')
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Damerau-Levenshtein (optimal string alignment) distance between a and b.
+    Returns max_distance + 1 as soon as the distance is known to be larger."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2: Optional[List[int]] = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _deletes(term: str, max_distance: int) -> Set[str]:
+    """term plus every string made by deleting up to max_distance characters from it."""
+    results = {term}
+    frontier = {term}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for word in frontier:
+            for i in range(len(word)):
+                next_frontier.add(word[:i] + word[i + 1:])
+        results |= next_frontier
+        frontier = next_frontier
+    return results
+
+
+class FuzzyIndex:
+    """Deletion index over a set of names.  Names are matched case-insensitively."""
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.entries: Dict[str, List[Entry]] = {}   # lowercased name -> entries
+        self._deletes: Dict[str, Set[str]] = {}     # deletion -> lowercased names
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self.entries
+
+    def add(self, name: str, kind: str, country: str) -> None:
+        key = name.lower()
+        entries = self.entries.setdefault(key, [])
+        if (name, kind, country) in entries:
+            return
+        entries.append((name, kind, country))
+        if len(entries) > 1:
+            return
+        for deletion in _deletes(key[:PREFIX_LENGTH], self.max_distance):
+            self._deletes.setdefault(deletion, set()).add(key)
+
+    def lookup(self, term: str, max_distance: Optional[int] = None) -> List[Tuple[Entry, int]]:
+        """Entries within max_distance edits of term, closest first.  An exact
+        match only returns the exact entries."""
+        key = term.lower()
+        if key in self.entries:
+            return [(entry, 0) for entry in self.entries[key]]
+        if max_distance is None:
+            max_distance = allowed_distance(key, self.max_distance)
+        max_distance = min(max_distance, self.max_distance)
+        if max_distance <= 0:
+            return []
+
+        candidates: Set[str] = set()
+        for deletion in _deletes(key[:PREFIX_LENGTH], max_distance):
+            candidates |= self._deletes.get(deletion, set())
+
+        matches = []
+        for candidate in candidates:
+            distance = edit_distance(key, candidate, max_distance)
+            if distance <= max_distance:
+                matches.extend((entry, distance) for entry in self.entries[candidate])
+        matches.sort(key=lambda match: (match[1], match[0][0]))
+        return matches
+
+    @classmethod
+    def from_countries(cls, countries: Dict, max_distance: int = DEFAULT_MAX_DISTANCE) -> 'FuzzyIndex':
+        """Index every country, state and city name in countries_data.countries,
+        including the variations."""
+        index = cls(max_distance)
+        for country_name, country_data in countries.items():
+            index.add(country_name, 'country', country_name)
+            for variation in country_data.get('variations', []):
+                index.add(variation, 'country', country_name)
+            for state_name in country_data.get('states', []):
+                if not state_name.startswith('--'):
+                    index.add(state_name, 'state', country_name)
+            for variation, state_name in country_data.get('state_variations', {}).items():
+                index.add(variation, 'state', country_name)
+            for city_name in country_data.get('cities', {}):
+                if not city_name.startswith('--'):
+                    index.add(city_name, 'city', country_name)
+                    # Also the places of compound names such as 'High River, Claresholm'
+                    parts = [part.strip() for part in _COMPOUND_SEPARATORS.split(city_name)]
+                    if len(parts) > 1:
+                        for part in parts:
+                            if part and part.lower() not in index.entries:
+                                index.add(part, 'city', country_name)
+        return index
+
+
+def allowed_distance(term: str, max_distance: int = DEFAULT_MAX_DISTANCE) -> int:
+    """Edits allowed for a term of this length: none below MIN_TERM_LENGTH, one up to 7 characters."""
+    if len(term) < MIN_TERM_LENGTH:
+        return 0
+    if len(term) <= 7:
+        return min(1, max_distance)
+    return max_distance
+
+
+_WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z.'-]*")
+
+# Capitalized words of the input files that are never place names
+IGNORED_WORDS = {
+    'workers', 'list', 'staff', 'convention', 'conventions', 'special', 'meeting', 'meetings',
+    'visit', 'visited', 'visiting', 'return', 'returned', 'photo', 'picture', 'removed', 'from',
+    'guestbook', 'guest', 'book', 'started', 'work', 'field', 'rounds', 'with', 'home', 'overseer',
+    'companion', 'address', 'adjustments', 'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug',
+    'sep', 'sept', 'oct', 'nov', 'dec', 'january', 'february', 'march', 'april', 'june', 'july',
+    'august', 'september', 'october', 'november', 'december', 'spring', 'summer', 'autumn',
+    'fall', 'winter',
+}
+
+
+def candidate_terms(line: str, max_words: int = 3) -> Iterator[str]:
+    """Runs of one to max_words capitalized words in line, the shapes place
+    names have.  IGNORED_WORDS end a run."""
+    words = [word.rstrip('.') for word in _WORD_PATTERN.findall(line)]
+    for i, word in enumerate(words):
+        if not word[:1].isupper() or word.lower() in IGNORED_WORDS:
+            continue
+        for size in range(1, max_words + 1):
+            run = words[i:i + size]
+            if len(run) < size or not run[-1][:1].isupper() or run[-1].lower() in IGNORED_WORDS:
+                break
+            yield ' '.join(run)
+
+
+def suggest(index: FuzzyIndex, line: str) -> List[Tuple[str, Entry, int]]:
+    """Suggested corrections for the words of line that are not gazetteer names
+    but are close to one: (term, closest entry, distance)."""
+    suggestions = []
+    seen: Set[str] = set()
+    terms = list(candidate_terms(line))
+    exact = {term.lower() for term in terms if term in index}
+    for term in terms:
+        key = term.lower()
+        if key in seen or key in exact:
+            continue
+        seen.add(key)
+        # Skip runs that already contain an exact name, e.g. "Calgary Alberta"
+        if any(word.lower() in exact for word in term.split()):
+            continue
+        matches = index.lookup(term)
+        if matches:
+            entry, distance = matches[0]
+            suggestions.append((term, entry, distance))
+    return suggestions
+
+
+def format_suggestions(line: str, suggestions: Iterable[Tuple[str, Entry, int]]) -> Iterator[str]:
+    """Log lines for suggest() results."""
+    for term, (name, kind, country), distance in suggestions:
+        yield f"SUGGEST - {term} -> {name} ({kind}, {country}, distance {distance}): {line}"
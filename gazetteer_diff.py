@@ -0,0 +1,257 @@
+"""Offline diff of the gazetteer (countries_data.countries) against a snapshot
+of the country, state and location tables.
+
+The snapshot comes from local files, either the curr_*.csv table exports
+insert_csl.py reads or the insert_perp_location_check.csv that
+insert_perp_locations.py saves from get_locations.  Everything is indexed in
+dicts, so a diff is one pass over the snapshot and one over the gazetteer.
+
+New rows get deterministic recids: a uuid5 of the row's names, so the same
+country/state/location gets the same recid on every run and different rows
+can't collide the way sequence numbered fake GUIDs do between runs.
+
+    python gazetteer_diff.py --exports . --output gazetteer_diff.sql
+    python gazetteer_diff.py --locations insert_perp_location_check.csv
+"""
+
+import argparse
+import csv
+import sys
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sql_writers import SqlFileWriter
+
+# Namespace for the recids of generated country, state and location rows.  Never change it,
+# rows generated by earlier runs would no longer match.
+RECID_NAMESPACE = uuid.UUID('6f0c7a4e-2d1b-5c3e-9a8f-4b6d2e1c0f57')
+
+NO_STATE = '--No State--'
+NOT_SPECIFIED = '--Not Specified--'
+
+Place = Tuple[str, str, Optional[str]]  # (country, state, location), location None for a state on its own
+
+
+def stable_recid(kind: str, *names: str) -> str:
+    """Deterministic recid for a generated row, e.g. stable_recid('state', 'Canada', 'Alberta')."""
+    return str(uuid.uuid5(RECID_NAMESPACE, '\x1f'.join((kind,) + names)))
+
+
+def read_csv_export(path: str, columns: Sequence[str]) -> Iterator[Tuple[str, ...]]:
+    """Stream the given columns of a table export as tuples of values.
+
+    The header is normalized once per file (quotes and BOM stripped) and the
+    position of each wanted column looked up, so rows are never turned into
+    dicts.
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = [name.strip('"').strip('\ufeff') for name in next(reader, [])]
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError(f"{path} is missing column(s): {', '.join(missing)}")
+        positions = [header.index(column) for column in columns]
+        for row in reader:
+            if row:
+                yield tuple(row[i].strip('"') for i in positions)
+
+
+class Snapshot:
+    """Indexed copy of the country, state and location tables.
+
+    countries: country name -> recid
+    states:    (country_recid, state name) -> recid
+    locations: (state_recid, location name) -> recid
+    The first row wins when the snapshot has duplicate keys.
+    """
+
+    def __init__(self):
+        self.countries: Dict[str, str] = {}
+        self.states: Dict[Tuple[str, str], str] = {}
+        self.locations: Dict[Tuple[str, str], str] = {}
+        self.locations_by_name: Dict[str, List[str]] = {}
+
+    def add_country(self, recid: str, name: str) -> None:
+        self.countries.setdefault(name, recid)
+
+    def add_state(self, recid: str, country_recid: str, name: str) -> None:
+        self.states.setdefault((country_recid, name), recid)
+
+    def add_location(self, recid: str, state_recid: str, name: str) -> None:
+        if (state_recid, name) not in self.locations:
+            self.locations[(state_recid, name)] = recid
+            self.locations_by_name.setdefault(name, []).append(recid)
+
+    @classmethod
+    def from_exports(cls, directory: str = '.') -> 'Snapshot':
+        """Load curr_countries.csv, curr_states.csv and curr_locations.csv from directory."""
+        snapshot = cls()
+        for recid, name in read_csv_export(f"{directory}/curr_countries.csv", ('recid', 'name')):
+            snapshot.add_country(recid, name)
+        for recid, country_recid, name in read_csv_export(f"{directory}/curr_states.csv",
+                                                          ('recid', 'country_recid', 'name')):
+            snapshot.add_state(recid, country_recid, name)
+        for recid, state_recid, name in read_csv_export(f"{directory}/curr_locations.csv",
+                                                        ('recid', 'state_recid', 'name')):
+            snapshot.add_location(recid, state_recid, name)
+        return snapshot
+
+    @classmethod
+    def from_location_rows(cls, rows: Iterable[Dict[str, Optional[str]]]) -> 'Snapshot':
+        """Load the joined rows returned by the get_locations rpc (or saved in
+        insert_perp_location_check.csv).  Blank state and location columns are skipped."""
+        snapshot = cls()
+        for row in rows:
+            if not row.get('country_name') or not row.get('country_recid'):
+                continue
+            snapshot.add_country(row['country_recid'], row['country_name'])
+            if not row.get('state_name') or not row.get('state_recid'):
+                continue
+            snapshot.add_state(row['state_recid'], row['country_recid'], row['state_name'])
+            if row.get('location_name') and row.get('location_recid'):
+                snapshot.add_location(row['location_recid'], row['state_recid'], row['location_name'])
+        return snapshot
+
+    @classmethod
+    def from_locations_csv(cls, path: str) -> 'Snapshot':
+        """Load insert_perp_location_check.csv."""
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            return cls.from_location_rows(csv.DictReader(f))
+
+
+@dataclass
+class ChangeSet:
+    """Rows to insert, in dependency order, and perp_location remaps."""
+    countries: List[Tuple[str, str]] = field(default_factory=list)               # (recid, name)
+    states: List[Tuple[str, str, str]] = field(default_factory=list)             # (recid, country_recid, name)
+    locations: List[Tuple[str, str, str]] = field(default_factory=list)          # (recid, state_recid, name)
+    location_remaps: List[Tuple[str, str, str]] = field(default_factory=list)    # (name, old_recid, new_recid)
+    skipped: List[Place] = field(default_factory=list)                           # places whose country is unknown
+
+    def __bool__(self) -> bool:
+        return bool(self.countries or self.states or self.locations or self.location_remaps)
+
+
+def gazetteer_places(countries: Dict[str, Dict]) -> Iterator[Place]:
+    """Every (country, state, location) in countries_data.countries.
+
+    Follows insert_csl.py: --No State-- is the country itself, --Not Specified--
+    is the state itself, and a country without cities gets one location per
+    state (or one named after the country when it has no states either).
+    States listed without any cities come out as (country, state, None).
+    """
+    for country_name, country_data in countries.items():
+        if not country_data['cities']:
+            if not country_data['states']:
+                yield country_name, country_name, country_name
+            for state_name in country_data['states']:
+                state_name = country_name if state_name == NO_STATE else state_name
+                yield country_name, state_name, state_name
+            continue
+        for state_name in country_data['states']:
+            yield country_name, country_name if state_name == NO_STATE else state_name, None
+        for city_name, state_names in country_data['cities'].items():
+            for state_name in state_names:
+                state_name = country_name if state_name == NO_STATE else state_name
+                yield country_name, state_name, state_name if city_name == NOT_SPECIFIED else city_name
+
+
+def diff(snapshot: Snapshot, places: Iterable[Place], add_countries: bool = True,
+         remap_locations: bool = False) -> ChangeSet:
+    """Work out the rows missing from snapshot for places.
+
+    Every missing country, state and location is inserted once, in the order
+    first seen.  With add_countries=False places in unknown countries are
+    reported in ChangeSet.skipped instead.  With remap_locations=True a snapshot
+    location whose name is inserted under another state, and which is not
+    itself one of places, is remapped to the new row.
+    """
+    changes = ChangeSet()
+    country_recids = dict(snapshot.countries)
+    state_recids = dict(snapshot.states)
+    location_keys = set(snapshot.locations)
+    new_location_recids: Dict[str, str] = {}
+    matched: Set[str] = set()
+
+    for country_name, state_name, location_name in places:
+        country_recid = country_recids.get(country_name)
+        if country_recid is None:
+            if not add_countries:
+                changes.skipped.append((country_name, state_name, location_name))
+                continue
+            country_recid = stable_recid('country', country_name)
+            country_recids[country_name] = country_recid
+            changes.countries.append((country_recid, country_name))
+
+        state_recid = state_recids.get((country_recid, state_name))
+        if state_recid is None:
+            state_recid = stable_recid('state', country_name, state_name)
+            state_recids[(country_recid, state_name)] = state_recid
+            changes.states.append((state_recid, country_recid, state_name))
+
+        if location_name is None:
+            continue
+        if (state_recid, location_name) in location_keys:
+            existing_recid = snapshot.locations.get((state_recid, location_name))
+            if existing_recid is not None:
+                matched.add(existing_recid)
+            continue
+        location_recid = stable_recid('location', country_name, state_name, location_name)
+        location_keys.add((state_recid, location_name))
+        changes.locations.append((location_recid, state_recid, location_name))
+        new_location_recids.setdefault(location_name, location_recid)
+
+    if remap_locations:
+        for name, new_recid in new_location_recids.items():
+            for old_recid in snapshot.locations_by_name.get(name, ()):
+                if old_recid not in matched:
+                    changes.location_remaps.append((name, old_recid, new_recid))
+    return changes
+
+
+def write_change_set(changes: ChangeSet, schema: str, country_sql: Optional[SqlFileWriter],
+                     state_sql: Optional[SqlFileWriter], location_sql: Optional[SqlFileWriter],
+                     perp_location_sql: Optional[SqlFileWriter] = None) -> None:
+    """Write the inserts (and remap updates) for a change set.  The writers may
+    be the same file; tables whose writer is None are left out."""
+    if country_sql is not None:
+        for recid, name in changes.countries:
+            country_sql.insert(f"{schema}.country", ('recid', 'name'), (recid, name))
+    if state_sql is not None:
+        for recid, country_recid, name in changes.states:
+            state_sql.insert(f"{schema}.state", ('recid', 'country_recid', 'name'), (recid, country_recid, name))
+    if location_sql is not None:
+        for recid, state_recid, name in changes.locations:
+            location_sql.insert(f"{schema}.location", ('recid', 'state_recid', 'name'), (recid, state_recid, name))
+    if perp_location_sql is not None:
+        for _, old_recid, new_recid in changes.location_remaps:
+            perp_location_sql.write_line(
+                f"update {schema}.perp_location set location_recid='{new_recid}' where location_recid='{old_recid}';")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff countries_data.py against a snapshot of the location tables')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--exports', metavar='DIR', help='Directory holding curr_countries.csv, curr_states.csv and curr_locations.csv')
+    source.add_argument('--locations', metavar='FILE', help='insert_perp_location_check.csv saved by insert_perp_locations.py')
+    parser.add_argument('--output', default='gazetteer_diff.sql', help='SQL file to write (default: gazetteer_diff.sql)')
+    parser.add_argument('--schema', default='test', help='Schema name for the statements (default: test)')
+    parser.add_argument('--batch-size', type=int, default=1, help='Rows per INSERT statement (default: 1)')
+    parser.add_argument('--remap', action='store_true', help='Also write perp_location updates for same-name locations')
+    args = parser.parse_args()
+
+    import countries_data
+
+    snapshot = Snapshot.from_exports(args.exports) if args.exports else Snapshot.from_locations_csv(args.locations)
+    changes = diff(snapshot, gazetteer_places(countries_data.countries), remap_locations=args.remap)
+
+    with SqlFileWriter(args.output, args.batch_size) as sql:
+        write_change_set(changes, args.schema, sql, sql, sql, sql)
+
+    print(f"{len(changes.countries)} countries, {len(changes.states)} states, {len(changes.locations)} locations, "
+          f"{len(changes.location_remaps)} perp_location remaps written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Golden output regression check for process_locations.py.
+
+Runs process_file() in-process over every input file, in parallel across
+files, and diffs each file's pipe delimited output row by row against the
+expected output stored in the golden directory.  Changed rows are summarized
+by Type so a refactor that should change nothing can be checked in seconds.
+
+    python golden.py --input-dir inputs --update    # record the expected output
+    python golden.py --input-dir inputs             # check against it
+
+The golden directory holds one <input file name>.out per input file with the
+matched rows (header included) and one <input file name>.rej with the
+NOMATCH and error lines.  Exit status is 1 when anything changed.
+"""
+
+import argparse
+import csv
+import difflib
+import io
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+
+from output_writers import PipeWriter
+from process_locations import is_input_file, process_file
+
+DEFAULT_GOLDEN_DIR = 'golden'
+TYPE_COLUMN = 3  # position of Type in output_writers.OUTPUT_COLUMNS
+
+
+class FileOutput(NamedTuple):
+    filename: str
+    output: str
+    rejects: str
+
+
+class FileDiff(NamedTuple):
+    filename: str
+    removed: List[str]   # expected rows that are gone or changed
+    added: List[str]     # new or changed rows
+    rejects_changed: bool
+    missing_expected: bool
+
+
+def input_files(input_dir: str) -> List[str]:
+    """The input files process_locations.py would process, sorted by name."""
+    return sorted(filename for filename in os.listdir(input_dir) if is_input_file(filename))
+
+
+def run_file(filepath: str) -> FileOutput:
+    """Run process_file on one input file and capture what it writes."""
+    output = io.StringIO()
+    rejects = io.StringIO()
+    process_file(filepath, writer=PipeWriter(output, rejects))
+    return FileOutput(os.path.basename(filepath), output.getvalue(), rejects.getvalue())
+
+
+def run_all(input_dir: str, jobs: int) -> List[FileOutput]:
+    """Run every input file, jobs files at a time."""
+    paths = [os.path.join(input_dir, filename) for filename in input_files(input_dir)]
+    if jobs <= 1 or len(paths) <= 1:
+        return [run_file(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(run_file, paths, chunksize=1))
+
+
+def golden_paths(golden_dir: str, filename: str) -> Tuple[str, str]:
+    return os.path.join(golden_dir, filename + '.out'), os.path.join(golden_dir, filename + '.rej')
+
+
+def read_text(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def write_golden(golden_dir: str, result: FileOutput) -> None:
+    os.makedirs(golden_dir, exist_ok=True)
+    output_path, rejects_path = golden_paths(golden_dir, result.filename)
+    for path, text in ((output_path, result.output), (rejects_path, result.rejects)):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+
+
+def diff_rows(expected: List[str], actual: List[str]) -> Tuple[List[str], List[str]]:
+    """Rows only in expected and rows only in actual, lined up with difflib so
+    one changed row does not make every following row look different."""
+    removed: List[str] = []
+    added: List[str] = []
+    matcher = difflib.SequenceMatcher(None, expected, actual, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            removed.extend(expected[i1:i2])
+            added.extend(actual[j1:j2])
+    return removed, added
+
+
+def compare(golden_dir: str, result: FileOutput) -> FileDiff:
+    """Diff one file's output against its golden files."""
+    output_path, rejects_path = golden_paths(golden_dir, result.filename)
+    expected_output = read_text(output_path)
+    expected_rejects = read_text(rejects_path)
+    actual_rows = result.output.splitlines()
+    if expected_output is None:
+        return FileDiff(result.filename, [], actual_rows, bool(result.rejects), True)
+    removed, added = diff_rows(expected_output.splitlines(), actual_rows)
+    return FileDiff(result.filename, removed, added, expected_rejects != result.rejects, False)
+
+
+def row_type(row: str) -> str:
+    """The Type column of a pipe delimited output row."""
+    fields = next(csv.reader([row], delimiter='|'), [])
+    if len(fields) > TYPE_COLUMN and fields[0] == 'MATCHED':
+        return fields[TYPE_COLUMN]
+    return '(header)' if fields[:1] == ['Status'] else '(other)'
+
+
+def format_report(diffs: List[FileDiff], show: int = 5) -> str:
+    """Changes per Type over all files, then the first rows of each changed file."""
+    removed_by_type: Counter = Counter()
+    added_by_type: Counter = Counter()
+    for file_diff in diffs:
+        removed_by_type.update(row_type(row) for row in file_diff.removed)
+        added_by_type.update(row_type(row) for row in file_diff.added)
+
+    changed = [d for d in diffs if d.removed or d.added or d.rejects_changed or d.missing_expected]
+    lines = [f"Files: {len(diffs)}  Changed: {len(changed)}  "
+             f"Rows removed: {sum(removed_by_type.values())}  Rows added: {sum(added_by_type.values())}"]
+    if removed_by_type or added_by_type:
+        lines.append("\nChanged rows by type:")
+        for row_kind in sorted(set(removed_by_type) | set(added_by_type)):
+            lines.append(f"  -{removed_by_type[row_kind]:<6} +{added_by_type[row_kind]:<6} {row_kind}")
+
+    for file_diff in changed:
+        lines.append(f"\n{file_diff.filename}")
+        if file_diff.missing_expected:
+            lines.append("  no golden output, run with --update")
+            continue
+        if file_diff.rejects_changed:
+            lines.append("  NOMATCH/error lines changed")
+        for row in file_diff.removed[:show]:
+            lines.append(f"  - {row}")
+        for row in file_diff.added[:show]:
+            lines.append(f"  + {row}")
+        hidden = max(0, len(file_diff.removed) - show) + max(0, len(file_diff.added) - show)
+        if hidden:
+            lines.append(f"  ... {hidden} more")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check process_locations.py output against stored golden output')
+    parser.add_argument('--input-dir', default='inputs', help='Directory containing input files (default: inputs)')
+    parser.add_argument('--golden-dir', default=DEFAULT_GOLDEN_DIR, help=f'Directory holding the expected output (default: {DEFAULT_GOLDEN_DIR})')
+    parser.add_argument('--update', action='store_true', help='Write the current output as the new expected output')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Files processed in parallel (default: number of CPUs)')
+    parser.add_argument('--show', type=int, default=5, help='Changed rows listed per file (default: 5)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        print(f"Input directory '{args.input_dir}' not found", file=sys.stderr)
+        sys.exit(2)
+
+    results = run_all(args.input_dir, args.jobs)
+
+    if args.update:
+        for result in results:
+            write_golden(args.golden_dir, result)
+        print(f"Wrote golden output for {len(results)} files to {args.golden_dir}")
+        return
+
+    diffs = [compare(args.golden_dir, result) for result in results]
+    sys.stdout.write(format_report(diffs, args.show))
+    if any(d.removed or d.added or d.rejects_changed or d.missing_expected for d in diffs):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
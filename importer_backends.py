@@ -0,0 +1,300 @@
+"""Database backends for insert_perp_locations.py.
+
+The importer only needs four operations from the database: the
+get_locations RPC, perp lookups by name, reading perp_location rows and
+inserting them.  SupabaseBackend does them through PostgREST.
+SqliteBackend does them against a local SQLite file with the same tables,
+so the --insert path can be run, tested and benchmarked (see
+benchmark_importer.py) without a Supabase project.  SnapshotBackend reads
+CSV snapshots of the tables for fully offline SQL generation.
+
+supabase is only imported, and the client only created, when a
+LazyBackend is first asked for data.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from gazetteer_diff import read_csv_export, stable_recid
+
+# perp_location columns the importer writes
+PERP_LOCATION_COLUMNS = ('perp_recid', 'location_recid', 'start_date', 'end_date', 'note',
+                         'created_by', 'changed_by', 'created_date', 'changed_date')
+# get_locations RPC result columns
+LOCATION_COLUMNS = ('country_name', 'country_recid', 'state_name', 'state_recid', 'location_name', 'location_recid')
+# Names / recids per request, they go into the URL
+CHUNK_SIZE = 100
+# Rows per page when reading, PostgREST caps each response
+FETCH_PAGE_SIZE = 1000
+
+
+def chunks(values: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class ImporterBackend:
+    """The database operations insert_perp_locations.py uses."""
+
+    def get_locations(self) -> List[dict]:
+        """Every country / state / location combination, as the get_locations RPC
+        returns them (LOCATION_COLUMNS, state and location may be None)."""
+        raise NotImplementedError
+
+    def find_perps(self, names: Sequence[str]) -> Dict[str, str]:
+        """perp name -> recid for the names that exist."""
+        raise NotImplementedError
+
+    def fetch_perp_locations(self, perp_recids: Sequence[str], columns: Sequence[str]) -> List[dict]:
+        """The perp_location rows of the given perps, only the given columns."""
+        raise NotImplementedError
+
+    def insert_perp_locations(self, rows: Sequence[dict]) -> None:
+        """Insert perp_location rows in one request."""
+        raise NotImplementedError
+
+
+class SupabaseBackend(ImporterBackend):
+    """The Supabase project, through a supabase-py client."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def connect(cls, url: str, key: str, schema: str) -> 'SupabaseBackend':
+        """Create a client for the service key and schema."""
+        from supabase import create_client
+
+        client = create_client(url, key)
+        # Set the schema through headers
+        client.postgrest.auth(key)
+        client.postgrest.schema(schema)
+        return cls(client)
+
+    def get_locations(self) -> List[dict]:
+        return self.client.rpc('get_locations', params={}).execute().data or []
+
+    def find_perps(self, names: Sequence[str]) -> Dict[str, str]:
+        found = {}
+        for chunk in chunks(list(names), CHUNK_SIZE):
+            if len(chunk) == 1:
+                result = self.client.table('perp').select('recid,name').eq('name', chunk[0]).execute()
+            else:
+                result = self.client.table('perp').select('recid,name').in_('name', list(chunk)).execute()
+            for row in result.data or []:
+                found.setdefault(row['name'], row['recid'])
+        return found
+
+    def fetch_perp_locations(self, perp_recids: Sequence[str], columns: Sequence[str]) -> List[dict]:
+        rows = []
+        for chunk in chunks(list(perp_recids), CHUNK_SIZE):
+            start = 0
+            while True:
+                result = self.client.table('perp_location').select(','.join(columns)).in_('perp_recid', list(chunk)) \
+                    .order('recid').range(start, start + FETCH_PAGE_SIZE - 1).execute()
+                page = result.data or []
+                rows.extend(page)
+                if len(page) < FETCH_PAGE_SIZE:
+                    break
+                start += FETCH_PAGE_SIZE
+        return rows
+
+    def insert_perp_locations(self, rows: Sequence[dict]) -> None:
+        if not rows:
+            return
+        # Remove schema prefix from table name as it's handled by the connection
+        self.client.table('perp_location').insert(rows[0] if len(rows) == 1 else list(rows)).execute()
+
+
+class LazyBackend(ImporterBackend):
+    """Creates the real backend with factory on the first call, so runs that
+    never reach the database do not pay for connecting to it."""
+
+    def __init__(self, factory: Callable[[], ImporterBackend]):
+        self._factory = factory
+        self._backend: Optional[ImporterBackend] = None
+
+    @property
+    def backend(self) -> ImporterBackend:
+        if self._backend is None:
+            self._backend = self._factory()
+        return self._backend
+
+    def get_locations(self) -> List[dict]:
+        return self.backend.get_locations()
+
+    def find_perps(self, names: Sequence[str]) -> Dict[str, str]:
+        return self.backend.find_perps(names)
+
+    def fetch_perp_locations(self, perp_recids: Sequence[str], columns: Sequence[str]) -> List[dict]:
+        return self.backend.fetch_perp_locations(perp_recids, columns)
+
+    def insert_perp_locations(self, rows: Sequence[dict]) -> None:
+        self.backend.insert_perp_locations(rows)
+
+
+# Files SnapshotBackend reads from its directory
+SNAPSHOT_LOCATIONS = 'insert_perp_location_check.csv'   # written by every insert_perp_locations.py run
+SNAPSHOT_PERPS = 'perp.csv'                             # export of the perp table
+SNAPSHOT_PERP_LOCATIONS = 'perp_location.csv'           # export of perp_location, only needed for --delta
+
+
+class SnapshotBackend(ImporterBackend):
+    """Read-only backend over CSV snapshots of the tables in a directory.
+
+    The files are only read when first needed and empty values are read as
+    None.  Inserting raises RuntimeError.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._perps: Optional[Dict[str, str]] = None
+
+    def _path(self, filename: str) -> str:
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Snapshot file {path} not found")
+        return path
+
+    def get_locations(self) -> List[dict]:
+        return [{column: value or None for column, value in zip(LOCATION_COLUMNS, row)}
+                for row in read_csv_export(self._path(SNAPSHOT_LOCATIONS), LOCATION_COLUMNS)]
+
+    def find_perps(self, names: Sequence[str]) -> Dict[str, str]:
+        if self._perps is None:
+            self._perps = {}
+            for name, recid in read_csv_export(self._path(SNAPSHOT_PERPS), ('name', 'recid')):
+                self._perps.setdefault(name, recid)
+        return {name: self._perps[name] for name in names if name in self._perps}
+
+    def fetch_perp_locations(self, perp_recids: Sequence[str], columns: Sequence[str]) -> List[dict]:
+        wanted = set(perp_recids)
+        read_columns = ('perp_recid',) + tuple(columns)
+        return [{column: value or None for column, value in zip(columns, row[1:])}
+                for row in read_csv_export(self._path(SNAPSHOT_PERP_LOCATIONS), read_columns)
+                if row[0] in wanted]
+
+    def insert_perp_locations(self, rows: Sequence[dict]) -> None:
+        raise RuntimeError("Cannot insert into a CSV snapshot")
+
+
+SQLITE_SCHEMA = """
+create table if not exists country (recid text primary key, name text not null);
+create table if not exists state (recid text primary key, country_recid text not null references country, name text not null);
+create table if not exists location (recid text primary key, state_recid text not null references state, name text not null);
+create table if not exists perp (recid text primary key, name text not null);
+create table if not exists perp_location (
+    recid integer primary key autoincrement,
+    perp_recid text not null references perp,
+    location_recid text references location,
+    start_date text, end_date text, note text,
+    created_by text, changed_by text, created_date text, changed_date text
+);
+create index if not exists perp_location_perp on perp_location (perp_recid);
+create index if not exists perp_name on perp (name);
+"""
+
+_GET_LOCATIONS = """
+select c.name, c.recid, s.name, s.recid, l.name, l.recid
+from country c
+left join state s on s.country_recid = c.recid
+left join location l on l.state_recid = s.recid
+order by c.name, s.name, l.name
+"""
+
+
+class SqliteBackend(ImporterBackend):
+    """A local SQLite database with the tables the importer uses.
+
+    latency (seconds) is slept on every call outside the database lock to
+    stand in for the PostgREST round trip, so batched and concurrent insert
+    strategies can be compared the way they would behave against Supabase.
+    The backend can be shared between threads.
+    """
+
+    def __init__(self, path: str = ':memory:', latency: float = 0.0):
+        self.path = path
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SQLITE_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _round_trip(self) -> None:
+        # Counted under the lock, the benchmark makes requests from several threads
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def add_location(self, country: str, state: Optional[str] = None, location: Optional[str] = None) -> str:
+        """Create the country, state and location as needed; returns the recid of the last one given."""
+        recid = stable_recid('country', country)
+        with self._lock, self._db:
+            self._db.execute("insert or ignore into country (recid, name) values (?, ?)", (recid, country))
+            if state is not None:
+                parent, recid = recid, stable_recid('state', country, state)
+                self._db.execute("insert or ignore into state (recid, country_recid, name) values (?, ?, ?)",
+                                 (recid, parent, state))
+                if location is not None:
+                    parent, recid = recid, stable_recid('location', country, state, location)
+                    self._db.execute("insert or ignore into location (recid, state_recid, name) values (?, ?, ?)",
+                                     (recid, parent, location))
+        return recid
+
+    def add_perp(self, name: str) -> str:
+        recid = stable_recid('perp', name)
+        with self._lock, self._db:
+            self._db.execute("insert or ignore into perp (recid, name) values (?, ?)", (recid, name))
+        return recid
+
+    def count_perp_locations(self) -> int:
+        with self._lock:
+            return self._db.execute("select count(*) from perp_location").fetchone()[0]
+
+    def get_locations(self) -> List[dict]:
+        self._round_trip()
+        with self._lock:
+            return [dict(zip(LOCATION_COLUMNS, row)) for row in self._db.execute(_GET_LOCATIONS)]
+
+    def find_perps(self, names: Sequence[str]) -> Dict[str, str]:
+        found = {}
+        for chunk in chunks(list(names), CHUNK_SIZE):
+            self._round_trip()
+            placeholders = ', '.join('?' * len(chunk))
+            with self._lock:
+                for name, recid in self._db.execute(
+                        f"select name, recid from perp where name in ({placeholders}) order by rowid", list(chunk)):
+                    found.setdefault(name, recid)
+        return found
+
+    def fetch_perp_locations(self, perp_recids: Sequence[str], columns: Sequence[str]) -> List[dict]:
+        unknown = set(columns) - set(PERP_LOCATION_COLUMNS) - {'recid'}
+        if unknown:
+            raise ValueError(f"Unknown perp_location columns: {', '.join(sorted(unknown))}")
+        rows = []
+        for chunk in chunks(list(perp_recids), CHUNK_SIZE):
+            self._round_trip()
+            placeholders = ', '.join('?' * len(chunk))
+            with self._lock:
+                cursor = self._db.execute(
+                    f"select {', '.join(columns)} from perp_location where perp_recid in ({placeholders}) order by recid",
+                    list(chunk))
+                rows.extend(dict(zip(columns, row)) for row in cursor)
+        return rows
+
+    def insert_perp_locations(self, rows: Sequence[dict]) -> None:
+        if not rows:
+            return
+        self._round_trip()
+        placeholders = ', '.join('?' * len(PERP_LOCATION_COLUMNS))
+        with self._lock, self._db:
+            self._db.executemany(
+                f"insert into perp_location ({', '.join(PERP_LOCATION_COLUMNS)}) values ({placeholders})",
+                [tuple(row.get(column) for column in PERP_LOCATION_COLUMNS) for row in rows])
@@ -0,0 +1,116 @@
+"""Polls an input directory for new and modified files, for process_locations.py --watch.
+
+A file is reported once its size and modification time have stayed the
+same for settle_polls polls in a row, so a file the extract step is still
+writing is not parsed half written.  It is reported again only after it
+changes.  Polling keeps this dependency free and works on network drives,
+where inotify does not.
+
+The signatures of the processed files can be saved and loaded, so a
+restarted watcher only reports the files that changed while it was down.
+"""
+
+import json
+import os
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+Signature = Tuple[int, int]  # (size, mtime_ns)
+
+
+class InputWatcher:
+    """Tracks the accepted files of directory and reports the ones to parse."""
+
+    def __init__(self, directory: str, accept: Callable[[str], bool], settle_polls: int = 1):
+        self.directory = directory
+        self.accept = accept
+        self.settle_polls = max(0, settle_polls)
+        self._processed: Dict[str, Signature] = {}
+        self._pending: Dict[str, Tuple[Signature, int]] = {}   # path -> (signature, polls it stayed the same)
+
+    def _scan(self) -> Dict[str, Signature]:
+        signatures = {}
+        for filename in os.listdir(self.directory):
+            if not self.accept(filename):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signatures[path] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def mark_all_processed(self) -> None:
+        """Treat the files there now as processed, e.g. before a full run at startup."""
+        self._processed = self._scan()
+        self._pending.clear()
+
+    def changed(self) -> List[str]:
+        """The new or modified files, in name order, without waiting for them
+        to settle, e.g. for the run at startup.  They are marked processed."""
+        signatures = self._scan()
+        ready = [path for path in sorted(signatures) if self._processed.get(path) != signatures[path]]
+        for path in ready:
+            self.mark_processed(path, signatures[path])
+        return ready
+
+    def save(self, path: str) -> None:
+        """Save the processed signatures, by file name, to a JSON file.  Written
+        to a temporary file and renamed, so a stopped watcher never leaves half of it."""
+        state = {os.path.basename(filepath): list(signature) for filepath, signature in self._processed.items()}
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.watch.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, sort_keys=True)
+            # mkstemp makes the file owner only, give it the mode the saved state already
+            # has, or the umask default for a new file
+            try:
+                mode = os.stat(path).st_mode & 0o777
+            except FileNotFoundError:
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            os.chmod(temp_path, mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def load(self, path: str) -> None:
+        """Treat the files saved with save() as processed with those signatures."""
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self._processed = {os.path.join(self.directory, filename): (signature[0], signature[1])
+                           for filename, signature in state.items()}
+        self._pending.clear()
+
+    def mark_processed(self, path: str, signature: Optional[Signature] = None) -> None:
+        if signature is None:
+            stat = os.stat(path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+        self._processed[path] = signature
+        self._pending.pop(path, None)
+
+    def poll(self) -> List[str]:
+        """The new or modified files that have settled, in name order.  They are
+        marked processed; call mark_processed again if they are not."""
+        signatures = self._scan()
+        for path in list(self._pending):
+            if path not in signatures:
+                del self._pending[path]
+
+        ready = []
+        for path in sorted(signatures):
+            signature = signatures[path]
+            if self._processed.get(path) == signature:
+                self._pending.pop(path, None)
+                continue
+            previous = self._pending.get(path)
+            stable = previous[1] + 1 if previous and previous[0] == signature else 0
+            if stable >= self.settle_polls:
+                ready.append(path)
+                self.mark_processed(path, signature)
+            else:
+                self._pending[path] = (signature, stable)
+        return ready
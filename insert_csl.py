@@ -4,6 +4,8 @@ import os
 import csv
 import argparse
 import sys
+from gazetteer_diff import read_csv_export
+from sql_writers import SqlFileWriter
 
 # Global variables
 SCHEMA = 'test'  # Change this to switch between schemas (e.g., 'public', 'test', 'dev')
@@ -16,124 +18,183 @@ def debug(message):
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Generate SQL insert statements for countries, states, and locations.')
 parser.add_argument('--debug', action='store_true', help='Enable debug output')
+parser.add_argument('--batch-size', type=int, default=1, help='Rows per INSERT statement (default: 1, one statement per row)')
 args = parser.parse_args()
 
+COUNTRY_COLUMNS = ('recid', 'name')
+STATE_COLUMNS = ('recid', 'country_recid', 'name')
+LOCATION_COLUMNS = ('recid', 'state_recid', 'name')
+
+class SqlOutputs:
+    """The .sql files written by this script.  Each one is opened once and kept open for the whole run."""
+    def __init__(self, batch_size=1):
+        self.country = SqlFileWriter('inserts_country.sql', batch_size)
+        self.state = SqlFileWriter('inserts_state.sql', batch_size)
+        self.location = SqlFileWriter('inserts_location.sql', batch_size)
+        self.perp_location = SqlFileWriter('inserts_perp_location.sql', batch_size)
+
+    def insert_country(self, recid, name):
+        self.country.insert(f"{SCHEMA}.country", COUNTRY_COLUMNS, (recid, name))
+
+    def insert_state(self, recid, country_recid, name):
+        self.state.insert(f"{SCHEMA}.state", STATE_COLUMNS, (recid, country_recid, name))
+
+    def insert_location(self, recid, state_recid, name):
+        self.location.insert(f"{SCHEMA}.location", LOCATION_COLUMNS, (recid, state_recid, name))
+
+    def update_perp_location(self, old_recid, new_recid):
+        self.perp_location.write_line(f"update {SCHEMA}.perp_location set location_recid='{new_recid}' where location_recid='{old_recid}';")
+
+    def close(self):
+        for writer in (self.country, self.state, self.location, self.perp_location):
+            writer.close()
+
 def generate_guid(prefix, sequence):
     """Generate a GUID in the specified format."""
     base = f"20250407-{prefix}-{prefix}-{prefix}-{prefix}{prefix}"
     return f"{base}{sequence:04d}"
 
+class RecidRegistry:
+    """All the generated recid bookkeeping for one run.
+
+    Holds the sequences new recids are taken from, each country's position in
+    countries_data and the countries, states and locations generated so far.
+    Assigned recids are stored back into existing['countries'] and
+    existing['states'].
+    """
+    def __init__(self, existing):
+        self.existing = existing
+        # 1 based position of each country in countries_data
+        self.country_ordinals = {name: ordinal for ordinal, name in enumerate(countries_data.countries, 1)}
+        self.country_sequence = 1
+        self.state_sequence = 1
+        self.location_sequence = len(existing['curr_locations']) + 1  # Start after existing locations
+        self.generated_countries = {}  # Track country names and their recids
+        self.generated_states = {}  # Track state names and their recids
+        self.generated_locations = set()  # Track all location names we generate
+        self.matched_locations = set()  # Recids of existing locations countries_data already has
+        self.new_location_recids = {}  # Location name -> recid of the first location generated with that name
+
+    def next_country_recid(self):
+        recid = generate_guid('cccc', self.country_sequence)
+        self.country_sequence += 1
+        return recid
+
+    def next_state_recid(self):
+        recid = generate_guid('dddd', self.state_sequence)
+        self.state_sequence += 1
+        return recid
+
+    def next_location_recid(self):
+        recid = generate_guid('eeee', self.location_sequence)
+        self.location_sequence += 1
+        return recid
+
+    def country_recid(self, country_name):
+        """Recid of a countries_data country.  Falls back to the recid for its position in countries_data."""
+        recid = self.existing['countries'].get(country_name)
+        if recid is None:
+            recid = generate_guid('cccc', self.country_ordinals[country_name])
+        return recid
+
+    def add_country(self, country_name):
+        """Generate and store a recid for a new country."""
+        recid = self.next_country_recid()
+        self.existing['countries'][country_name] = recid
+        return recid
+
+    def add_state(self, country_recid, state_name):
+        """Generate and store a recid for a new state."""
+        recid = self.next_state_recid()
+        self.existing['states'][(country_recid, state_name)] = recid
+        return recid
+
 def escape_single_quotes(text):
     """Escape single quotes in text for SQL."""
     return text.replace("'", "''")
 
 def load_existing_records():
-    """Load existing records from CSV files."""
+    """Load existing records from the curr_*.csv exports.
+
+    Besides the rows themselves (curr_countries, curr_states, curr_locations,
+    keyed by recid) this builds the indexes the diff is done against:
+      countries:         country name -> recid
+      states:            (country_recid, state name) -> recid
+      locations:         (state_recid, location name) -> recid
+      locations_by_name: location name -> [recid, ...] for remapping perp_location
+    The first row wins when an export has duplicate keys.
+    """
     existing = {
         'countries': {},
         'states': {},
         'locations': {},
+        'locations_by_name': {},
         'curr_countries': {},  # Store curr_countries data
         'curr_states': {},     # Store curr_states data
         'curr_locations': {}   # Store curr_locations data
     }
     
     # Load curr_countries
-    with open('curr_countries.csv', 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # Clean up the column names by removing quotes and BOM
-            clean_row = {k.strip('"').strip('\ufeff'): v.strip('"') for k, v in row.items()}
-            existing['curr_countries'][clean_row['recid']] = {
-                'name': clean_row['name'],
-                'recid': clean_row['recid']
-            }
+    for recid, name in read_csv_export('curr_countries.csv', ('recid', 'name')):
+        existing['curr_countries'][recid] = {'name': name, 'recid': recid}
+        existing['countries'].setdefault(name, recid)
     
     # Load curr_states
-    with open('curr_states.csv', 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # Clean up the column names by removing quotes and BOM
-            clean_row = {k.strip('"').strip('\ufeff'): v.strip('"') for k, v in row.items()}
-            existing['curr_states'][clean_row['recid']] = {
-                'name': clean_row['name'],
-                'recid': clean_row['recid'],
-                'country_recid': clean_row['country_recid']
-            }
+    for recid, country_recid, name in read_csv_export('curr_states.csv', ('recid', 'country_recid', 'name')):
+        existing['curr_states'][recid] = {'name': name, 'recid': recid, 'country_recid': country_recid}
+        existing['states'].setdefault((country_recid, name), recid)
     
     # Load curr_locations
-    with open('curr_locations.csv', 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # Clean up the column names by removing quotes and BOM
-            clean_row = {k.strip('"').strip('\ufeff'): v.strip('"') for k, v in row.items()}
-            existing['curr_locations'][clean_row['recid']] = {
-                'name': clean_row['name'],
-                'recid': clean_row['recid'],
-                'state_recid': clean_row['state_recid']
-            }
-            existing['locations'][clean_row['name']] = clean_row['recid']
+    for recid, state_recid, name in read_csv_export('curr_locations.csv', ('recid', 'state_recid', 'name')):
+        existing['curr_locations'][recid] = {'name': name, 'recid': recid, 'state_recid': state_recid}
+        existing['locations'].setdefault((state_recid, name), recid)
+        existing['locations_by_name'].setdefault(name, []).append(recid)
     
     return existing
 
-def write_countries(existing):
+def write_countries(existing, registry, sql):
     """Generate and write country insert statements."""
-    sequence = 1
-    with open('inserts_country.sql', 'w') as f:
-        # First write all existing countries from CSV as comments
-        for country_name, recid in existing['countries'].items():
-            escaped_name = escape_single_quotes(country_name)
-            f.write(f"-- INSERT INTO {SCHEMA}.country (recid, name) VALUES ('{recid}', '{escaped_name}');\n")
+    # First write all existing countries from CSV as comments
+    for country_name, recid in existing['countries'].items():
+        escaped_name = escape_single_quotes(country_name)
+        sql.country.write_line(f"-- INSERT INTO {SCHEMA}.country (recid, name) VALUES ('{recid}', '{escaped_name}');")
+    
+    # Then handle countries from countries_data
+    for country_name in countries_data.countries:
+        # Skip if country already exists (we already wrote it as a comment)
+        if country_name in existing['countries']:
+            continue
         
-        # Then handle countries from countries_data
-        for country_name in countries_data.countries:
-            escaped_name = escape_single_quotes(country_name)
-            
-            # Skip if country already exists (we already wrote it as a comment)
-            if country_name in existing['countries']:
-                continue
-            
-            # Generate new country
-            recid = generate_guid('cccc', sequence)
-            state_insert = f"INSERT INTO {SCHEMA}.country (recid, name) VALUES ('{recid}', '{escaped_name}');\n"
-            f.write(state_insert)
-            # Store the newly generated recid to ensure consistency
-            existing['countries'][country_name] = recid
-            sequence += 1
-
-def write_states(existing):
+        # Generate new country and store the recid to ensure consistency
+        recid = registry.add_country(country_name)
+        sql.insert_country(recid, country_name)
+
+def write_states(existing, registry, sql):
     """Generate and write state insert statements."""
-    sequence = 1
-    with open('inserts_state.sql', 'w') as f:
-        # First write all existing states from CSV as comments
-        for (country_recid, state_name), state_recid in existing['states'].items():
-            escaped_name = escape_single_quotes(state_name)
-            f.write(f"-- INSERT INTO {SCHEMA}.state (recid, country_recid, name) VALUES ('{state_recid}', '{country_recid}', '{escaped_name}');\n")
+    # First write all existing states from CSV as comments
+    for (country_recid, state_name), state_recid in existing['states'].items():
+        escaped_name = escape_single_quotes(state_name)
+        sql.state.write_line(f"-- INSERT INTO {SCHEMA}.state (recid, country_recid, name) VALUES ('{state_recid}', '{country_recid}', '{escaped_name}');")
+    
+    # Then handle states from countries_data
+    for country_name, country_data in countries_data.countries.items():
+        # Get the country's recid (same format as in write_countries)
+        country_recid = registry.country_recid(country_name)
         
-        # Then handle states from countries_data
-        for country_name, country_data in countries_data.countries.items():
-            # Get the country's recid (same format as in write_countries)
-            country_recid = existing['countries'].get(country_name, 
-                generate_guid('cccc', list(countries_data.countries.keys()).index(country_name) + 1))
+        for state_name in country_data['states']:
+            # Replace --No State-- with country name
+            if state_name == '--No State--':
+                state_name = country_name
             
-            for state_name in country_data['states']:
-                # Replace --No State-- with country name
-                if state_name == '--No State--':
-                    state_name = country_name
-                
-                escaped_name = escape_single_quotes(state_name)
-                key = (country_recid, state_name)
-                
-                # Skip if state already exists (we already wrote it as a comment)
-                if key in existing['states']:
-                    continue
-                
-                # Generate new state
-                recid = generate_guid('dddd', sequence)
-                f.write(f"INSERT INTO {SCHEMA}.state (recid, country_recid, name) VALUES ('{recid}', '{country_recid}', '{escaped_name}');\n")
-                # Store the state key in existing['states']
-                existing['states'][key] = recid
-                sequence += 1
+            key = (country_recid, state_name)
+            
+            # Skip if state already exists (we already wrote it as a comment)
+            if key in existing['states']:
+                continue
+            
+            # Generate new state and store the state key in existing['states']
+            recid = registry.add_state(country_recid, state_name)
+            sql.insert_state(recid, country_recid, state_name)
 
 def write_location_mapping(mappings):
     """Write all mappings between old and new location records to a CSV file."""
@@ -146,15 +207,16 @@ def write_location_mapping(mappings):
         for location_name, old_recid, new_recid in mappings:
             writer.writerow([location_name, old_recid, new_recid])
 
-def write_perp_location_updates(mappings):
+def write_perp_location_updates(mappings, sql):
     """Write update statements for perp_location table."""
-    with open('inserts_perp_location.sql', 'w') as f:
-        for location_name, old_recid, new_recid in mappings:
-            f.write(f"update {SCHEMA}.perp_location set location_recid='{new_recid}' where location_recid='{old_recid}';\n")
+    for location_name, old_recid, new_recid in mappings:
+        sql.update_perp_location(old_recid, new_recid)
 
-def process_exception_mappings(existing, generated_locations, sequence):
-    """Process locations that weren't mapped and try to find matching states."""
+def process_exception_mappings(existing, registry, sql):
+    """Process locations that weren't mapped and try to find matching states.
+    Returns the set of location names that were FOUND."""
     exceptions = []
+    found_locations = set()
     with open('inserts_exception_mapping.csv', 'w', newline='') as f:
         writer = csv.writer(f, delimiter='|')
         writer.writerow(['location_name', 'old_recid', 'status', 'new_recid', 'state_recid'])
@@ -165,53 +227,54 @@ def process_exception_mappings(existing, generated_locations, sequence):
             state_mapping[state_name] = state_recid
         
         # Process each location from curr_locations.csv
-        for location_name, old_recid in existing['locations'].items():
+        for old_recid, location_data in existing['curr_locations'].items():
+            location_name = location_data['name']
             # Skip if this location was already processed
-            if location_name in generated_locations:
+            if location_name in registry.generated_locations or old_recid in registry.matched_locations:
                 continue
                 
-            # Look for a state with the same name
-            if location_name in state_mapping:
+            # Look for a state with the same name that the location isn't already under
+            if location_name in state_mapping and state_mapping[location_name] != location_data['state_recid']:
                 # Found a matching state, create new location record
-                new_recid = generate_guid('eeee', sequence)
+                new_recid = registry.next_location_recid()
                 state_recid = state_mapping[location_name]
                 writer.writerow([location_name, old_recid, 'FOUND', new_recid, state_recid])
                 exceptions.append((new_recid, state_recid, location_name, old_recid))
-                sequence += 1
+                found_locations.add(location_name)
             else:
                 # No matching state found
                 writer.writerow([location_name, old_recid, 'NOT FOUND', '', ''])
     
     # Write the insert statements for found exceptions
     if exceptions:
-        with open('inserts_location.sql', 'a') as f:
-            f.write('\n-- Exception locations\n')
-            for new_recid, state_recid, location_name, _ in exceptions:
-                escaped_name = escape_single_quotes(location_name)
-                f.write(f"INSERT INTO {SCHEMA}.location (recid, state_recid, name) VALUES ('{new_recid}', '{state_recid}', '{escaped_name}');\n")
+        sql.location.section('Exception locations')
+        for new_recid, state_recid, location_name, _ in exceptions:
+            sql.insert_location(new_recid, state_recid, location_name)
         
         # Write perp_location updates for exceptions
-        with open('inserts_perp_location.sql', 'a') as f:
-            f.write('\n-- Exception location updates\n')
-            for new_recid, _, _, old_recid in exceptions:
-                f.write(f"update {SCHEMA}.perp_location set location_recid='{new_recid}' where location_recid='{old_recid}';\n")
+        sql.perp_location.section('Exception location updates')
+        for new_recid, _, _, old_recid in exceptions:
+            sql.update_perp_location(old_recid, new_recid)
     
-    return sequence
+    return found_locations
 
-def process_not_found_locations(existing, generated_locations, generated_states, generated_countries, country_sequence, state_sequence):
-    """Process locations that weren't found and generate necessary insert statements."""
+def process_not_found_locations(existing, registry, exception_locations, sql):
+    """Process locations that weren't found and generate necessary insert statements.
+    exception_locations is the set of location names process_exception_mappings FOUND."""
     not_found_locations = []
     not_found_states = set()
     not_found_countries = set()
+
+    # Index existing states by name.  The first state with a given name wins.
+    state_recids_by_name = {}
+    for (country_recid, existing_state_name), existing_state_recid in existing['states'].items():
+        state_recids_by_name.setdefault(existing_state_name, existing_state_recid)
     
     # First pass: collect all NOT FOUND locations and their state info
-    for location_name, old_recid in existing['locations'].items():
+    for old_recid, location_data in existing['curr_locations'].items():
+        location_name = location_data['name']
         # Skip if this location was already processed in generated_locations
-        if location_name in generated_locations:
-            continue
-            
-        location_data = existing['curr_locations'].get(old_recid)
-        if not location_data:
+        if location_name in registry.generated_locations or old_recid in registry.matched_locations:
             continue
             
         state_recid = location_data['state_recid']
@@ -219,19 +282,8 @@ def process_not_found_locations(existing, generated_locations, generated_states,
         if not state_data:
             continue
             
-        # Check if this location was already processed in exception mappings
-        location_exists = False
-        try:
-            with open('inserts_exception_mapping.csv', 'r') as f:
-                reader = csv.DictReader(f, delimiter='|')
-                for row in reader:
-                    if row['location_name'] == location_name and row['status'] == 'FOUND':
-                        location_exists = True
-                        break
-        except FileNotFoundError:
-            pass  # File doesn't exist yet, so no exceptions have been processed
-        
-        if location_exists:
+        # Skip locations that were already processed in exception mappings
+        if location_name in exception_locations:
             continue
             
         # Step 1: Try to find matching state
@@ -240,23 +292,24 @@ def process_not_found_locations(existing, generated_locations, generated_states,
         
         # First check if state exists in existing states
         state_exists = False
-        for (country_recid, existing_state_name), existing_state_recid in existing['states'].items():
-            if existing_state_name == state_name:
-                new_state_recid = existing_state_recid
-                state_exists = True
-                break
+        if state_name in state_recids_by_name:
+            new_state_recid = state_recids_by_name[state_name]
+            state_exists = True
         
         # If not found in existing states, check generated states
-        if not state_exists and state_name in generated_states:
-            new_state_recid = generated_states[state_name]
+        if not state_exists and state_name in registry.generated_states:
+            new_state_recid = registry.generated_states[state_name]
             state_exists = True
         
         # If still not found, generate new state
         if not state_exists:
-            new_state_recid = generate_guid('dddd', state_sequence)
-            state_sequence += 1
+            new_state_recid = registry.next_state_recid()
             not_found_states.add(state_recid)
             state_data['new_state_recid'] = new_state_recid
+        
+        # Still under the same existing state, so the row is already there
+        if new_state_recid == state_recid:
+            continue
             
         not_found_locations.append({
             'name': location_name,
@@ -285,15 +338,11 @@ def process_not_found_locations(existing, generated_locations, generated_states,
         if country_name == "Southern Alberta":
             country_name = "Canada"
             # Find Canada's recid in generated_countries
-            for name, recid in generated_countries.items():
-                if name == "Canada":
-                    new_country_recid = recid
-                    break
-        elif country_name in generated_countries:
-            new_country_recid = generated_countries[country_name]
+            new_country_recid = registry.generated_countries.get("Canada")
+        elif country_name in registry.generated_countries:
+            new_country_recid = registry.generated_countries[country_name]
         else:
-            new_country_recid = generate_guid('cccc', country_sequence)
-            country_sequence += 1
+            new_country_recid = registry.next_country_recid()
             not_found_countries.add(country_recid)
             country_data['new_country_recid'] = new_country_recid
             
@@ -304,168 +353,136 @@ def process_not_found_locations(existing, generated_locations, generated_states,
     
     # Write all insert statements to their respective files
     # Step 3: Write country inserts first
-    with open('inserts_country.sql', 'a') as f:
-        f.write('\n-- NOT FOUND Countries\n')
-        # Sort countries by recid
-        sorted_countries = sorted(not_found_countries, key=lambda x: existing['curr_countries'][x]['new_country_recid'])
-        for country_recid in sorted_countries:
-            country_data = existing['curr_countries'].get(country_recid)
-            if country_data:
-                escaped_name = escape_single_quotes(country_data['name'])
-                f.write(f"INSERT INTO {SCHEMA}.country (recid, name) VALUES ('{country_data['new_country_recid']}', '{escaped_name}');\n")
+    sql.country.section('NOT FOUND Countries')
+    # Sort countries by recid
+    sorted_countries = sorted(not_found_countries, key=lambda x: existing['curr_countries'][x]['new_country_recid'])
+    for country_recid in sorted_countries:
+        country_data = existing['curr_countries'].get(country_recid)
+        if country_data:
+            sql.insert_country(country_data['new_country_recid'], country_data['name'])
     
     # Step 2: Write state inserts
-    with open('inserts_state.sql', 'a') as f:
-        f.write('\n-- NOT FOUND States\n')
-        # Sort states by recid
-        sorted_states = sorted(not_found_states, key=lambda x: existing['curr_states'][x]['new_state_recid'])
-        for state_recid in sorted_states:
-            state_data = existing['curr_states'].get(state_recid)
-            if state_data:
-                escaped_name = escape_single_quotes(state_data['name'])
-                f.write(f"INSERT INTO {SCHEMA}.state (recid, country_recid, name) VALUES ('{state_data['new_state_recid']}', '{state_data['new_country_recid']}', '{escaped_name}');\n")
+    sql.state.section('NOT FOUND States')
+    # Sort states by recid
+    sorted_states = sorted(not_found_states, key=lambda x: existing['curr_states'][x]['new_state_recid'])
+    for state_recid in sorted_states:
+        state_data = existing['curr_states'].get(state_recid)
+        if state_data:
+            sql.insert_state(state_data['new_state_recid'], state_data['new_country_recid'], state_data['name'])
     
     # Step 1: Write location inserts
-    with open('inserts_location.sql', 'a') as f:
-        f.write('\n-- NOT FOUND Locations\n')
-        # Sort locations by recid
-        sorted_locations = sorted(not_found_locations, key=lambda x: x['old_recid'])
-        for loc in sorted_locations:
-            escaped_name = escape_single_quotes(loc['name'])
-            f.write(f"INSERT INTO {SCHEMA}.location (recid, state_recid, name) VALUES ('{loc['old_recid']}', '{loc['state_recid']}', '{escaped_name}');\n")
+    sql.location.section('NOT FOUND Locations')
+    # Sort locations by recid
+    sorted_locations = sorted(not_found_locations, key=lambda x: x['old_recid'])
+    for loc in sorted_locations:
+        sql.insert_location(loc['old_recid'], loc['state_recid'], loc['name'])
+
+def add_location(existing, registry, sql, state_recid, location_name):
+    """Insert a countries_data location unless it already exists under state_recid."""
+    existing_recid = existing['locations'].get((state_recid, location_name))
+    if existing_recid is not None:
+        registry.matched_locations.add(existing_recid)
+        return
     
-    return country_sequence, state_sequence
+    recid = registry.next_location_recid()
+    sql.insert_location(recid, state_recid, location_name)
+    registry.generated_locations.add(location_name)
+    registry.new_location_recids.setdefault(location_name, recid)
 
-def write_locations(existing):
+def location_mappings(existing, registry):
+    """(name, old recid, new recid) for the curr_locations.csv locations to remap.
+    Called once every countries_data location is processed: each existing
+    location with the name of a new one is remapped to it, unless countries_data
+    has that existing location under its own state too."""
+    mappings = []
+    for location_name, recid in registry.new_location_recids.items():
+        for old_recid in existing['locations_by_name'].get(location_name, ()):
+            if old_recid not in registry.matched_locations:
+                mappings.append((location_name, old_recid, recid))
+    return mappings
+
+def write_locations(existing, registry, sql):
     """Generate and write location insert statements."""
-    sequence = len(existing['locations']) + 1  # Start after existing locations
-    mappings = []  # List to collect all mappings
-    generated_locations = set()  # Track all location names we generate
-    generated_states = {}  # Track state names and their recids
-    generated_countries = {}  # Track country names and their recids
-    state_sequence = len(existing['states']) + 1  # Start after existing states
-    
-    with open('inserts_location.sql', 'w') as f:
-        # Then handle locations from countries_data
-        for country_name, country_data in countries_data.countries.items():
-            # Get the country's recid from existing or generate a new one
-            country_recid = existing['countries'].get(country_name, 
-                generate_guid('cccc', list(countries_data.countries.keys()).index(country_name) + 1))
-            generated_countries[country_name] = country_recid
-            
-            # Handle case where cities list is empty
-            if not country_data['cities']:
-                # If no states listed, create state and location using country name
-                if not country_data['states']:
-                    state_name = country_name
-                    state_key = (country_recid, state_name)
-                    if state_key not in existing['states']:
-                        state_recid = generate_guid('dddd', state_sequence)
-                        existing['states'][state_key] = state_recid
-                        generated_states[state_name] = state_recid
-                        with open('inserts_state.sql', 'a') as state_file:
-                            escaped_name = escape_single_quotes(state_name)
-                            state_file.write(f"INSERT INTO {SCHEMA}.state (recid, country_recid, name) VALUES ('{state_recid}', '{country_recid}', '{escaped_name}');\n")
-                        state_sequence += 1
-                    state_recid = existing['states'][state_key]
-                    
-                    # Create location using country name
-                    location_key = (state_recid, country_name)
-                    if location_key not in existing['locations']:
-                        escaped_name = escape_single_quotes(country_name)
-                        recid = generate_guid('eeee', sequence)
-                        f.write(f"INSERT INTO {SCHEMA}.location (recid, state_recid, name) VALUES ('{recid}', '{state_recid}', '{escaped_name}');\n")
-                        generated_locations.add(country_name)
-                        # Check if this location name exists in curr_locations.csv
-                        if country_name in existing['locations']:
-                            mappings.append((country_name, existing['locations'][country_name], recid))
-                        sequence += 1
-                else:
-                    # Create location for each state
-                    for state_name in country_data['states']:
-                        state_key = (country_recid, state_name)
-                        if state_key not in existing['states']:
-                            state_recid = generate_guid('dddd', state_sequence)
-                            existing['states'][state_key] = state_recid
-                            generated_states[state_name] = state_recid
-                            with open('inserts_state.sql', 'a') as state_file:
-                                escaped_name = escape_single_quotes(state_name)
-                                state_file.write(f"INSERT INTO {SCHEMA}.state (recid, country_recid, name) VALUES ('{state_recid}', '{country_recid}', '{escaped_name}');\n")
-                            state_sequence += 1
-                        state_recid = existing['states'][state_key]
-                        
-                        # Create location using state name
-                        location_key = (state_recid, state_name)
-                        if location_key not in existing['locations']:
-                            escaped_name = escape_single_quotes(state_name)
-                            recid = generate_guid('eeee', sequence)
-                            f.write(f"INSERT INTO {SCHEMA}.location (recid, state_recid, name) VALUES ('{recid}', '{state_recid}', '{escaped_name}');\n")
-                            generated_locations.add(state_name)
-                            # Check if this location name exists in curr_locations.csv
-                            if state_name in existing['locations']:
-                                mappings.append((state_name, existing['locations'][state_name], recid))
-                            sequence += 1
-                continue
-            
-            for city_name, state_names in country_data['cities'].items():
-                for state_name in state_names:
-                    # Replace --No State-- with country name before any processing
-                    if state_name == '--No State--':
-                        state_name = country_name
-                    
-                    # Get the state's recid - use the state name directly from the mapping
+    # Then handle locations from countries_data
+    for country_name, country_data in countries_data.countries.items():
+        # Get the country's recid from existing or generate a new one
+        country_recid = registry.country_recid(country_name)
+        registry.generated_countries[country_name] = country_recid
+        
+        # Handle case where cities list is empty
+        if not country_data['cities']:
+            # If no states listed, create state and location using country name
+            if not country_data['states']:
+                state_name = country_name
+                state_key = (country_recid, state_name)
+                if state_key not in existing['states']:
+                    state_recid = registry.add_state(country_recid, state_name)
+                    registry.generated_states[state_name] = state_recid
+                    sql.insert_state(state_recid, country_recid, state_name)
+                state_recid = existing['states'][state_key]
+                
+                # Create location using country name
+                add_location(existing, registry, sql, state_recid, country_name)
+            else:
+                # Create location for each state
+                for state_name in country_data['states']:
                     state_key = (country_recid, state_name)
-                    
-                    # Get the state_recid from existing states
                     if state_key not in existing['states']:
-                        # Create the state on the spot
-                        state_recid = generate_guid('dddd', state_sequence)
-                        existing['states'][state_key] = state_recid
-                        generated_states[state_name] = state_recid
-                        # Write the insert statement to the state SQL file
-                        with open('inserts_state.sql', 'a') as state_file:
-                            escaped_name = escape_single_quotes(state_name)
-                            state_file.write(f"INSERT INTO {SCHEMA}.state (recid, country_recid, name) VALUES ('{state_recid}', '{country_recid}', '{escaped_name}');\n")
-                        state_sequence += 1
-                        
+                        state_recid = registry.add_state(country_recid, state_name)
+                        registry.generated_states[state_name] = state_recid
+                        sql.insert_state(state_recid, country_recid, state_name)
                     state_recid = existing['states'][state_key]
                     
-                    # Replace --Not Specified-- with state name
-                    if city_name == '--Not Specified--':
-                        city_name = state_name
-                    
-                    escaped_name = escape_single_quotes(city_name)
-                    key = (state_recid, city_name)
-                    
-                    # Skip if location already exists (we already wrote it as a comment)
-                    if key in existing['locations']:
-                        continue
+                    # Create location using state name
+                    add_location(existing, registry, sql, state_recid, state_name)
+            continue
+        
+        for city_name, state_names in country_data['cities'].items():
+            for state_name in state_names:
+                # Replace --No State-- with country name before any processing
+                if state_name == '--No State--':
+                    state_name = country_name
+                
+                # Get the state's recid - use the state name directly from the mapping
+                state_key = (country_recid, state_name)
+                
+                # Get the state_recid from existing states
+                if state_key not in existing['states']:
+                    # Create the state on the spot
+                    state_recid = registry.add_state(country_recid, state_name)
+                    registry.generated_states[state_name] = state_recid
+                    # Write the insert statement to the state SQL file
+                    sql.insert_state(state_recid, country_recid, state_name)
                     
-                    # Generate new location
-                    recid = generate_guid('eeee', sequence)
-                    f.write(f"INSERT INTO {SCHEMA}.location (recid, state_recid, name) VALUES ('{recid}', '{state_recid}', '{escaped_name}');\n")
-                    generated_locations.add(city_name)
-                    # Check if this location name exists in curr_locations.csv
-                    if city_name in existing['locations']:
-                        mappings.append((city_name, existing['locations'][city_name], recid))
-                    sequence += 1
+                state_recid = existing['states'][state_key]
+                
+                # Replace --Not Specified-- with state name
+                if city_name == '--Not Specified--':
+                    city_name = state_name
+                
+                add_location(existing, registry, sql, state_recid, city_name)
     
-    # Write all mappings at the end
+    # Write all mappings at the end, once every matched location is known
+    mappings = location_mappings(existing, registry)
     if mappings:
         write_location_mapping(mappings)
-        write_perp_location_updates(mappings)
+        write_perp_location_updates(mappings, sql)
     
     # Process exceptions
-    sequence = process_exception_mappings(existing, generated_locations, sequence)
+    exception_locations = process_exception_mappings(existing, registry, sql)
     
     # Process NOT FOUND locations
-    country_sequence = len(generated_countries) + 1
-    country_sequence, state_sequence = process_not_found_locations(existing, generated_locations, generated_states, generated_countries, country_sequence, state_sequence)
+    process_not_found_locations(existing, registry, exception_locations, sql)
 
 if __name__ == "__main__":
     existing_records = load_existing_records()
-    write_countries(existing_records)
-    write_states(existing_records)
-    write_locations(existing_records)
+    registry = RecidRegistry(existing_records)
+    sql = SqlOutputs(args.batch_size)
+    try:
+        write_countries(existing_records, registry, sql)
+        write_states(existing_records, registry, sql)
+        write_locations(existing_records, registry, sql)
+    finally:
+        sql.close()
     print("Generated three SQL files: inserts_country.sql, inserts_state.sql, and inserts_location.sql and inserts_location_mapping.csv")
 
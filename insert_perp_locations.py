@@ -4,11 +4,16 @@ import os
 import sys
 import csv
 import argparse
+import hashlib
 from datetime import datetime, UTC
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from typing import Optional, Tuple, Dict, Set
+from typing import Iterable, Optional, Tuple, Dict, Set
 import re
+from date_utils import resolve_dates
+from gazetteer_diff import Snapshot, diff, write_change_set
+from interval_index import RESOLVED_COLUMNS
+from importer_backends import ImporterBackend, LazyBackend, SnapshotBackend, SqliteBackend, SupabaseBackend
+from sql_writers import CopyFileWriter, SqlFileWriter
 
 # Load environment variables from .env.local
 load_dotenv('.env.local')
@@ -30,96 +35,77 @@ state_bad_combinations: Set[Tuple[str, str, str]] = set()
 country_recids: Dict[str, str] = {}
 # Store raw get_locations data
 raw_locations_data = []
+# get_locations data indexed by name
+location_snapshot = Snapshot()
 # Track missing locations
 missing_locations: Set[Tuple[str, str, str]] = set()
-# Track locations for new states
-new_state_locations: Dict[Tuple[str, str], Set[str]] = {}
 
 def debug(message: str) -> None:
     """Print debug message if debug mode is enabled."""
     if DEBUG:
         print(f"[DEBUG] {message}", file=sys.stderr)
 
-# Validate required environment variables
-if not SUPABASE_URL:
-    print("Error: NEXT_PUBLIC_SUPABASE_URL is not set in .env.local", file=sys.stderr)
-    sys.exit(1)
-if not SUPABASE_SERVICE_ROLE_KEY:
-    print("Error: NEXT_PUBLIC_SUPABASE_ANON_KEY is not set in .env.local", file=sys.stderr)
-    sys.exit(1)
+# Database the importer reads from and inserts into, set in main()
+backend: Optional[ImporterBackend] = None
 
-# Initialize Supabase client
-try:
-    supabase: Client = create_client(
-        SUPABASE_URL, 
-        SUPABASE_SERVICE_ROLE_KEY
-    )
-    # Set the schema through headers
-    supabase.postgrest.auth(SUPABASE_SERVICE_ROLE_KEY)
-    supabase.postgrest.schema(SCHEMA_NAME)
-    debug("Supabase client initialized successfully")
-except Exception as e:
-    print(f"Error initializing Supabase client: {str(e)}", file=sys.stderr)
-    sys.exit(1)
-
-# Month name to number mapping
-MONTH_MAP = {
-    'Jan': 1, 'January': 1,
-    'Feb': 2, 'February': 2,
-    'Mar': 3, 'March': 3,
-    'Apr': 4, 'April': 4,
-    'May': 5,
-    'Jun': 6, 'June': 6,
-    'Jul': 7, 'July': 7,
-    'Aug': 8, 'August': 8,
-    'Sep': 9, 'September': 9,
-    'Oct': 10, 'October': 10,
-    'Nov': 11, 'November': 11,
-    'Dec': 12, 'December': 12
-}
+def connect_supabase() -> SupabaseBackend:
+    """Create the Supabase backend, exiting if .env.local is incomplete."""
+    # Validate required environment variables
+    if not SUPABASE_URL:
+        print("Error: NEXT_PUBLIC_SUPABASE_URL is not set in .env.local", file=sys.stderr)
+        sys.exit(1)
+    if not SUPABASE_SERVICE_ROLE_KEY:
+        print("Error: NEXT_PUBLIC_SUPABASE_ANON_KEY is not set in .env.local", file=sys.stderr)
+        sys.exit(1)
 
-# Season to month range mapping
-SEASON_MAP = {
-    'Spring': (3, 5),  # March to May
-    'Summer': (6, 8),  # June to August
-    'Autumn': (9, 11), # September to November
-    'Fall': (9, 11),   # Alternative for Autumn
-    'Winter': (12, 2)  # December to February
-}
+    try:
+        supabase_backend = SupabaseBackend.connect(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, SCHEMA_NAME)
+        debug("Supabase client initialized successfully")
+        return supabase_backend
+    except Exception as e:
+        print(f"Error initializing Supabase client: {str(e)}", file=sys.stderr)
+        sys.exit(1)
 
 # Cache for location lookups
 location_cache: Dict[Tuple[str, str, str], str] = {}
 # Cache for perp lookups - None means not found
 perp_cache: Dict[str, Optional[str]] = {}
+# Natural key hashes of the perp_location rows already in the database (--delta)
+existing_perp_locations: Set[str] = set()
 
-def load_location_cache() -> None:
+# perp_location columns that identify a row for --delta
+PERP_LOCATION_KEY = ('perp_recid', 'location_recid', 'start_date', 'end_date', 'note')
+
+def load_location_cache(save_check_csv: bool = True) -> None:
     """Load all locations into the cache using the get_locations function."""
-    global location_cache, country_recids, raw_locations_data
+    global location_cache, country_recids, raw_locations_data, location_snapshot
     
     try:
         debug("Loading location cache from database...")
-        result = supabase.rpc('get_locations', params={}).execute()
-        if result.data:
-            debug(f"Found {len(result.data)} locations in database")
-            raw_locations_data = result.data
+        locations = backend.get_locations()
+        if locations:
+            debug(f"Found {len(locations)} locations in database")
+            raw_locations_data = locations
+            location_snapshot = Snapshot.from_location_rows(locations)
             
             # Write the entire structure to a CSV file
-            with open('insert_perp_location_check.csv', 'w', newline='') as f:
-                writer = csv.writer(f)
-                # Write header
-                writer.writerow(['country_name', 'country_recid', 'state_name', 'state_recid', 'location_name', 'location_recid'])
-                # Write data
-                for row in result.data:
-                    writer.writerow([
-                        row['country_name'],
-                        row['country_recid'],
-                        row['state_name'],
-                        row['state_recid'],
-                        row['location_name'],
-                        row['location_recid']
-                    ])
+            if save_check_csv:
+                with open('insert_perp_location_check.csv', 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    # Write header
+                    writer.writerow(['country_name', 'country_recid', 'state_name', 'state_recid', 'location_name', 'location_recid'])
+                    # Write data
+                    for row in locations:
+                        writer.writerow([
+                            row['country_name'],
+                            row['country_recid'],
+                            row['state_name'],
+                            row['state_recid'],
+                            row['location_name'],
+                            row['location_recid']
+                        ])
             
-            for row in result.data:
+            for row in locations:
                 # Skip if any required fields are null
                 if row['country_name'] is None or row['country_recid'] is None:
                     continue
@@ -150,91 +136,11 @@ def get_location_recid(country: str, state: str, location: str) -> Optional[str]
             debug(f"No location_recid found for {country}/{state}/{location}")
     return recid
 
-def parse_date_range(year_str: str) -> Tuple[Optional[int], Optional[int]]:
-    """Parse year string into start and end years."""
-    if '-' in year_str:
-        start_year, end_year = map(int, year_str.split('-'))
-        debug(f"Parsed year range: {start_year}-{end_year}")
-        return start_year, end_year
-    year = int(year_str)
-    debug(f"Parsed single year: {year}")
-    return year, None
-
-def parse_month_range(month_str: str) -> Tuple[Optional[int], Optional[int]]:
-    """Parse month string into start and end month numbers."""
-    if '-' in month_str:
-        start_month, end_month = month_str.split('-')
-        start_num = MONTH_MAP.get(start_month)
-        end_num = MONTH_MAP.get(end_month)
-        debug(f"Parsed month range: {start_month}({start_num})-{end_month}({end_num})")
-        return start_num, end_num
-    month_num = MONTH_MAP.get(month_str)
-    debug(f"Parsed single month: {month_str}({month_num})")
-    return month_num, None
-
-def parse_season_range(season_str: str) -> Tuple[Optional[int], Optional[int]]:
-    """Parse season string into start and end month numbers."""
-    if '-' in season_str:
-        start_season, end_season = season_str.split('-')
-        start_range = SEASON_MAP.get(start_season)
-        end_range = SEASON_MAP.get(end_season)
-        if start_range and end_range:
-            debug(f"Parsed season range: {start_season}({start_range[0]})-{end_season}({end_range[1]})")
-            return start_range[0], end_range[1]
-    else:
-        season_range = SEASON_MAP.get(season_str)
-        if season_range:
-            debug(f"Parsed single season: {season_str}({season_range[0]}-{season_range[1]})")
-            return season_range[0], season_range[1]
-    debug(f"Could not parse season: {season_str}")
-    return None, None
-
 def process_dates(year: str, start_date: str, end_date: str, month: str) -> Tuple[Optional[str], Optional[str]]:
-    """Process date fields to determine start_date and end_date."""
-    start_year, end_year = parse_date_range(year)
-    
-    # If year is a range, use it directly
-    if end_year:
-        debug(f"Using year range for dates: {start_year}-01-01 to {end_year}-12-31")
-        return f"{start_year}-01-01", f"{end_year}-12-31"
-    
-    # Process start_date and end_date if provided
-    if start_date and end_date:
-        try:
-            start_month, start_day = map(int, start_date.split('/'))
-            end_month, end_day = map(int, end_date.split('/'))
-            debug(f"Using provided dates: {start_year}-{start_month:02d}-{start_day:02d} to {start_year}-{end_month:02d}-{end_day:02d}")
-            return f"{start_year}-{start_month:02d}-{start_day:02d}", f"{start_year}-{end_month:02d}-{end_day:02d}"
-        except ValueError:
-            debug("Invalid date format in start_date/end_date")
-            pass
-    
-    # Process month if provided
-    if month:
-        # Check if it's a season
-        if month in SEASON_MAP or ('-' in month and all(s in SEASON_MAP for s in month.split('-'))):
-            start_month, end_month = parse_season_range(month)
-        else:
-            start_month, end_month = parse_month_range(month)
-            
-        if start_month:
-            start_date = f"{start_year}-{start_month:02d}-01"
-            if end_month:
-                # Handle year wrap-around for seasons like Winter (Dec-Feb)
-                if end_month < start_month:
-                    end_year = start_year + 1
-                else:
-                    end_year = start_year
-                end_date = f"{end_year}-{end_month:02d}-28"  # Using 28 to be safe
-                debug(f"Using month/season range: {start_date} to {end_date}")
-            else:
-                end_date = None
-                debug(f"Using single month: {start_date}")
-            return start_date, end_date
-    
-    # If no specific dates, use full year
-    debug(f"Using full year: {start_year}-01-01 to {start_year}-12-31")
-    return f"{start_year}-01-01", f"{start_year}-12-31"
+    """Process date fields to determine start_date and end_date, for input without the ISO date columns."""
+    start_date, end_date = resolve_dates(year, start_date or '', end_date or '', month or '')
+    debug(f"Resolved dates: {start_date} to {end_date}")
+    return start_date, end_date
 
 def get_perp_recid(perp_name: str) -> Optional[str]:
     """Get the recid for a perp by name."""
@@ -249,9 +155,8 @@ def get_perp_recid(perp_name: str) -> Optional[str]:
     try:
         debug(f"Looking up perp: {perp_name} - schema: {SCHEMA_NAME}")
         # Remove schema prefix from table name as it's handled by the connection
-        result = supabase.table('perp').select('recid').eq('name', perp_name).execute()
-        if result.data:
-            perp_recid = result.data[0]['recid']
+        perp_recid = backend.find_perps([perp_name]).get(perp_name)
+        if perp_recid:
             # Add to cache
             perp_cache[perp_name] = perp_recid
             debug(f"Found perp_recid: {perp_recid}")
@@ -265,6 +170,30 @@ def get_perp_recid(perp_name: str) -> Optional[str]:
         print(f"Error looking up perp '{perp_name}': {str(e)}", file=sys.stderr)
         return None
 
+def perp_location_key(perp_location_data: dict) -> str:
+    """Hash of the natural key of a perp_location row.  Missing and empty values
+    hash the same, so a NULL note in the database matches an empty Note column."""
+    parts = []
+    for column in PERP_LOCATION_KEY:
+        value = perp_location_data.get(column)
+        parts.append('' if value is None else str(value))
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def prefetch_perps(perp_names: Iterable[str]) -> None:
+    """Look up the recids of all perp names at once and fill perp_cache."""
+    names = sorted(set(perp_names) - set(perp_cache))
+    debug(f"Prefetching {len(names)} perps")
+    found = backend.find_perps(names)
+    for name in names:
+        perp_cache[name] = found.get(name)
+
+def load_existing_perp_locations(perp_recids: Iterable[str]) -> None:
+    """Fetch the perp_location rows of the given perps and remember their natural key hashes."""
+    recids = sorted(set(perp_recids))
+    for row in backend.fetch_perp_locations(recids, PERP_LOCATION_KEY):
+        existing_perp_locations.add(perp_location_key(row))
+    debug(f"Loaded {len(existing_perp_locations)} existing perp_location rows for {len(recids)} perps")
+
 def format_sql_insert(perp_location_data: dict) -> str:
     """Format the insert data as a SQL statement."""
     columns = []
@@ -288,14 +217,42 @@ def format_sql_insert(perp_location_data: dict) -> str:
     debug(f"Generated SQL: {sql}")
     return sql
 
+def insert_rows(rows: list) -> None:
+    """Insert perp_location rows with one request, reporting instead of raising errors."""
+    if not rows:
+        return
+    try:
+        backend.insert_perp_locations(rows)
+        debug(f"Inserted {len(rows)} perp_location records with created_date={date_now_date_only}")
+    except Exception as e:
+        print(f"Error inserting {len(rows)} records: {str(e)}", file=sys.stderr)
+    rows.clear()
+
 def main():
-    global DEBUG, date_now, date_now_date_only, state_bad_combinations, country_recids
+    global DEBUG, date_now, date_now_date_only, state_bad_combinations, country_recids, backend
     
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Process and insert perp location data')
-    parser.add_argument('--insert', action='store_true', help='Execute the insert statements instead of just printing them')
+    output_mode = parser.add_mutually_exclusive_group()
+    output_mode.add_argument('--insert', action='store_true', help='Execute the insert statements instead of just printing them')
+    output_mode.add_argument('--copy', action='store_true',
+                             help='Print a COPY perp_location ... FROM STDIN payload for psql instead of INSERT statements, '
+                                  'and also write process_state.copy and process_location.copy')
+    parser.add_argument('--delta', action='store_true',
+                        help='Skip rows that are already in perp_location (same perp, location, dates and note)')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--sqlite', metavar='PATH',
+                        help='Use a local SQLite database (see importer_backends.py) instead of Supabase')
+    source.add_argument('--offline', metavar='DIR',
+                        help='Read insert_perp_location_check.csv, perp.csv (and perp_location.csv for --delta) '
+                             'from DIR instead of Supabase.  Only generates SQL')
+    parser.add_argument('--resolved-csv', metavar='PATH',
+                        help='Also write every resolved row (perp, place, type, dates) to a CSV for interval_index.py')
+    parser.add_argument('--batch-size', type=int, default=1, help='Rows per insert request with --insert (default: 1)')
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
     args = parser.parse_args()
+    if args.offline and args.insert:
+        parser.error('--insert cannot be used with --offline')
     
     DEBUG = args.debug
     debug("Debug mode enabled")
@@ -307,12 +264,34 @@ def main():
     debug(f"Initialized date_now: {date_now}")
     debug(f"Using date_only: {date_now_date_only}")
     
-    # Load location cache
-    load_location_cache()
+    if args.offline:
+        backend = SnapshotBackend(args.offline)
+    elif args.sqlite:
+        backend = SqliteBackend(args.sqlite)
+    else:
+        # Connects on the first request
+        backend = LazyBackend(connect_supabase)
+    pending_inserts = []
+
+    # Load location cache, the snapshot is already a copy of it when offline
+    load_location_cache(save_check_csv=not args.offline)
     
     # Read from stdin
     debug("Reading input from stdin...")
     reader = csv.DictReader(sys.stdin, delimiter='|')
+    copy_out = CopyFileWriter('-') if args.copy else None
+    resolved_file = open(args.resolved_csv, 'w', newline='') if args.resolved_csv else None
+    resolved_writer = None
+    if resolved_file is not None:
+        resolved_writer = csv.writer(resolved_file)
+        resolved_writer.writerow(RESOLVED_COLUMNS)
+    skipped_existing = 0
+
+    if args.delta:
+        # Read the input up front so the perps and their existing rows are fetched in bulk
+        reader = [row for row in reader if row['Status'] == 'MATCHED']
+        prefetch_perps(row['Perp Name'] for row in reader)
+        load_existing_perp_locations(recid for recid in perp_cache.values() if recid)
     
     for row in reader:
         debug(f"\nProcessing record: {row['Perp Name']} at {row['Location']}")
@@ -356,15 +335,11 @@ def main():
                 # First check if country exists
                 if row['Country'] in country_recids:
                     country_exists = True
-                    # Then check if state exists for this country using raw data
-                    for loc_data in raw_locations_data:
-                        if loc_data['country_name'] == row['Country'] and \
-                           loc_data['state_name'] == row['State'] and \
-                           loc_data['state_recid'] is not None:
-                            state_exists = True
-                            if row['State'] == 'West Virginia':
-                                debug(f"Found West Virginia: {loc_data['country_name']}|{loc_data['state_name']}")
-                            break
+                    # Then check if state exists for this country
+                    if (country_recids[row['Country']], row['State']) in location_snapshot.states:
+                        state_exists = True
+                        if row['State'] == 'West Virginia':
+                            debug(f"Found West Virginia: {row['Country']}|{row['State']}")
                 
                 warning_msg = f"Warning: Location not found for {row['Country']}|{row['State']}|{row['Location']}"
                 if not country_exists:
@@ -373,11 +348,6 @@ def main():
                     warning_msg += " - State BAD"
                     # Add to state bad combinations if unique
                     state_bad_combinations.add((row['Country'], row['State'], row['Location']))
-                    # Track location for this new state
-                    state_key = (row['Country'], row['State'])
-                    if state_key not in new_state_locations:
-                        new_state_locations[state_key] = set()
-                    new_state_locations[state_key].add(row['Location'])
                     if row['State'] == 'West Virginia':
                         debug(f"Adding West Virginia to state_bad_combinations")
                 else:
@@ -387,14 +357,17 @@ def main():
                 continue
             
         try:
-            # Process dates
-            debug(f"Processing dates - Year: {row['Year']}, Start: {row['Start Date']}, End: {row['End Date']}, Month: {row['Month']}")
-            start_date, end_date = process_dates(
-                row['Year'],
-                row['Start Date'],
-                row['End Date'],
-                row['Month']
-            )
+            # Dates, already resolved by process_locations.py unless the input predates the ISO columns
+            if row.get('ISO Start Date'):
+                start_date, end_date = row['ISO Start Date'], row['ISO End Date'] or None
+            else:
+                debug(f"Processing dates - Year: {row['Year']}, Start: {row['Start Date']}, End: {row['End Date']}, Month: {row['Month']}")
+                start_date, end_date = process_dates(
+                    row['Year'],
+                    row['Start Date'],
+                    row['End Date'],
+                    row['Month']
+                )
             
             # Prepare perp_location data
             perp_location_data = {
@@ -409,13 +382,28 @@ def main():
                 'changed_date': date_now_date_only
             }
             debug(f"Prepared perp_location data: {perp_location_data}")
+
+            if resolved_writer is not None:
+                resolved_writer.writerow([row['Perp Name'], perp_recid, row['Country'], row['State'], row['Location'],
+                                          location_recid, row['Type'], start_date, end_date, row['Note']])
+
+            if args.delta:
+                key = perp_location_key(perp_location_data)
+                if key in existing_perp_locations:
+                    debug("Row already in perp_location, skipping")
+                    skipped_existing += 1
+                    continue
+                # Also skips repeats of the same row within the input
+                existing_perp_locations.add(key)
             
             if args.insert:
-                # Insert perp_location record
-                debug("Executing insert...")
-                # Remove schema prefix from table name as it's handled by the connection
-                result = supabase.table('perp_location').insert(perp_location_data).execute()
-                debug(f"Inserted perp_location record for {row['Perp Name']} at {row['Location']} with created_date={date_now_date_only}")
+                # Insert perp_location records batch_size at a time
+                pending_inserts.append(perp_location_data)
+                if len(pending_inserts) >= args.batch_size:
+                    insert_rows(pending_inserts)
+            elif copy_out is not None:
+                # One COPY block for every row, None becomes \N
+                copy_out.insert(f"{SCHEMA_NAME}.perp_location", perp_location_data.keys(), perp_location_data.values())
             else:
                 # Print SQL statement (default behavior)
                 debug("Generating SQL statement...")
@@ -425,6 +413,14 @@ def main():
             print(f"Error processing record: {str(e)}", file=sys.stderr)
             continue
 
+    insert_rows(pending_inserts)
+    if resolved_file is not None:
+        resolved_file.close()
+    if copy_out is not None:
+        copy_out.close()
+    if args.delta:
+        print(f"Skipped {skipped_existing} rows already in perp_location", file=sys.stderr)
+
     # Write state bad combinations to CSV and SQL files
     if state_bad_combinations:
         # Write CSV file
@@ -434,54 +430,23 @@ def main():
             for country, state, location in sorted(state_bad_combinations):
                 writer.writerow([country, state, location])
         
-        # Write SQL file
-        with open('process_state.sql', 'w') as f:
-            sequence = 1
-            for country, state, _ in sorted(state_bad_combinations):
-                if country in country_recids:
-                    country_recid = country_recids[country]
-                    # Generate sequence number with leading zeros
-                    seq_str = str(sequence).zfill(4)
-                    f.write(f"INSERT INTO {SCHEMA_NAME}.state(recid,country_recid,name) values('20250410-ffff-ffff-ffff-ffffffff{seq_str}','{country_recid}', '{state}');\n")
-                    sequence += 1
-
-    # Write missing locations to SQL file
-    if missing_locations or new_state_locations:
-        with open('process_location.sql', 'w') as f:
-            sequence = 1
-            
-            # First handle locations for existing states
-            for country, state, location in sorted(missing_locations):
-                # Find the state_recid from raw_locations_data
-                state_recid = None
-                for loc_data in raw_locations_data:
-                    if loc_data['country_name'] == country and loc_data['state_name'] == state:
-                        state_recid = loc_data['state_recid']
-                        break
-                
-                if state_recid:
-                    # Generate sequence number with leading zeros
-                    seq_str = str(sequence).zfill(4)
-                    f.write(f"INSERT INTO {SCHEMA_NAME}.location(recid,state_recid,name) values('20250410-ffff-ffff-ffff-ffffffff{seq_str}','{state_recid}', '{location}');\n")
-                    sequence += 1
-            
-            # Then handle locations for new states
-            for (country, state), locations in sorted(new_state_locations.items()):
-                # Find the state_recid that would be in process_state.sql
-                state_recid = None
-                state_sequence = 1
-                for c, s, _ in sorted(state_bad_combinations):
-                    if c == country and s == state:
-                        state_recid = f"20250410-ffff-ffff-ffff-ffffffff{str(state_sequence).zfill(4)}"
-                        break
-                    state_sequence += 1
-                
-                if state_recid:
-                    for location in sorted(locations):
-                        # Generate sequence number with leading zeros
-                        seq_str = str(sequence).zfill(4)
-                        f.write(f"INSERT INTO {SCHEMA_NAME}.location(recid,state_recid,name) values('20250410-ffff-ffff-ffff-ffffffff{seq_str}','{state_recid}', '{location}');\n")
-                        sequence += 1
+    # Diff the missing states and locations against the get_locations snapshot.  Countries
+    # are never added here, places in unknown countries only show up in the warnings.
+    changes = diff(location_snapshot, sorted(state_bad_combinations | missing_locations), add_countries=False)
+    if changes.states:
+        with SqlFileWriter('process_state.sql') as state_sql:
+            write_change_set(changes, SCHEMA_NAME, None, state_sql, None)
+    if changes.locations:
+        with SqlFileWriter('process_location.sql') as location_sql:
+            write_change_set(changes, SCHEMA_NAME, None, None, location_sql)
+    if args.copy:
+        # The same rows as COPY blocks for psql
+        if changes.states:
+            with CopyFileWriter('process_state.copy') as state_copy:
+                write_change_set(changes, SCHEMA_NAME, None, state_copy, None)
+        if changes.locations:
+            with CopyFileWriter('process_location.copy') as location_copy:
+                write_change_set(changes, SCHEMA_NAME, None, None, location_copy)
 
 if __name__ == '__main__':
     main()
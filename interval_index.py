@@ -0,0 +1,266 @@
+"""Who was where, when: overlap queries over resolved perp_location rows.
+
+Rows are (perp, country, state, location, type, start date, end date) with
+ISO dates, read either from process_locations.py output (the ISO Start Date
+and ISO End Date columns) or from the CSV insert_perp_locations.py writes
+with --resolved-csv.  IntervalIndex groups them per location, per state and
+per country and builds a centered interval tree for a group the first time
+it is queried, so a query costs O(log n + k) for the k rows it returns.
+
+    python interval_index.py abc2.txt --perp "Marion Crawford"
+    python interval_index.py abc2.txt --perp "Marion Crawford" --level state
+    python interval_index.py abc2.txt --where "Canada|Alberta|Calgary" --between 1950-01-01 1952-12-31
+
+--perp is the batch co-location report: every other perp whose rows
+overlap one of that perp's rows at the same location (or state, or
+country).  For every overlapping pair in the corpus see colocation.py.
+"""
+
+import argparse
+import calendar
+import csv
+import sys
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Columns of the --resolved-csv file written by insert_perp_locations.py
+RESOLVED_COLUMNS = ('perp_name', 'perp_recid', 'country', 'state', 'location', 'location_recid', 'type',
+                    'start_date', 'end_date', 'note')
+
+LEVELS = ('location', 'state', 'country')
+
+
+class Interval(NamedTuple):
+    start: str      # ISO date
+    end: str        # ISO date, the end of the start month for rows that only have a start
+    perp: str
+    country: str
+    state: str
+    location: str
+    type: str
+
+
+def level_key(interval: Interval, level: str) -> Tuple[str, ...]:
+    """The place interval belongs to at a level of the gazetteer."""
+    if level == 'location':
+        return interval.country, interval.state, interval.location
+    if level == 'state':
+        return interval.country, interval.state
+    if level == 'country':
+        return (interval.country,)
+    raise ValueError(f"Unknown level: {level}")
+
+
+def default_end(start: str) -> str:
+    """End date for a row with only a start date.  A single month row
+    ('Jul 1950' -> 1950-07-01) covers the whole month, a bare year the whole year."""
+    parts = start.split('-')
+    try:
+        year = int(parts[0])
+        if len(parts) < 2:
+            return f"{year:04d}-12-31"
+        month = int(parts[1])
+        return f"{year:04d}-{month:02d}-{calendar.monthrange(year, month)[1]:02d}"
+    except ValueError:
+        return start
+
+
+def make_interval(perp: str, country: str, state: str, location: str, row_type: str,
+                  start: Optional[str], end: Optional[str]) -> Optional[Interval]:
+    """An Interval, or None for rows without a start date or a country."""
+    if not start or not country:
+        return None
+    end = end or default_end(start)
+    if end < start:
+        start, end = end, start
+    return Interval(start, end, perp, country, state, location, row_type)
+
+
+def read_intervals(path: str) -> Iterator[Interval]:
+    """Intervals from process_locations.py output or a --resolved-csv file,
+    told apart by the header."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        header = f.readline()
+        f.seek(0)
+        if '|' in header:
+            reader = csv.DictReader(f, delimiter='|')
+            if 'ISO Start Date' not in (reader.fieldnames or []):
+                raise ValueError(f"{path} has no ISO Start Date column, rerun process_locations.py")
+            for row in reader:
+                if row['Status'] != 'MATCHED':
+                    continue
+                interval = make_interval(row['Perp Name'], row['Country'], row['State'], row['Location'],
+                                         row['Type'], row['ISO Start Date'], row['ISO End Date'])
+                if interval:
+                    yield interval
+        else:
+            reader = csv.DictReader(f)
+            missing = [column for column in ('perp_name', 'country', 'state', 'location', 'start_date', 'end_date')
+                       if column not in (reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f"{path} is missing column(s): {', '.join(missing)}")
+            for row in reader:
+                interval = make_interval(row['perp_name'], row['country'], row['state'], row['location'],
+                                         row.get('type', ''), row['start_date'], row['end_date'])
+                if interval:
+                    yield interval
+
+
+class _Node:
+    """Centered interval tree node: the intervals containing center, sorted
+    both ways, and the subtrees of the intervals entirely left / right of it."""
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, center: str, here: List[Interval]):
+        self.center = center
+        self.by_start = sorted(here, key=lambda interval: interval.start)
+        self.by_end = sorted(here, key=lambda interval: interval.end, reverse=True)
+        self.left: Optional['_Node'] = None
+        self.right: Optional['_Node'] = None
+
+
+def _build(intervals: List[Interval]) -> Optional[_Node]:
+    if not intervals:
+        return None
+    points = sorted(point for interval in intervals for point in (interval.start, interval.end))
+    center = points[len(points) // 2]
+    here, left, right = [], [], []
+    for interval in intervals:
+        if interval.end < center:
+            left.append(interval)
+        elif interval.start > center:
+            right.append(interval)
+        else:
+            here.append(interval)
+    node = _Node(center, here)
+    node.left = _build(left)
+    node.right = _build(right)
+    return node
+
+
+class IntervalTree:
+    """Static centered interval tree over closed [start, end] intervals."""
+
+    def __init__(self, intervals: Iterable[Interval]):
+        self.intervals = list(intervals)
+        self._root = _build(self.intervals)
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    def overlapping(self, start: str, end: str) -> List[Interval]:
+        """Intervals sharing at least one day with [start, end]."""
+        found: List[Interval] = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if end < node.center:
+                # Only the intervals here that start by end, and the left subtree
+                for interval in node.by_start:
+                    if interval.start > end:
+                        break
+                    found.append(interval)
+                stack.append(node.left)
+            elif start > node.center:
+                for interval in node.by_end:
+                    if interval.end < start:
+                        break
+                    found.append(interval)
+                stack.append(node.right)
+            else:
+                found.extend(node.by_start)
+                stack.append(node.left)
+                stack.append(node.right)
+        return found
+
+
+class IntervalIndex:
+    """Intervals grouped by location, state and country, one tree per group."""
+
+    def __init__(self, intervals: Iterable[Interval]):
+        self.intervals = list(intervals)
+        self._groups: Dict[str, Dict[Tuple[str, ...], List[Interval]]] = {level: {} for level in LEVELS}
+        for interval in self.intervals:
+            for level in LEVELS:
+                self._groups[level].setdefault(level_key(interval, level), []).append(interval)
+        self._trees: Dict[Tuple[str, Tuple[str, ...]], IntervalTree] = {}
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'IntervalIndex':
+        return cls(read_intervals(path))
+
+    def keys(self, level: str) -> List[Tuple[str, ...]]:
+        return sorted(self._groups[level])
+
+    def tree(self, level: str, key: Sequence[str]) -> IntervalTree:
+        key = tuple(key)
+        tree = self._trees.get((level, key))
+        if tree is None:
+            tree = IntervalTree(self._groups[level].get(key, []))
+            self._trees[(level, key)] = tree
+        return tree
+
+    def overlapping(self, level: str, key: Sequence[str], start: str, end: str) -> List[Interval]:
+        """Rows at the place key (see level_key) overlapping [start, end], by start date."""
+        return sorted(self.tree(level, key).overlapping(start, end))
+
+    def colocated_with(self, perp: str, level: str = 'location') -> List[Tuple[Interval, Interval]]:
+        """(row of perp, overlapping row of another perp) pairs at the same place."""
+        pairs = []
+        for interval in sorted(i for i in self.intervals if i.perp == perp):
+            for other in self.overlapping(level, level_key(interval, level), interval.start, interval.end):
+                if other.perp != perp:
+                    pairs.append((interval, other))
+        return pairs
+
+
+def overlap_window(a: Interval, b: Interval) -> Tuple[str, str]:
+    return max(a.start, b.start), min(a.end, b.end)
+
+
+def format_place(interval: Interval) -> str:
+    return '|'.join((interval.country, interval.state, interval.location))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Overlap queries over resolved perp_location rows')
+    parser.add_argument('input', help='process_locations.py output or an insert_perp_locations.py --resolved-csv file')
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument('--perp', help='Report the perps whose rows overlap this perp\'s rows')
+    query.add_argument('--where', metavar='PLACE',
+                       help='Country, Country|State or Country|State|Location to list the rows of')
+    parser.add_argument('--level', choices=LEVELS, default='location', help='Place level for --perp (default: location)')
+    parser.add_argument('--between', nargs=2, metavar=('START', 'END'), default=('0000-01-01', '9999-12-31'),
+                        help='ISO date range for --where (default: all dates)')
+    args = parser.parse_args()
+
+    try:
+        index = IntervalIndex.from_file(args.input)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.perp:
+        pairs = index.colocated_with(args.perp, args.level)
+        for mine, other in pairs:
+            window_start, window_end = overlap_window(mine, other)
+            print(f"{other.perp}|{format_place(other)}|{other.type}|{window_start}|{window_end}"
+                  f"|{mine.type}|{format_place(mine)}")
+        print(f"{len(pairs)} overlapping rows for {args.perp} at the same {args.level}", file=sys.stderr)
+    else:
+        key = tuple(args.where.split('|'))
+        level = LEVELS[3 - len(key)] if 1 <= len(key) <= 3 else None
+        if level is None:
+            parser.error('--where takes Country, Country|State or Country|State|Location')
+        rows = index.overlapping(level, key, *args.between)
+        for interval in rows:
+            print(f"{interval.perp}|{format_place(interval)}|{interval.type}|{interval.start}|{interval.end}")
+        print(f"{len(rows)} rows", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
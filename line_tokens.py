@@ -0,0 +1,121 @@
+"""Tokenizer shared by the process_locations.py handlers.
+
+tokenize_line() scans a line once and returns its tokens in order of
+position.  Tokens can nest: a month inside parentheses is both part of a
+PAREN token and a MONTH token of its own, so a handler can ask for
+whichever it needs.  Results are cached, so the handlers, the router and
+the helpers that look at the same string share one scan.
+
+Token kinds:
+    YEAR         1950
+    MONTH_RANGE  Jan-July, Winter - Spring
+    MONTH        Jan, September, Spring (months and seasons)
+    DAY_RANGE    5, 5-7
+    PAREN        (...)            value is the text between the parentheses
+    ASTERISK     *...*            value is the text between the asterisks
+    WITH         with Jane, w/ Jane   value is the text after with / w/
+    KEYWORD      workers list, convention, ...   value is the keyword
+    WORD         any other word
+"""
+
+import re
+from functools import lru_cache
+from typing import FrozenSet, Iterator, NamedTuple, Optional, Tuple
+
+YEAR = 'YEAR'
+MONTH_RANGE = 'MONTH_RANGE'
+MONTH = 'MONTH'
+DAY_RANGE = 'DAY_RANGE'
+PAREN = 'PAREN'
+ASTERISK = 'ASTERISK'
+WITH = 'WITH'
+KEYWORD = 'KEYWORD'
+WORD = 'WORD'
+
+_MONTH_NAMES = (r'Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?'
+                r'|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?|Winter|Spring|Summer|Fall|Autumn')
+
+_MONTH_PATTERN = re.compile(rf'\b(?:(?P<range>(?:{_MONTH_NAMES})\s*-\s*(?:{_MONTH_NAMES}))|(?:{_MONTH_NAMES}))\b',
+                            re.IGNORECASE)
+_YEAR_PATTERN = re.compile(r'\b\d{4}\b')
+_DAY_RANGE_PATTERN = re.compile(r'(?<![\d-])\d{1,2}(?:-\d{1,2})?(?![\d])')
+_PAREN_PATTERN = re.compile(r'\((.*?)\)')
+_ASTERISK_PATTERN = re.compile(r'\*(.*?)\*')
+_WITH_PATTERN = re.compile(r'(?:\bwith\b|\bWith\b|\bw/)\s*(.*)$')
+_WORD_PATTERN = re.compile(r"[^\W\d_][\w.'’-]*")
+
+# Keywords the handlers are routed on.  These match anywhere in the
+# lowercased line, like the substring checks they replace ('visit' also
+# matches 'Visiting').
+KEYWORDS = ('workers list', 'workers meeting', 'staff', 'convention', 'visit', 'return', 'photo', 'picture',
+            'removed from', 'guestbook', 'guest book')
+_KEYWORD_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword in KEYWORDS))
+# Keywords that only count with this exact capitalization
+CASED_KEYWORDS = ('Special Meeting', 'Started in the work')
+_CASED_KEYWORD_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword in CASED_KEYWORDS))
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str    # the matched text
+    start: int
+    end: int
+    value: str   # the useful part of the text, see the module docstring
+
+
+def _scan(line: str) -> Iterator[Token]:
+    for match in _YEAR_PATTERN.finditer(line):
+        yield Token(YEAR, match.group(0), match.start(), match.end(), match.group(0))
+    for match in _MONTH_PATTERN.finditer(line):
+        kind = MONTH_RANGE if match.group('range') else MONTH
+        yield Token(kind, match.group(0), match.start(), match.end(), match.group(0))
+    for match in _DAY_RANGE_PATTERN.finditer(line):
+        yield Token(DAY_RANGE, match.group(0), match.start(), match.end(), match.group(0))
+    for match in _PAREN_PATTERN.finditer(line):
+        yield Token(PAREN, match.group(0), match.start(), match.end(), match.group(1))
+    for match in _ASTERISK_PATTERN.finditer(line):
+        yield Token(ASTERISK, match.group(0), match.start(), match.end(), match.group(1))
+    match = _WITH_PATTERN.search(line)
+    if match:
+        yield Token(WITH, match.group(0), match.start(), match.end(), match.group(1))
+    for match in _KEYWORD_PATTERN.finditer(line.lower()):
+        yield Token(KEYWORD, line[match.start():match.end()], match.start(), match.end(), match.group(0))
+    for match in _CASED_KEYWORD_PATTERN.finditer(line):
+        yield Token(KEYWORD, match.group(0), match.start(), match.end(), match.group(0))
+    for match in _WORD_PATTERN.finditer(line):
+        yield Token(WORD, match.group(0), match.start(), match.end(), match.group(0))
+
+
+@lru_cache(maxsize=65536)
+def tokenize_line(line: str) -> Tuple[Token, ...]:
+    """All tokens of line ordered by position (outer tokens before the tokens inside them)."""
+    return tuple(sorted(_scan(line), key=lambda token: (token.start, -token.end)))
+
+
+def tokens_of(line: str, kind: str) -> Tuple[Token, ...]:
+    """The tokens of one kind in line, in order."""
+    return tuple(token for token in tokenize_line(line) if token.kind == kind)
+
+
+def first_token(line: str, kind: str) -> Optional[Token]:
+    """The first token of a kind in line, or None."""
+    for token in tokenize_line(line):
+        if token.kind == kind:
+            return token
+    return None
+
+
+@lru_cache(maxsize=65536)
+def line_keywords(line: str) -> FrozenSet[str]:
+    """The routing keywords that appear in line."""
+    return frozenset(token.value for token in tokenize_line(line) if token.kind == KEYWORD)
+
+
+def leading_month(line: str) -> Optional[str]:
+    """The month, season or month range line starts with, e.g. 'Jan-July' for 'Jan-July Workers List'."""
+    for token in tokenize_line(line):
+        if token.start > 0:
+            break
+        if token.kind in (MONTH_RANGE, MONTH):
+            return token.text
+    return None
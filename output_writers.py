@@ -0,0 +1,191 @@
+"""Output writers for the rows produced by process_locations.py.
+
+Every writer emits the same columns in the same order.  Matched rows go to
+the main stream and NOMATCH/error lines go to a separate rejects stream so
+downstream consumers (insert_perp_locations.py) only ever see parseable rows.
+"""
+
+import csv
+import io
+import json
+import sys
+from typing import Iterable, List, Optional, TextIO
+
+# Column order for every output format
+OUTPUT_COLUMNS = [
+    'Status',
+    'Perp Name',
+    'Year',
+    'Type',
+    'Country',
+    'State',
+    'Location',
+    'Note',
+    'Start Date',
+    'End Date',
+    'Month',
+    'Original Text',
+    'Fixed Text',
+    'ISO Start Date',
+    'ISO End Date'
+]
+
+
+# Buffered text is written to the underlying stream once it reaches this size
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+
+class OutputSink:
+    """Accumulates text and writes it to a stream in large chunks.
+
+    Text is held until chunk_size characters are pending or flush() is
+    called.  With line_buffered=True every write goes straight to the stream
+    and is flushed, which is what you want when watching output interactively.
+    """
+
+    def __init__(self, stream: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE, line_buffered: bool = False):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.line_buffered = line_buffered
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, text: str) -> None:
+        if self.line_buffered:
+            self.stream.write(text)
+            self.stream.flush()
+            return
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self.chunk_size:
+            self._drain()
+
+    def _drain(self) -> None:
+        if self._pending:
+            self.stream.write(''.join(self._pending))
+            self._pending.clear()
+            self._pending_size = 0
+
+    def flush(self) -> None:
+        """Write any pending text and flush the stream."""
+        self._drain()
+        self.stream.flush()
+
+
+class OutputWriter:
+    """Base class for output writers.
+
+    Rows are formatted into an OutputSink and written to the stream in large
+    chunks instead of one print() per row.  Call flush() at file boundaries.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, reject_stream: Optional[TextIO] = None,
+                 line_buffered: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.sink = OutputSink(stream if stream is not None else sys.stdout, chunk_size, line_buffered)
+        self.reject_sink = OutputSink(reject_stream if reject_stream is not None else sys.stderr, chunk_size, line_buffered)
+        self.header_written = False
+
+    def format_header(self) -> Optional[str]:
+        """Return the header text, or None if the format has no header."""
+        raise NotImplementedError
+
+    def format_row(self, values: List[str]) -> str:
+        """Return a single formatted row including its line terminator."""
+        raise NotImplementedError
+
+    def write_header(self) -> None:
+        """Write the header once, no matter how many files are processed."""
+        if self.header_written:
+            return
+        header = self.format_header()
+        if header:
+            self.sink.write(header)
+        self.header_written = True
+
+    def write_row(self, values: List[str]) -> None:
+        """Write a row of values in OUTPUT_COLUMNS order."""
+        self.sink.write(self.format_row(values))
+
+    def write_rows(self, rows: Iterable[List[str]]) -> None:
+        """Write many rows at once."""
+        for values in rows:
+            self.write_row(values)
+
+    def write_reject(self, line: str) -> None:
+        """Write a line that no handler matched to the rejects stream."""
+        self.reject_sink.write(f"NOMATCH - {line}\n")
+
+    def write_error(self, message: str) -> None:
+        """Write an error message to the rejects stream."""
+        self.reject_sink.write(f"{message}\n")
+
+    def flush(self) -> None:
+        """Write everything buffered so far to the output streams."""
+        self.sink.flush()
+        self.reject_sink.flush()
+
+
+class DelimitedWriter(OutputWriter):
+    """Writer for delimited text.  Fields containing the delimiter, quotes or
+    newlines are quoted so csv readers split them correctly."""
+
+    delimiter = ','
+
+    def __init__(self, stream: Optional[TextIO] = None, reject_stream: Optional[TextIO] = None,
+                 line_buffered: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(stream, reject_stream, line_buffered, chunk_size)
+        self._csv = csv.writer(self.sink, delimiter=self.delimiter, lineterminator='\n',
+                               quoting=csv.QUOTE_MINIMAL)
+
+    def format_header(self) -> Optional[str]:
+        return self.delimiter.join(OUTPUT_COLUMNS) + '\n'
+
+    def write_row(self, values: List[str]) -> None:
+        self._csv.writerow(values)
+
+    def write_rows(self, rows: Iterable[List[str]]) -> None:
+        self._csv.writerows(rows)
+
+    def format_row(self, values: List[str]) -> str:
+        out = io.StringIO()
+        csv.writer(out, delimiter=self.delimiter, lineterminator='\n',
+                   quoting=csv.QUOTE_MINIMAL).writerow(values)
+        return out.getvalue()
+
+
+class PipeWriter(DelimitedWriter):
+    """Pipe delimited output.  This is the default format and is what
+    insert_perp_locations.py reads."""
+
+    delimiter = '|'
+
+
+class CsvWriter(DelimitedWriter):
+    """Comma delimited output."""
+
+    delimiter = ','
+
+
+class NdjsonWriter(OutputWriter):
+    """One JSON object per line keyed by OUTPUT_COLUMNS."""
+
+    def format_header(self) -> Optional[str]:
+        return None
+
+    def format_row(self, values: List[str]) -> str:
+        return json.dumps(dict(zip(OUTPUT_COLUMNS, values)), ensure_ascii=False) + '\n'
+
+
+OUTPUT_WRITERS = {
+    'pipe': PipeWriter,
+    'csv': CsvWriter,
+    'ndjson': NdjsonWriter,
+}
+
+
+def get_writer(output_format: str, stream: Optional[TextIO] = None,
+               reject_stream: Optional[TextIO] = None, line_buffered: bool = False) -> OutputWriter:
+    """Create the writer for the given format name (pipe, csv or ndjson)."""
+    if output_format not in OUTPUT_WRITERS:
+        raise ValueError(f"Unknown output format '{output_format}'. Expected one of: {', '.join(OUTPUT_WRITERS)}")
+    return OUTPUT_WRITERS[output_format](stream, reject_stream, line_buffered)
@@ -0,0 +1,44 @@
+"""Data structure containing perp information used by process_locations.py.
+
+home_country is used when a line does not name a country.  Add new perps here
+rather than in the code.
+"""
+
+perps = {
+   'Albert Clark': {
+      'home_country': 'Canada',
+   },
+   'Brad Holman': {
+      'home_country': 'United States',
+   },
+   'Dean Bruer': {
+      'home_country': 'United States',
+   },
+   'Jack Reddekopp': {
+      'home_country': 'Canada',
+   },
+   'John Van Den Berg': {
+      'home_country': 'United States',
+   },
+   'Leslie White': {
+      'home_country': 'United States',
+   },
+   'Luther Raine': {
+      'home_country': 'United States',
+   },
+   'Marion Crawford': {
+      'home_country': 'Canada',
+   },
+   'Mark Huddle': {
+      'home_country': 'United States',
+   },
+   'Michael Payne': {
+      'home_country': 'United States',
+   },
+   'Robert Corfield': {
+      'home_country': 'Canada',
+   },
+   'Robert Flippo': {
+      'home_country': 'United States',
+   },
+}
@@ -4,64 +4,83 @@ import argparse
 from datetime import datetime
 import sys
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
 from dotenv import load_dotenv
-from typing import Optional, Tuple, Dict, List
+from typing import Iterator, Optional, Tuple, Dict, List, TextIO
 from countries_data import countries
-
-# Global variable for validation mode
-validate_mode = False
-
-# Global variable for perp name
-perp_name = ''
-
-# Month name to number mapping
-MONTH_MAP = {
-    'Jan': '01', 'January': '01',
-    'Feb': '02', 'February': '02',
-    'Mar': '03', 'March': '03',
-    'Apr': '04', 'April': '04',
-    'May': '05',
-    'Jun': '06', 'June': '06',
-    'Jul': '07', 'July': '07',
-    'Aug': '08', 'August': '08',
-    'Sep': '09', 'Sept': '09', 'September': '09',
-    'Oct': '10', 'October': '10',
-    'Nov': '11', 'November': '11',
-    'Dec': '12', 'December': '12'
-}
-
-def get_perp_home_country() -> str:
-    """Determine the home country of the current perp based on their name.
-    Returns a string with the country name or None if not found."""
-    global perp_name
-    
-    # Dictionary mapping perp names to their home countries
-    perp_home_countries = {
-        'Marion Crawford': 'Canada',
-        'Robert Flippo': 'United States',
-        'Leslie White': 'United States',
-        'Robert Corfield': 'Canada',
-        'John Van Den Berg': 'United States',
-        'Dean Bruer': 'United States',
-        'Luther Raine': 'United States',
-        'Mark Huddle': 'United States',
-        'Jack Reddekopp': 'Canada',
-        'Albert Clark': 'Canada',
-        'Brad Holman': 'United States',
-        'Michael Payne': 'United States'
-        # Add more mappings as needed
-    }
-
-    home =perp_home_countries.get(perp_name)
-    if not home:
-        home = "--United States--" # This is just for unit testing
-    
-    return home
+from perps_data import perps
+from output_writers import OutputWriter, OUTPUT_WRITERS, get_writer
+from result_table import ResultTable, format_summary
+from rollup import Rollup
+from input_watcher import InputWatcher
+from fuzzy_index import FuzzyIndex, format_suggestions, suggest
+from unmatched_report import UnmatchedReport
+from date_utils import MONTH_NUMBERS, resolve_dates
+from line_tokens import ASTERISK, PAREN, first_token, leading_month, line_keywords, tokens_of
+
+# Home country used when the perp is not in perps_data - This is just for unit testing
+DEFAULT_HOME_COUNTRY = "--United States--"
+
+# Month name to two digit month number mapping
+MONTH_MAP = {name: f"{number:02d}" for name, number in MONTH_NUMBERS.items()}
+
+def get_perp_home_country(name: str) -> str:
+    """Determine the home country of a perp from perps_data.
+    Returns DEFAULT_HOME_COUNTRY if the perp is not listed."""
+    info = perps.get(name)
+    if info and info.get('home_country'):
+        return info['home_country']
+    return DEFAULT_HOME_COUNTRY
+
+@dataclass
+class ParserContext:
+    """Everything parsing a perp's lines depends on besides the lines themselves.
+
+    Each file gets its own context (see process_file), so files can be parsed
+    concurrently from threads or by a service embedding the parser.  The
+    handlers are given the gazetteer and home country from the context, and
+    print_debug writes to the debug stream of the context that is active in
+    the calling thread (see active()).
+    """
+    perp_name: str = ''
+    home_country: Optional[str] = None
+    countries: Dict = field(default_factory=lambda: countries)
+    validate: bool = False
+    debug_stream: Optional[TextIO] = None   # None is stdout
+
+    @classmethod
+    def for_perp(cls, perp_name: str, **kwargs) -> 'ParserContext':
+        """A context for perp_name with the home country from perps_data."""
+        return cls(perp_name=perp_name, home_country=get_perp_home_country(perp_name), **kwargs)
+
+    def debug(self, *args, **kwargs) -> None:
+        """Print debug information only when in validate mode."""
+        if self.validate:
+            kwargs.setdefault('file', self.debug_stream)
+            print(*args, **kwargs)
+
+    @contextmanager
+    def active(self) -> Iterator['ParserContext']:
+        """Make this the context print_debug uses in the current thread."""
+        token = _active_context.set(self)
+        try:
+            yield self
+        finally:
+            _active_context.reset(token)
+
+# Context used when no other one is active, e.g. when calling a handler directly
+DEFAULT_CONTEXT = ParserContext()
+_active_context: ContextVar = ContextVar('parser_context', default=None)
+
+def current_context() -> ParserContext:
+    """The context active in this thread, or DEFAULT_CONTEXT."""
+    return _active_context.get() or DEFAULT_CONTEXT
 
 def print_debug(*args, **kwargs):
-    """Print debug information only when in validate mode."""
-    if validate_mode:
-        print(*args, **kwargs)
+    """Print debug information only when the current context is in validate mode."""
+    current_context().debug(*args, **kwargs)
 
 # Load environment variables
 load_dotenv('.env.local')
@@ -105,11 +124,7 @@ def parse_date_info(date_info: str) -> Tuple[Optional[str], Optional[str]]:
     if date_match:
         month_str, start_day, end_day = date_match.groups()
         # Convert month name to number
-        month_map = {
-            'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-            'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-        }
-        month = month_map.get(month_str[:3])
+        month = MONTH_NUMBERS.get(month_str[:3])
         if month:
             start_day = int(start_day)
             start_date = f"{month}/{start_day}"
@@ -476,7 +491,7 @@ def get_state_country(line: str, countries: Dict) -> Optional[Dict]:
     result['line'] = clean_line(line)
     return result
 
-def handle_convention(line: str, countries: Dict) -> Optional[Dict]:
+def handle_convention(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle convention patterns."""
 
     result = {
@@ -535,15 +550,14 @@ def handle_convention(line: str, countries: Dict) -> Optional[Dict]:
     print_debug(f"BOB CON 0.01 - Line: {line}")
 
     # Handle date or note in parentheses at the end
-    date_visit_matches = re.finditer(r'\((.*?)\)', line)
-    matches_list = list(date_visit_matches)
+    matches_list = tokens_of(line, PAREN)
     
     date_note = None
     visit_note = None
     if len(matches_list) > 0:
         print_debug(f"BOB CON 0.02 - we have date_visit_matches")
         for match in matches_list:
-            date_visit_note = match.group(1).strip()
+            date_visit_note = match.value.strip()
             print_debug(f"BOB CON 0.1 - date_visit_match: {date_visit_note}")
 
             # Check if date_visit_note contains a month or season  JOE
@@ -689,22 +703,25 @@ def handle_convention(line: str, countries: Dict) -> Optional[Dict]:
     result['note'] = line
     print_debug(f"BOB CON 1.8 - note: {result['note']}")
 
-    result = adjust_location_result(result)
+    result = adjust_location_result(result, home_country)
 
     print_debug(f"BOB CON 1.9 - country: |{result['country']}|    state: |{result['state']}|    location: |{result['location']}|")
         
     return result
 
-def adjust_location_result(result):
+def adjust_location_result(result, home_country: Optional[str] = None):
+    """Fill in missing country/state/location.  A missing country falls back
+    to the perp's home country, a missing state to the country and a missing
+    location to the state."""
     if not result['country']:
-        result['country'] = get_perp_home_country()
+        result['country'] = home_country or DEFAULT_HOME_COUNTRY
     if not result['state']:
         result['state'] = result['country']
     if not result['location']:
         result['location'] = result['state']
     return result    
 
-def handle_special_meeting(line: str, countries: Dict) -> Optional[Dict]:
+def handle_special_meeting(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle special meeting patterns.
     Format: YYYY-EEEE TTTT SSSS Special Meeting(s) (NNNN)
     Where:
@@ -818,7 +835,7 @@ def handle_special_meeting(line: str, countries: Dict) -> Optional[Dict]:
     if state_country_info['location']:
         result['location'] = state_country_info['location']
 
-    result = adjust_location_result(result)
+    result = adjust_location_result(result, home_country)
     
     result['note'] = state_country_info['line']
     if date_note:
@@ -947,26 +964,10 @@ def add_to_note_list(current_note: str, addition: str) -> str:
     return new_note
 
 def get_month_or_range(text):
-    matched_month_range = None
-    matched_month_single = None
-
-    single_month_pattern = r'\b(Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?|Winter|Spring|Summer|Fall|Autumn)\b'
-    range_month_pattern = r'\b(Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?|Winter|Spring|Summer|Fall|Autumn)\s*-\s*(Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?|Winter|Spring|Summer|Fall|Autumn)\b'
-
-    range_month_match = re.match(range_month_pattern, text, flags=re.IGNORECASE)
-    if range_month_match:
-        matched_month_range = range_month_match.group(0).strip()
-    else:
-        single_month_match = re.match(single_month_pattern, text, flags=re.IGNORECASE)
-        if single_month_match:
-            matched_month_single = single_month_match.group(0).strip()
-
-    if matched_month_range:
-        return matched_month_range
-    
-    return matched_month_single
+    """The month, season or month range text starts with, or None."""
+    return leading_month(text)
 
-def handle_workers_list(line: str, countries: Dict) -> Optional[Dict]:
+def handle_workers_list(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle workers list patterns."""
     # Only process lines that contain "workers list" or "staff'"
     if 'workers list' not in line.lower() and ('staff' not in line.lower() or 'staff photo' in line.lower()):
@@ -1130,13 +1131,13 @@ def handle_workers_list(line: str, countries: Dict) -> Optional[Dict]:
     note_from_parens = ''
     # Look for text in parentheses in the text after Workers List
     # Look for text in parentheses in the text after Workers List
-    paren_match = re.search(r'\((.*?)\)', text_after)
+    paren_match = first_token(text_after, PAREN)
     if paren_match:
         # From text_after, remove the paren_matching text
         straggler = re.sub(r'\(.*?\)', '', text_after).strip()
         print_debug(f"BOB WL 2.211 - straggler: {straggler}")
 
-        paren_text = paren_match.group(1).strip()
+        paren_text = paren_match.value.strip()
 
         if 'Interlake MB' in paren_text:
             paren_text = paren_text.replace('Interlake MB', 'Interlake')
@@ -1228,9 +1229,9 @@ def handle_workers_list(line: str, countries: Dict) -> Optional[Dict]:
     print_debug(f"BOB WL 4.1 - result['note']: {result['note']}")
 
     # Look for text between asterisks
-    asterisk_match = re.search(r'\*(.*?)\*', text_after)
+    asterisk_match = first_token(text_after, ASTERISK)
     if asterisk_match:
-        asterisk_text = asterisk_match.group(1).strip()
+        asterisk_text = asterisk_match.value.strip()
         # Append to existing note
         result['note'] = add_to_note_list(result['note'], asterisk_text)
         month_or_range = get_month_or_range(asterisk_text)
@@ -1321,7 +1322,7 @@ def handle_workers_list(line: str, countries: Dict) -> Optional[Dict]:
                             result['location'] = the_location
                             break
 
-    result = adjust_location_result(result)
+    result = adjust_location_result(result, home_country)
 
     text_before = state_country_info['line']
 
@@ -1332,7 +1333,7 @@ def handle_workers_list(line: str, countries: Dict) -> Optional[Dict]:
 
     return result
 
-def handle_travel(line: str, countries: Dict) -> Optional[Dict]:
+def handle_travel(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle travel-related entries."""
     result = {
         'type': 'Travel',
@@ -1367,14 +1368,14 @@ def handle_travel(line: str, countries: Dict) -> Optional[Dict]:
                 result['location'] = state_country_info['state']
 
 
-            result = adjust_location_result(result)
+            result = adjust_location_result(result, home_country)
 
             result['note'] = f"{travel_type} {result['country']}"
             return result
 
     return None
 
-def handle_started_work(line: str, countries: Dict) -> Optional[Dict]:
+def handle_started_work(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle patterns indicating when someone started in the work."""
     # Only process lines that contain "Started in the work"
     if 'Started in the work' not in line:
@@ -1427,7 +1428,7 @@ def handle_started_work(line: str, countries: Dict) -> Optional[Dict]:
     if state_country_info['line']:
         result['note'] = result['note'] + ': ' + state_country_info['line']
 
-    result = adjust_location_result(result)
+    result = adjust_location_result(result, home_country)
 
     return result
 
@@ -1452,7 +1453,7 @@ def get_photo_type(line: str) -> Tuple[str, str]:
     
     return None, line
 
-def handle_photo(line: str, countries: Dict) -> Optional[Dict]:
+def handle_photo(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle photo patterns by ignoring them."""
 
     if 'photo' not in line.lower() and 'picture' not in line.lower():
@@ -1480,7 +1481,7 @@ def handle_photo(line: str, countries: Dict) -> Optional[Dict]:
         result['state'] = state_country_info['state']
     result['location'] = state_country_info['location']
 
-    result = adjust_location_result(result)
+    result = adjust_location_result(result, home_country)
         
     line = state_country_info['line']
 
@@ -1496,7 +1497,7 @@ def handle_photo(line: str, countries: Dict) -> Optional[Dict]:
 
     return result
 
-def handle_workers_meeting(line: str, countries: Dict) -> Optional[Dict]:
+def handle_workers_meeting(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle workers meeting patterns."""
 
     if 'workers meeting' not in line.lower():
@@ -1545,11 +1546,11 @@ def handle_workers_meeting(line: str, countries: Dict) -> Optional[Dict]:
     if visiting_from:
         result['note'] = result['note'] + ' Visiting from ' + visiting_from
 
-    result = adjust_location_result(result)
+    result = adjust_location_result(result, home_country)
 
     return result
     
-def handle_removed_from(line: str, countries: Dict) -> Optional[Dict]:
+def handle_removed_from(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle Removed from work patterns."""
     if 'removed from' not in line.lower():
         return None
@@ -1577,7 +1578,7 @@ def handle_removed_from(line: str, countries: Dict) -> Optional[Dict]:
     if state_country_info['state']:
         result['state'] = state_country_info['state']
 
-    result = adjust_location_result(result)
+    result = adjust_location_result(result, home_country)
 
     line = state_country_info['line']
 
@@ -1590,7 +1591,7 @@ def handle_removed_from(line: str, countries: Dict) -> Optional[Dict]:
 
     return result
 
-def handle_guestbook(line: str, countries: Dict) -> Optional[Dict]:
+def handle_guestbook(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle guestbook patterns."""
     
     if 'guestbook' not in line.lower() and 'guest book' not in line.lower():
@@ -1625,11 +1626,11 @@ def handle_guestbook(line: str, countries: Dict) -> Optional[Dict]:
     if line:
         result['note'] = result['note'] + ': ' + line
 
-    result = adjust_location_result(result)
+    result = adjust_location_result(result, home_country)
 
     return result
    
-def handle_location_only(line: str, countries: Dict) -> Optional[Dict]:
+def handle_location_only(line: str, countries: Dict, home_country: Optional[str] = None) -> Optional[Dict]:
     """Handle location only patterns."""
 
     result = {
@@ -1659,9 +1660,9 @@ def handle_location_only(line: str, countries: Dict) -> Optional[Dict]:
     protem_case = ''
 
     if line:
-        paren_match = re.search(r'\((.*?)\)', line)
+        paren_match = first_token(line, PAREN)
         if paren_match:
-            paren_text = paren_match.group(1).strip()
+            paren_text = paren_match.value.strip()
 
             parts = re.split(r'\s*/\s*', paren_text)
             # Join with comma and space
@@ -1752,7 +1753,7 @@ def handle_location_only(line: str, countries: Dict) -> Optional[Dict]:
         if protem_case:
             result['note'] = add_to_note_list(result['note'], 'pro tem')
 
-    result = adjust_location_result(result)
+    result = adjust_location_result(result, home_country)
 
     print_debug(f"BOB LOC 1.3 - line: {line}")
     print_debug(f"BOB LOC 2.0 - country: {result['country']}")
@@ -1765,8 +1766,58 @@ def handle_location_only(line: str, countries: Dict) -> Optional[Dict]:
     
     return None
 
-def process_text_patterns(line: str, original_text: str) -> Dict:
-    """Process text patterns and extract relevant information."""
+# Handlers in the order they are tried, each with the line_tokens keywords one
+# of which must be in the line for the handler to return a result.  Handlers
+# whose keywords are missing are skipped without being called.  None means the
+# handler is always tried.
+HANDLERS = [
+    (handle_workers_list, ('workers list', 'staff')),
+    (handle_convention, ('convention',)),
+    (handle_special_meeting, ('Special Meeting',)),
+    (handle_travel, ('visit', 'return')),
+    (handle_started_work, ('Started in the work',)),
+    (handle_photo, ('photo', 'picture')),
+    (handle_workers_meeting, ('workers meeting',)),
+    (handle_removed_from, ('removed from',)),
+    (handle_guestbook, ('guestbook', 'guest book')),
+    (handle_location_only, None)
+]
+
+def clean_pattern_line(line: str) -> str:
+    """Clean up a fixed line before it is handed to the handlers."""
+    # Clean up the line by removing "Visited" and "for"
+    #line = re.sub(r'^Visited\s+', '', line, flags=re.IGNORECASE)
+    line = re.sub(r'\s+for\s+', ' ', line, flags=re.IGNORECASE)
+    # Remove trailing commas after Meeting or Convention
+    line = re.sub(r'((?:Meeting|Convention))\s*,\s*$', r'\1', line, flags=re.IGNORECASE)
+    return line
+
+def classify_handlers(lines: List[str]) -> List[Tuple]:
+    """Return, for each cleaned line, the tuple of handlers that could match it in the order they are tried."""
+    candidates = []
+    for line in lines:
+        found = line_keywords(line)
+        candidates.append(tuple(handler for handler, keywords in HANDLERS
+                                if keywords is None or not found.isdisjoint(keywords)))
+    return candidates
+
+def run_handlers(line: str, handlers, ctx: ParserContext) -> Optional[Dict]:
+    """Run handlers in order on a cleaned line, with ctx active, and return the first result."""
+    with ctx.active():
+        for handler in handlers:
+            handler_result = handler(line, ctx.countries, ctx.home_country)
+            if handler_result:
+                return handler_result
+    return None
+
+def process_text_patterns(line: str, original_text: str, home_country: Optional[str] = None,
+                          ctx: Optional[ParserContext] = None) -> Dict:
+    """Process text patterns and extract relevant information.
+    ctx defaults to the current context; home_country, if given, replaces its
+    home country, which is used for results that do not name a country."""
+    ctx = ctx or current_context()
+    if home_country is not None:
+        ctx = replace(ctx, home_country=home_country)
     result = {
         'type': None,
         'country': None,
@@ -1779,36 +1830,115 @@ def process_text_patterns(line: str, original_text: str) -> Dict:
         'end_date': None,
     }
 
-    # Clean up the line by removing "Visited" and "for"
-    #line = re.sub(r'^Visited\s+', '', line, flags=re.IGNORECASE)
-    line = re.sub(r'\s+for\s+', ' ', line, flags=re.IGNORECASE)
-    # Remove trailing commas after Meeting or Convention
-    line = re.sub(r'((?:Meeting|Convention))\s*,\s*$', r'\1', line, flags=re.IGNORECASE)
+    line = clean_pattern_line(line)
 
     result['fixed'] = line
 
     # Try each handler in sequence
-    handlers = [
-        handle_workers_list,
-        handle_convention,
-        handle_special_meeting,
-        handle_travel,
-        handle_started_work,
-        handle_photo,
-        handle_workers_meeting,
-        handle_removed_from,
-        handle_guestbook,
-        handle_location_only
-    ]
-
-    for handler in handlers:
-        handler_result = handler(line, countries)
-        if handler_result:
-            result.update(handler_result)
-            return result
+    handler_result = run_handlers(line, classify_handlers([line])[0], ctx)
+    if handler_result:
+        result.update(handler_result)
 
     return result
 
+def iso_date_columns(year: str, start_date: Optional[str], end_date: Optional[str],
+                     month: Optional[str]) -> List[str]:
+    """The ISO Start Date and ISO End Date output columns (see date_utils.resolve_dates).
+    Blank when the year can't be read."""
+    try:
+        iso_start, iso_end = resolve_dates(year or '', start_date or '', end_date or '', month or '')
+    except ValueError:
+        return ['', '']
+    return [iso_start or '', iso_end or '']
+
+# Columns returned by process_text_patterns_batch
+BATCH_COLUMNS = ['year', 'type', 'country', 'state', 'location', 'note', 'start_date', 'end_date',
+                 'month', 'original_text', 'fixed', 'error']
+
+def process_text_patterns_batch(lines: List[str], years: Optional[List[str]] = None,
+                                home_country=None, ctx: Optional[ParserContext] = None) -> Dict[str, List]:
+    """Process a batch of text-after-year lines (a whole file or a whole corpus).
+
+    Only lines matching TEXT_FIX_TRIGGER_PATTERN go through text_fixes, the
+    candidate handlers for every line are classified up front and identical
+    lines are only parsed once.
+    ctx defaults to the current context.  home_country, if given, replaces its
+    home country and is either one country for the whole batch or a list with
+    one entry per line.  Returns a dict of columns (see BATCH_COLUMNS), one entry
+    per input line.  type is None for lines no handler matched and error holds
+    the message for lines that raised.
+    """
+    ctx = ctx or current_context()
+    count = len(lines)
+    if years is None:
+        years = [None] * count
+    if home_country is None or isinstance(home_country, str):
+        home_countries = [home_country or ctx.home_country] * count
+    else:
+        home_countries = list(home_country)
+    line_contexts = {country: ctx if country == ctx.home_country else replace(ctx, home_country=country)
+                     for country in set(home_countries)}
+
+    # Fixed and cleaned line by line, so a line that raises only fails itself
+    cleaned_lines = []
+    fix_errors = []
+    with ctx.active():
+        for line in lines:
+            try:
+                fixed = text_fixes(line) if TEXT_FIX_TRIGGER_PATTERN.search(line) else line
+                cleaned_lines.append(clean_pattern_line(fixed))
+                fix_errors.append(None)
+            except Exception as e:
+                cleaned_lines.append(line)
+                fix_errors.append(str(e))
+    candidates = classify_handlers(cleaned_lines)
+
+    columns = {name: [] for name in BATCH_COLUMNS}
+    parsed = {}
+    for i in range(count):
+        key = (cleaned_lines[i], home_countries[i])
+        error = fix_errors[i]
+        if error:
+            handler_result = None
+        elif key in parsed:
+            handler_result = parsed[key]
+        else:
+            try:
+                handler_result = run_handlers(cleaned_lines[i], candidates[i], line_contexts[home_countries[i]])
+            except Exception as e:
+                handler_result = None
+                error = str(e)
+            else:
+                parsed[key] = handler_result
+        handler_result = handler_result or {}
+        columns['year'].append(years[i])
+        columns['type'].append(handler_result.get('type'))
+        columns['country'].append(handler_result.get('country'))
+        columns['state'].append(handler_result.get('state'))
+        columns['location'].append(handler_result.get('location'))
+        columns['note'].append(handler_result.get('note'))
+        columns['start_date'].append(handler_result.get('start_date'))
+        columns['end_date'].append(handler_result.get('end_date'))
+        columns['month'].append(handler_result.get('month'))
+        columns['original_text'].append(lines[i])
+        columns['fixed'].append(cleaned_lines[i])
+        columns['error'].append(error)
+    return columns
+
+# Substrings that make text_fixes change a line.  Keep this in sync with
+# text_fixes - process_text_patterns_batch passes lines containing none of
+# these through untouched.
+TEXT_FIX_TRIGGERS = [
+    '(Escondido/Ramona', 'Convvention', 'Sart-Dames- Avelines', 'Ducan Canada', 'Greenshields',
+    'Iron Bridges', 'Seagraves', 'NSW', 'Insurgents Mexico Convention', 'Insurgentes Baja',
+    'Almonte New York', 'Dagar Montana', 'Miltown 2 Washington', 'MIlltown 1 Washington',
+    'Mountain 1 Ranch', 'Mountain 2 Ranch', 'Perris Tennessee', 'Roger Arkansas', 'Yellow Spring Ohio',
+    'Post Falls,', 'Madisonville,', 'Dells,', 'Chaintreauville,', 'Ales,', 'Bonao,',
+    'Sart-Dames-Avelines,', 'Yorkton/Fort', 'Brazil and Uruguay', "’"
+]
+# The triggers plus the Glen Valley variations text_fixes rewrites with a regex
+TEXT_FIX_TRIGGER_PATTERN = re.compile('|'.join(re.escape(trigger) for trigger in TEXT_FIX_TRIGGERS) + r'|(?i:glen\s*valley\s*\d)')
+
 def text_fixes(line: str) -> str:
     """Apply text fixes to the line."""
     if '(Escondido/Ramona' in line:
@@ -1913,16 +2043,56 @@ def text_fixes(line: str) -> str:
 
     return line
 
-def process_file(filepath: str, validate_mode: bool = False, header_output: bool = False) -> None:
-    """Process a single file and update the database or just look at patterns."""
-    global perp_name
+def resolved_to_city(row_type: Optional[str], country: Optional[str], state: Optional[str],
+                     location: Optional[str], countries: Dict) -> bool:
+    """True when a handler result names a gazetteer city of its state.  NOMATCH
+    lines and results whose location is only the country or the state, e.g. a
+    misspelled city the handler fell back to the state for, are not."""
+    if not row_type or not location or location in (country, state):
+        return False
+    city_states = countries.get(country, {}).get('cities', {}).get(location)
+    if city_states is None:
+        return False
+    if isinstance(city_states, str):
+        city_states = [city_states]
+    return state in city_states or (state == country and '--No State--' in city_states)
+
+def process_file(filepath: str, validate_mode: bool = False, header_output: bool = False,
+                 writer: Optional[OutputWriter] = None, table: Optional[ResultTable] = None,
+                 fuzzy: Optional[FuzzyIndex] = None, report: Optional[UnmatchedReport] = None,
+                 rollup: Optional[Rollup] = None, ctx: Optional[ParserContext] = None) -> None:
+    """Process a single file and update the database or just look at patterns.
+    Matched rows are written through writer (pipe delimited to stdout by default),
+    NOMATCH and error lines go to the writer's rejects stream.  If table is given
+    every result is also added to it for the QA summary.  If fuzzy is given,
+    suggested corrections for the place names of lines that did not resolve to
+    a gazetteer city (see resolved_to_city) are written to the rejects stream.
+    The same lines are added to report if one is given, and the matched rows
+    to rollup.
+    ctx supplies the gazetteer and debug settings (DEFAULT_CONTEXT if not
+    given); the perp and home country are set from the file name.  validate_mode
+    turns debug output on for this file."""
+    if writer is None:
+        writer = get_writer('pipe')
+    if header_output:
+        writer.header_written = True
     filename = os.path.basename(filepath)
     perp_name = extract_perp_name(filename)
     
     if not perp_name:
-        print(f"Could not extract perp name from {filename}")
+        writer.write_error(f"Could not extract perp name from {filename}")
+        writer.flush()
         return
 
+    # Resolved once per file and passed through to the handlers
+    base = ctx or DEFAULT_CONTEXT
+    ctx = replace(base, perp_name=perp_name, home_country=get_perp_home_country(perp_name),
+                  validate=base.validate or validate_mode)
+
+    # Collect the year lines first so the whole file is parsed as one batch
+    year_lines = []
+    year_strs = []
+    texts = []
     with open(filepath, 'r', encoding='utf-8') as f:
         lines = f.readlines()
         i = 0
@@ -1946,83 +2116,101 @@ def process_file(filepath: str, validate_mode: bool = False, header_output: bool
                 end_year = end_year or start_year
                 year_str = str(start_year) if end_year == start_year else f"{start_year}-{end_year}"
                 
-                try:
-                    # Process the text after the year
-                    text_after_year = line[line.find(str(start_year)) + len(str(start_year)):].strip()
-                    if end_year and end_year != start_year:
-                        text_after_year = text_after_year[text_after_year.find(str(end_year)) + len(str(end_year)):].strip()
-                    # Remove any duplicate year at the start of text_after_year
-                    text_after_year = re.sub(r'^\d{4}\s*', '', text_after_year)
-                    # Remove any duplicate year that appears after a hyphen
-                    text_after_year = re.sub(r'-\s*\d{4}\s*', '', text_after_year)
-
-                    original_text = text_after_year
-                    text_after_year = text_fixes(text_after_year)
-
-                    pattern_result = process_text_patterns(text_after_year, original_text)
-                    if pattern_result['type']:
-                        # Output header if not already done
-                        if not header_output:
-                            header_parts = [
-                                'Status',
-                                'Perp Name',
-                                'Year',
-                                'Type',
-                                'Country',
-                                'State',
-                                'Location',
-                                'Note',
-                                'Start Date',
-                                'End Date',
-                                'Month',
-                                'Original Text',
-                                'Fixed Text'
-                            ]
-                            print('|'.join(header_parts))
-                            header_output = True
-
-                        # Format: MATCHED YYYY \t TTTT \t LLLL \t SSSS \t CCC \t NNNN
-                        note = pattern_result.get('note', '')
-                        date_info = pattern_result.get('date_info', '')
-                        if date_info:
-                            note = f"{note} **{date_info}"
-                        output_parts = [
-                            'MATCHED',
-                            perp_name,
-                            year_str,
-                            pattern_result['type'],
-                            pattern_result.get('country') or '',
-                            pattern_result.get('state') or '',
-                            pattern_result.get('location') or '',
-                            pattern_result.get('note') or '',
-                            pattern_result.get('start_date') or '',
-                            pattern_result.get('end_date') or '',
-                            pattern_result.get('month') or '',
-                            pattern_result.get('original_text') or '',
-                            pattern_result.get('fixed') or ''
-                        ]
-                        separator = '|'
-                        print(separator.join(output_parts))
-                    else:
-                        # For non-matching lines, output with NOMATCH prefix only in validate mode
-                        #if validate_mode:
-                        print(f"NOMATCH - {line}")
-                except Exception as e:
-                    print(f"Error processing line: {line}")
-                    print(f"Error details: {str(e)}")
+                # Process the text after the year
+                text_after_year = line[line.find(str(start_year)) + len(str(start_year)):].strip()
+                if end_year and end_year != start_year:
+                    text_after_year = text_after_year[text_after_year.find(str(end_year)) + len(str(end_year)):].strip()
+                # Remove any duplicate year at the start of text_after_year
+                text_after_year = re.sub(r'^\d{4}\s*', '', text_after_year)
+                # Remove any duplicate year that appears after a hyphen
+                text_after_year = re.sub(r'-\s*\d{4}\s*', '', text_after_year)
+
+                year_lines.append(line)
+                year_strs.append(year_str)
+                texts.append(text_after_year)
             i += 1
 
+    results = process_text_patterns_batch(texts, year_strs, ctx=ctx)
+    if table is not None:
+        table.append_batch(perp_name, results)
+    if rollup is not None:
+        # Replaces the rows of an earlier run over this file
+        rollup.append_batch(perp_name, results, source=filename)
+
+    rows = []
+    for i, line in enumerate(year_lines):
+        if results['error'][i]:
+            writer.write_error(f"Error processing line: {line}")
+            writer.write_error(f"Error details: {results['error'][i]}")
+        elif results['type'][i]:
+            rows.append([
+                'MATCHED',
+                perp_name,
+                results['year'][i],
+                results['type'][i],
+                results['country'][i] or '',
+                results['state'][i] or '',
+                results['location'][i] or '',
+                results['note'][i] or '',
+                results['start_date'][i] or '',
+                results['end_date'][i] or '',
+                results['month'][i] or '',
+                results['original_text'][i] or '',
+                results['fixed'][i] or '',
+                *iso_date_columns(results['year'][i], results['start_date'][i], results['end_date'][i],
+                                  results['month'][i])
+            ])
+        else:
+            # Non-matching lines go to the rejects stream
+            writer.write_reject(line)
+
+        # Lines that did not resolve to a gazetteer city go to the triage report
+        # and get fuzzy suggestions
+        if (fuzzy is not None or report is not None) and not results['error'][i] and \
+                not resolved_to_city(results['type'][i], results['country'][i], results['state'][i],
+                                     results['location'][i], ctx.countries):
+            if report is not None:
+                report.add(texts[i])
+            if fuzzy is not None:
+                for message in format_suggestions(line, suggest(fuzzy, texts[i])):
+                    writer.write_error(message)
+
+    if rows:
+        # Output header if not already done
+        writer.write_header()
+        writer.write_rows(rows)
+
+    writer.flush()
+
+# Input files are the text extracted from the perps' PDF and text files
+INPUT_SUFFIXES = ('_from_pdf.txt', '_from_txt.txt')
+
+def is_input_file(filename: str) -> bool:
+    """Whether a file in the input directory is one main() processes.  Cases
+    files and OLDER copies are skipped."""
+    return filename.endswith(INPUT_SUFFIXES) and \
+        not (filename.lower().startswith('cases ') or 'OLDER' in filename)
+
 def main():
     """Main function to process input files."""
-    global validate_mode
     parser = argparse.ArgumentParser(description='Process location files and update database')
     parser.add_argument('--file', type=str, help='Process a single file by name')
     parser.add_argument('--validate', action='store_true', help='Validate mode - process patterns without database interaction')
     parser.add_argument('--input-dir', type=str, default='inputs', help='Directory containing input files (default: inputs)')
+    parser.add_argument('--format', type=str, default='pipe', choices=sorted(OUTPUT_WRITERS), help='Output format (default: pipe)')
+    parser.add_argument('--rejects', type=str, help='Write NOMATCH and error lines to this file instead of stderr')
+    parser.add_argument('--summary', action='store_true', help='Print row counts by type, perp, country and location and the unmatched rate per perp to stderr at the end')
+    parser.add_argument('--line-buffered', action='store_true', help='Write each row as soon as it is produced instead of in large chunks')
+    parser.add_argument('--suggest', action='store_true', help='Log close gazetteer names for the misspelled places in NOMATCH lines')
+    parser.add_argument('--unmatched-report', action='store_true', help='Print the most common templates and unresolved words of the lines that were NOMATCH or did not resolve to a gazetteer city to stderr at the end')
+    parser.add_argument('--rollup', type=str, metavar='JSON', help='Keep the country / state / location rollup of the matched rows in this file, updating it if it exists (see rollup.py)')
+    parser.add_argument('--output', type=str, help='Write the rows to this file instead of stdout.  With --watch, rows of new or modified files are appended and the processed files are tracked in FILE.watch')
+    parser.add_argument('--watch', action='store_true', help='After processing the input directory keep running and process new or modified input files as they appear')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between checks of the input directory with --watch (default: 2)')
     args = parser.parse_args()
 
-    # Set global validate mode
-    validate_mode = args.validate
+    # Gazetteer and debug settings shared by every file
+    ctx = ParserContext(validate=args.validate)
 
     input_dir = args.input_dir
     
@@ -2030,36 +2218,112 @@ def main():
         print(f"Input directory '{input_dir}' not found")
         return
 
-    # Track if we've output the header
-    header_output = False
-
-    if args.file:
-        # Process single file
-        filepath = os.path.join(input_dir, args.file)
-        if not os.path.exists(filepath):
-            print(f"File '{args.file}' not found in {input_dir}")
-            return
-        if not args.file.endswith(('_from_pdf.txt', '_from_txt.txt')):
-            print(f"File '{args.file}' does not match required pattern (_from_pdf.txt or _from_txt.txt)")
-            return
-        
-        if args.validate:
-            print(f"Processing single file: {args.file}")
-        
-        process_file(filepath, args.validate, header_output)
-    else:
-        # Process all matching files
-        for filename in os.listdir(input_dir):
-            if filename.endswith(('_from_pdf.txt', '_from_txt.txt')):
-                if filename.lower().startswith('cases ') or 'OLDER' in filename:
-                    if args.validate:
+    # With --watch --output the signatures of the processed files are kept next
+    # to the output, so a restarted watcher only appends the files that changed
+    # since.  Without them the output is written from scratch.
+    watch_state = f"{args.output}.watch" if args.output else None
+    watcher = None
+    resume = False
+    if args.watch:
+        watcher = InputWatcher(input_dir, (lambda filename: filename == args.file) if args.file else is_input_file)
+        if watch_state and os.path.exists(watch_state) and os.path.exists(args.output) and os.path.getsize(args.output):
+            try:
+                watcher.load(watch_state)
+                resume = True
+            except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+                print(f"Could not load {watch_state} ({e}), processing every file again", file=sys.stderr)
+    elif watch_state and os.path.exists(watch_state):
+        # The output is rewritten below, so the saved signatures no longer describe it
+        os.remove(watch_state)
+
+    reject_stream = open(args.rejects, 'a' if resume else 'w', encoding='utf-8') if args.rejects else None
+    output_stream = open(args.output, 'a' if resume else 'w', encoding='utf-8', newline='') if args.output else None
+    writer = get_writer(args.format, stream=output_stream, reject_stream=reject_stream,
+                        line_buffered=args.line_buffered or args.validate)
+    if output_stream is not None and output_stream.tell() > 0:
+        # Appending to earlier output, which already has the header
+        writer.header_written = True
+    table = ResultTable() if args.summary else None
+    fuzzy = FuzzyIndex.from_countries(countries) if args.suggest or args.unmatched_report else None
+    report = UnmatchedReport(fuzzy) if args.unmatched_report else None
+    rollup = None
+    if args.rollup:
+        # Update the saved rollup, files processed again replace their earlier rows
+        rollup = Rollup()
+        if os.path.exists(args.rollup):
+            try:
+                rollup = Rollup.load(args.rollup)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load rollup {args.rollup} ({e}), starting a new one", file=sys.stderr)
+
+    try:
+        if args.file:
+            # Process single file
+            filepath = os.path.join(input_dir, args.file)
+            if not os.path.exists(filepath):
+                print(f"File '{args.file}' not found in {input_dir}")
+                return
+            if not args.file.endswith(INPUT_SUFFIXES):
+                print(f"File '{args.file}' does not match required pattern (_from_pdf.txt or _from_txt.txt)")
+                return
+            
+            if args.validate:
+                print(f"Processing single file: {args.file}")
+            
+            # With --watch only if it changed since the saved signatures
+            if watcher is None or watcher.changed():
+                process_file(filepath, args.validate, writer=writer, table=table, fuzzy=fuzzy if args.suggest else None, report=report, rollup=rollup, ctx=ctx)
+        else:
+            # Process all matching files, with --watch only the new or modified ones
+            filenames = os.listdir(input_dir) if watcher is None else \
+                [os.path.basename(filepath) for filepath in watcher.changed()]
+            for filename in filenames:
+                if not is_input_file(filename):
+                    if args.validate and filename.endswith(INPUT_SUFFIXES):
                         print(f"Skipping cases or OLDER file: {filename}")
                     continue
                 filepath = os.path.join(input_dir, filename)
                 if args.validate:
                     print(f"Processing {filename}...")
-                process_file(filepath, args.validate, header_output)
-                header_output = True  # Set to True after first file is processed
+                process_file(filepath, args.validate, writer=writer, table=table, fuzzy=fuzzy if args.suggest else None, report=report, rollup=rollup, ctx=ctx)
+
+        if watcher is not None:
+            # The rollup is saved before the watch state that marks its files done
+            if rollup is not None:
+                rollup.save(args.rollup)
+            if watch_state:
+                watcher.save(watch_state)
+            print(f"Watching {input_dir} for new input files, Ctrl-C to stop", file=sys.stderr)
+            try:
+                while True:
+                    time.sleep(args.poll_interval)
+                    for filepath in watcher.poll():
+                        print(f"Processing {os.path.basename(filepath)}", file=sys.stderr)
+                        try:
+                            process_file(filepath, args.validate, writer=writer, table=table, fuzzy=fuzzy if args.suggest else None, report=report, rollup=rollup, ctx=ctx)
+                        except Exception as e:
+                            # Keep watching; poll() marked the file processed, so it is
+                            # only retried once it changes
+                            writer.write_error(f"Error processing {os.path.basename(filepath)}: {e}")
+                            writer.flush()
+                        if rollup is not None:
+                            rollup.save(args.rollup)
+                        if watch_state:
+                            watcher.save(watch_state)
+            except KeyboardInterrupt:
+                pass
+    finally:
+        writer.flush()
+        if table is not None:
+            sys.stderr.write(format_summary(table))
+        if report is not None:
+            sys.stderr.write(report.format())
+        if rollup is not None:
+            rollup.save(args.rollup)
+        if reject_stream:
+            reject_stream.close()
+        if output_stream:
+            output_stream.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
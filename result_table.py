@@ -0,0 +1,216 @@
+"""Columnar in-memory table of process_locations.py results used for QA summaries.
+
+Every column is an array of small ints.  Text columns are dictionary encoded:
+each distinct string is stored once in a StringPool and the column holds its
+code, so millions of rows only cost a few bytes each and group-bys are
+Counter()s over int arrays.
+
+    python result_table.py abc2.txt
+
+prints the summary for a saved pipe delimited output file.  Saved output
+only holds the matched rows (NOMATCH lines go to the rejects stream, which
+does not name the perp), so that summary has no unmatched counts.
+"""
+
+import argparse
+import csv
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, TextIO, Tuple
+
+STATUS_MATCHED = 1
+STATUS_NOMATCH = 0
+
+
+class StringPool:
+    """Interns strings and hands out a stable int code for each one."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def encode(self, text: Optional[str]) -> int:
+        text = text or ''
+        code = self.codes.get(text)
+        if code is None:
+            code = len(self.strings)
+            self.codes[text] = code
+            self.strings.append(sys.intern(text))
+        return code
+
+    def decode(self, code: int) -> str:
+        return self.strings[code]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+def parse_year_range(year_str: str) -> Tuple[int, int]:
+    """Turn '1950' or '1950-1952' into (start_year, end_year).  Unparseable years are 0."""
+    try:
+        if '-' in year_str:
+            start, end = year_str.split('-', 1)
+            return int(start), int(end)
+        return int(year_str), int(year_str)
+    except (TypeError, ValueError):
+        return 0, 0
+
+
+class ResultTable:
+    """Array backed table of parse results with built-in aggregations."""
+
+    def __init__(self, tracks_unmatched: bool = True):
+        # False when the rows come from saved output, which has no NOMATCH rows
+        self.tracks_unmatched = tracks_unmatched
+        self.perps = StringPool()
+        self.types = StringPool()
+        self.countries = StringPool()
+        self.states = StringPool()
+        self.locations = StringPool()
+        self.notes = StringPool()
+
+        self.status = array('B')
+        self.perp = array('I')
+        self.start_year = array('H')
+        self.end_year = array('H')
+        self.type = array('I')
+        self.country = array('I')
+        self.state = array('I')
+        self.location = array('I')
+        self.note = array('I')
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    def append(self, perp: str, year: str, type_: Optional[str], country: Optional[str] = None,
+               state: Optional[str] = None, location: Optional[str] = None, note: Optional[str] = None) -> None:
+        """Add one row.  A row without a type is counted as unmatched."""
+        start_year, end_year = parse_year_range(year)
+        self.status.append(STATUS_MATCHED if type_ else STATUS_NOMATCH)
+        self.perp.append(self.perps.encode(perp))
+        self.start_year.append(start_year)
+        self.end_year.append(end_year)
+        self.type.append(self.types.encode(type_))
+        self.country.append(self.countries.encode(country))
+        self.state.append(self.states.encode(state))
+        self.location.append(self.locations.encode(location))
+        self.note.append(self.notes.encode(note))
+
+    def append_batch(self, perp: str, columns: Dict[str, List]) -> None:
+        """Add the columns returned by process_locations.process_text_patterns_batch."""
+        for i in range(len(columns['type'])):
+            if columns['error'][i]:
+                continue
+            self.append(perp, columns['year'][i], columns['type'][i], columns['country'][i],
+                        columns['state'][i], columns['location'][i], columns['note'][i])
+
+    @classmethod
+    def from_pipe_output(cls, stream: TextIO) -> 'ResultTable':
+        """Load a table from pipe delimited process_locations.py output.  Only
+        the matched rows are there, so the table does not track unmatched rows."""
+        table = cls(tracks_unmatched=False)
+        for row in csv.DictReader(stream, delimiter='|'):
+            if row.get('Status') != 'MATCHED':
+                continue
+            table.append(row['Perp Name'], row['Year'], row['Type'], row['Country'],
+                         row['State'], row['Location'], row['Note'])
+        return table
+
+    def _count(self, column: array, pool: StringPool, matched_only: bool = True) -> Dict[str, int]:
+        if matched_only:
+            counts = Counter(code for code, status in zip(column, self.status) if status == STATUS_MATCHED)
+        else:
+            counts = Counter(column)
+        return {pool.decode(code): count for code, count in counts.most_common()}
+
+    def count_by_type(self) -> Dict[str, int]:
+        """Matched rows per type, most common first."""
+        return self._count(self.type, self.types)
+
+    def count_by_perp(self) -> Dict[str, int]:
+        """Matched rows per perp, most common first."""
+        return self._count(self.perp, self.perps)
+
+    def count_by_country(self) -> Dict[str, int]:
+        """Matched rows per country, most common first."""
+        return self._count(self.country, self.countries)
+
+    def count_by_place(self) -> Dict[Tuple[str, str, str], int]:
+        """Matched rows per (country, state, location), most common first."""
+        counts = Counter(
+            (country, state, location)
+            for country, state, location, status in zip(self.country, self.state, self.location, self.status)
+            if status == STATUS_MATCHED
+        )
+        return {
+            (self.countries.decode(c), self.states.decode(s), self.locations.decode(l)): count
+            for (c, s, l), count in counts.most_common()
+        }
+
+    def unmatched_rate_by_perp(self) -> Dict[str, Tuple[int, int, float]]:
+        """(unmatched rows, total rows, unmatched rate) per perp, worst first."""
+        totals = Counter(self.perp)
+        unmatched = Counter(perp for perp, status in zip(self.perp, self.status) if status == STATUS_NOMATCH)
+        rates = {
+            self.perps.decode(code): (unmatched[code], total, unmatched[code] / total)
+            for code, total in totals.items()
+        }
+        return dict(sorted(rates.items(), key=lambda item: (-item[1][2], item[0])))
+
+    def year_range(self) -> Tuple[int, int]:
+        """Earliest start year and latest end year of the matched rows."""
+        years = [(start, end) for start, end, status in zip(self.start_year, self.end_year, self.status)
+                 if status == STATUS_MATCHED and start]
+        if not years:
+            return 0, 0
+        return min(start for start, _ in years), max(end for _, end in years)
+
+
+def format_summary(table: ResultTable, top: int = 20) -> str:
+    """Render the QA summary for a table as text."""
+    if table.tracks_unmatched:
+        lines = [f"Rows: {len(table)}  Matched: {sum(table.status)}  Unmatched: {len(table) - sum(table.status)}"]
+    else:
+        lines = [f"Matched rows: {sum(table.status)}  (unmatched lines are not in saved output)"]
+
+    lines.append("\nRows by type:")
+    for name, count in table.count_by_type().items():
+        lines.append(f"  {count:>8}  {name}")
+
+    lines.append("\nRows by perp:")
+    for name, count in table.count_by_perp().items():
+        lines.append(f"  {count:>8}  {name}")
+
+    lines.append("\nRows by country:")
+    for name, count in list(table.count_by_country().items())[:top]:
+        lines.append(f"  {count:>8}  {name}")
+
+    lines.append(f"\nTop {top} locations:")
+    for (country, state, location), count in list(table.count_by_place().items())[:top]:
+        lines.append(f"  {count:>8}  {country}|{state}|{location}")
+
+    if table.tracks_unmatched:
+        lines.append("\nUnmatched rate by perp:")
+        for name, (unmatched, total, rate) in table.unmatched_rate_by_perp().items():
+            lines.append(f"  {rate:>7.1%}  {unmatched}/{total}  {name}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize pipe delimited process_locations.py output')
+    parser.add_argument('file', nargs='?', help='Output file to summarize (default: stdin)')
+    parser.add_argument('--top', type=int, default=20, help='Number of countries and locations to list (default: 20)')
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            table = ResultTable.from_pipe_output(f)
+    else:
+        table = ResultTable.from_pipe_output(sys.stdin)
+    sys.stdout.write(format_summary(table, args.top))
+
+
+if __name__ == '__main__':
+    main()
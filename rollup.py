@@ -0,0 +1,321 @@
+"""Country -> state -> location rollup of process_locations.py results.
+
+Every node of the gazetteer hierarchy (the Country, State and Location
+names of countries_data.countries as they appear in the output) holds the
+number of matched rows at or below it, the set of perps seen there as a
+bitset over the perp list and the first and last year seen.  Rows are added
+one at a time, so the rollup is kept up to date while process_locations.py
+runs (--rollup PATH) and saved as JSON next to the output.  Questions such
+as rows per state or the perps ever in Saskatchewan are then answered from
+the saved file without re-reading the output.
+
+Each source (input file) also keeps its own per place counts, and every
+node its per source totals, so a file that is parsed again replaces what it
+added before instead of being counted twice.  Only the nodes on that file's
+places are updated.  A saved rollup can be loaded and updated by later runs.
+
+    python rollup.py abc2.txt --save abc2.rollup.json
+    python rollup.py --load abc2.rollup.json --counts state
+    python rollup.py --load abc2.rollup.json --perps "Canada|Saskatchewan"
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from date_utils import parse_year_range
+
+ROLLUP_VERSION = 2
+# Source of the rows added without one
+NO_SOURCE = ''
+LEVELS = ('country', 'state', 'location')
+
+
+class RollupNode:
+    """Counts for one country, state or location and its children, plus what
+    each source added here per perp, so a source can be taken out again."""
+    __slots__ = ('count', 'perps', 'first_year', 'last_year', 'children', 'sources')
+
+    def __init__(self):
+        self.count = 0
+        self.perps = 0              # bit i set when perp i of the rollup was here
+        self.first_year: Optional[int] = None
+        self.last_year: Optional[int] = None
+        self.children: Dict[str, 'RollupNode'] = {}
+        self.sources: Dict[Tuple[str, int], List] = {}  # (source, perp bit) -> [count, first year, last year]
+
+    def add(self, perp_bit: int, first_year: Optional[int], last_year: Optional[int], count: int = 1,
+            source: str = NO_SOURCE) -> None:
+        self.count += count
+        self.perps |= perp_bit
+        if first_year is not None and (self.first_year is None or first_year < self.first_year):
+            self.first_year = first_year
+        if last_year is not None and (self.last_year is None or last_year > self.last_year):
+            self.last_year = last_year
+        totals = self.sources.get((source, perp_bit))
+        if totals is None:
+            self.sources[(source, perp_bit)] = [count, first_year, last_year]
+        else:
+            totals[0] += count
+            totals[1] = _earliest(totals[1], first_year)
+            totals[2] = _latest(totals[2], last_year)
+
+    def remove(self, source: str, perp_bits: Iterable[int]) -> None:
+        """Take out what source added here for perp_bits.  The perps and years
+        are recomputed from the other sources' totals of this node."""
+        for bit in perp_bits:
+            totals = self.sources.pop((source, bit), None)
+            if totals is not None:
+                self.count -= totals[0]
+        self.perps = 0
+        self.first_year = self.last_year = None
+        for (_, bit), (_, first_year, last_year) in self.sources.items():
+            self.perps |= bit
+            self.first_year = _earliest(self.first_year, first_year)
+            self.last_year = _latest(self.last_year, last_year)
+
+    def to_json(self) -> Dict:
+        data = {'count': self.count, 'perps': format(self.perps, 'x'),
+                'first_year': self.first_year, 'last_year': self.last_year}
+        if self.children:
+            data['children'] = {name: child.to_json() for name, child in self.children.items()}
+        return data
+
+
+# (perp, (country, state, location) cut at the first blank name)
+PlaceKey = Tuple[str, Tuple[str, ...]]
+
+
+class Rollup:
+    """The rollup tree plus the perp list the bitsets index into and the
+    [count, first year, last year] each source added per perp and place."""
+
+    def __init__(self):
+        self.root = RollupNode()
+        self.perp_names: List[str] = []
+        self._perp_bits: Dict[str, int] = {}
+        self.sources: Dict[str, Dict[PlaceKey, List]] = {}
+
+    def perp_bit(self, perp: str) -> int:
+        bit = self._perp_bits.get(perp)
+        if bit is None:
+            bit = 1 << len(self.perp_names)
+            self.perp_names.append(perp)
+            self._perp_bits[perp] = bit
+        return bit
+
+    def perps_of(self, bits: int) -> List[str]:
+        """The perp names of a bitset, in the order they were first added."""
+        names = []
+        i = 0
+        while bits:
+            if bits & 1:
+                names.append(self.perp_names[i])
+            bits >>= 1
+            i += 1
+        return names
+
+    def add(self, perp: str, year: str, country: str, state: str, location: str, source: str = NO_SOURCE) -> None:
+        """Add one matched row.  Rows without a country only count at the root."""
+        try:
+            first_year, last_year = parse_year_range(year)
+            last_year = last_year or first_year
+        except (TypeError, ValueError):
+            first_year = last_year = None
+        path = []
+        for name in (country, state, location):
+            if not name:
+                break
+            path.append(name)
+        key = (perp, tuple(path))
+        places = self.sources.setdefault(source, {})
+        totals = places.get(key)
+        if totals is None:
+            places[key] = [1, first_year, last_year]
+        else:
+            totals[0] += 1
+            totals[1] = _earliest(totals[1], first_year)
+            totals[2] = _latest(totals[2], last_year)
+        self._apply(key, 1, first_year, last_year, source)
+
+    def _apply(self, key: PlaceKey, count: int, first_year: Optional[int], last_year: Optional[int],
+               source: str) -> None:
+        perp, path = key
+        bit = self.perp_bit(perp)
+        node = self.root
+        node.add(bit, first_year, last_year, count, source)
+        for name in path:
+            node = node.children.setdefault(name, RollupNode())
+            node.add(bit, first_year, last_year, count, source)
+
+    def remove_source(self, source: str) -> bool:
+        """Take out the rows a source added.  Only the nodes on the source's
+        paths are updated, from their per source totals, and nodes left without
+        rows are dropped.  Returns False if the source added nothing."""
+        places = self.sources.pop(source, None)
+        if places is None:
+            return False
+        touched: Dict[Tuple[str, ...], set] = {}
+        for perp, path in places:
+            bit = self._perp_bits[perp]
+            for depth in range(len(path) + 1):
+                touched.setdefault(path[:depth], set()).add(bit)
+        # Deepest first, so an emptied node is dropped before its parent is looked at
+        for path in sorted(touched, key=len, reverse=True):
+            node = self.node(path)
+            node.remove(source, touched[path])
+            if path and not node.count:
+                del self.node(path[:-1]).children[path[-1]]
+        return True
+
+    def append_batch(self, perp: str, columns: Dict[str, List], source: Optional[str] = None) -> None:
+        """Add the matched rows of the columns returned by process_locations.process_text_patterns_batch.
+        When source is given its earlier rows are replaced, so a file parsed again is not counted twice."""
+        if source is not None:
+            self.remove_source(source)
+        for i in range(len(columns['type'])):
+            if columns['error'][i] or not columns['type'][i]:
+                continue
+            self.add(perp, columns['year'][i], columns['country'][i], columns['state'][i], columns['location'][i],
+                     NO_SOURCE if source is None else source)
+
+    @classmethod
+    def from_pipe_output(cls, stream: TextIO) -> 'Rollup':
+        """Build a rollup from pipe delimited process_locations.py output."""
+        rollup = cls()
+        for row in csv.DictReader(stream, delimiter='|'):
+            if row.get('Status') == 'MATCHED':
+                rollup.add(row['Perp Name'], row['Year'], row['Country'], row['State'], row['Location'])
+        return rollup
+
+    def node(self, path: Sequence[str]) -> Optional[RollupNode]:
+        """The node for (country,), (country, state) or (country, state, location)."""
+        node = self.root
+        for name in path:
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
+
+    def walk(self, level: str) -> Iterator[Tuple[Tuple[str, ...], RollupNode]]:
+        """(path, node) for every node at a level, in name order."""
+        depth = LEVELS.index(level) + 1
+
+        def visit(path: Tuple[str, ...], node: RollupNode) -> Iterator[Tuple[Tuple[str, ...], RollupNode]]:
+            if len(path) == depth:
+                yield path, node
+                return
+            for name in sorted(node.children):
+                yield from visit(path + (name,), node.children[name])
+
+        return visit((), self.root)
+
+    def to_json(self) -> Dict:
+        sources = {
+            source: [[perp, list(path), count, first_year, last_year]
+                     for (perp, path), (count, first_year, last_year) in places.items()]
+            for source, places in self.sources.items()
+        }
+        return {'version': ROLLUP_VERSION, 'perps': self.perp_names, 'root': self.root.to_json(), 'sources': sources}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'Rollup':
+        """Load a rollup saved with to_json.  The tree is rebuilt from the per
+        source counts, which also restores the per source totals of its nodes."""
+        if data.get('version') != ROLLUP_VERSION:
+            raise ValueError(f"Unsupported rollup version: {data.get('version')}")
+        rollup = cls()
+        for perp in data['perps']:
+            rollup.perp_bit(perp)
+        for source, places in data['sources'].items():
+            rollup.sources[source] = {}
+            for perp, path, count, first_year, last_year in places:
+                key = (perp, tuple(path))
+                rollup.sources[source][key] = [count, first_year, last_year]
+                rollup._apply(key, count, first_year, last_year, source)
+        return rollup
+
+    def save(self, path: str) -> None:
+        """Write the rollup to a temporary file next to path and rename it over
+        path, so a run stopped mid-save never leaves a half written file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.rollup.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.to_json(), f, ensure_ascii=False)
+            # mkstemp makes the file owner only, give it the mode the saved rollup already
+            # has, or the umask default for a new file
+            try:
+                mode = os.stat(path).st_mode & 0o777
+            except FileNotFoundError:
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            os.chmod(temp_path, mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'Rollup':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+
+def _earliest(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    return b if a is None or (b is not None and b < a) else a
+
+
+def _latest(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    return b if a is None or (b is not None and b > a) else a
+
+
+def format_years(node: RollupNode) -> str:
+    if node.first_year is None:
+        return ''
+    if node.first_year == node.last_year:
+        return str(node.first_year)
+    return f"{node.first_year}-{node.last_year}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Country / state / location rollup of process_locations.py output')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('input', nargs='?', help='Pipe delimited output file, - for stdin')
+    source.add_argument('--load', metavar='JSON', help='Rollup saved with --save or process_locations.py --rollup')
+    parser.add_argument('--save', metavar='JSON', help='Save the rollup built from the input')
+    parser.add_argument('--counts', choices=LEVELS, help='Print rows, perps and years per country, state or location')
+    parser.add_argument('--perps', metavar='PLACE', help='Print the perps ever at Country, Country|State or Country|State|Location')
+    args = parser.parse_args()
+
+    if args.load:
+        rollup = Rollup.load(args.load)
+    elif args.input == '-':
+        rollup = Rollup.from_pipe_output(sys.stdin)
+    else:
+        with open(args.input, 'r', encoding='utf-8', newline='') as f:
+            rollup = Rollup.from_pipe_output(f)
+
+    if args.save:
+        rollup.save(args.save)
+
+    if args.counts:
+        print(f"{'rows':>8} {'perps':>6} {'years':>10}  {args.counts}")
+        for path, node in rollup.walk(args.counts):
+            print(f"{node.count:>8} {bin(node.perps).count('1'):>6} {format_years(node):>10}  {'|'.join(path)}")
+    if args.perps:
+        node = rollup.node(args.perps.split('|'))
+        if node is None:
+            print(f"No rows for {args.perps}", file=sys.stderr)
+            sys.exit(1)
+        for name in sorted(rollup.perps_of(node.perps)):
+            print(name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Streaming writers for the .sql files generated by insert_csl.py and insert_perp_locations.py."""
+
+import sys
+from typing import List, Optional, Sequence
+
+# Buffer size for the open .sql files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def sql_literal(value) -> str:
+    """Format a Python value as a SQL literal.  Strings have single quotes doubled."""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, str):
+        escaped = value.replace("'", "''")
+        return f"'{escaped}'"
+    return str(value)
+
+
+# Characters that must be escaped in COPY text format rows
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_value(value) -> str:
+    """Format a Python value as a field of a PostgreSQL COPY text format row.
+    None is \\N; backslashes, tabs and line breaks are backslash escaped."""
+    if value is None:
+        return '\\N'
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class SqlFileWriter:
+    """Keeps one .sql output file open for the whole run.
+
+    insert() collects rows for the same table and columns and writes them as
+    one multi-row INSERT per batch_size rows.  With batch_size=1 every row is
+    its own INSERT statement.  Any other write (comments, sections, raw
+    statements) first writes out the pending rows so the file keeps the order
+    the statements were generated in.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._file = open(path, 'w', buffering=WRITE_BUFFER_SIZE)
+        self._table: Optional[str] = None
+        self._columns: Optional[Sequence[str]] = None
+        self._rows: List[str] = []
+
+    def __enter__(self) -> 'SqlFileWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def insert(self, table: str, columns: Sequence[str], values: Sequence) -> None:
+        """Add a row to be inserted into table."""
+        if self._rows and (table != self._table or tuple(columns) != self._columns):
+            self.flush_rows()
+        self._table = table
+        self._columns = tuple(columns)
+        self._rows.append('(' + ', '.join(sql_literal(value) for value in values) + ')')
+        if len(self._rows) >= self.batch_size:
+            self.flush_rows()
+
+    def flush_rows(self) -> None:
+        """Write the pending rows as a single INSERT statement."""
+        if not self._rows:
+            return
+        prefix = f"INSERT INTO {self._table} ({', '.join(self._columns)}) VALUES"
+        if len(self._rows) == 1:
+            self._file.write(f"{prefix} {self._rows[0]};\n")
+        else:
+            self._file.write(prefix + '\n' + ',\n'.join(self._rows) + ';\n')
+        self._rows.clear()
+
+    def write_line(self, text: str) -> None:
+        """Write a raw line such as a comment or an update statement."""
+        self.flush_rows()
+        self._file.write(text + '\n')
+
+    def section(self, title: str) -> None:
+        """Start a new commented section of the file."""
+        self.flush_rows()
+        self._file.write(f"\n-- {title}\n")
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush_rows()
+        self._file.close()
+
+
+class CopyFileWriter:
+    """Writes rows as PostgreSQL COPY ... FROM STDIN blocks for psql.
+
+    Has the same insert()/write_line()/section()/close() interface as
+    SqlFileWriter, so the code generating the rows does not care which one it
+    is given.  Consecutive rows for the same table and columns go into one COPY
+    block, which is ended with \\. before anything else is written.  A path of
+    '-' writes to stdout.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path == '-':
+            self._file = sys.stdout
+        else:
+            self._file = open(path, 'w', buffering=WRITE_BUFFER_SIZE)
+        self._table: Optional[str] = None
+        self._columns: Optional[Sequence[str]] = None
+        self.rows = 0
+
+    def __enter__(self) -> 'CopyFileWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def insert(self, table: str, columns: Sequence[str], values: Sequence) -> None:
+        """Add a row to the COPY block for table, starting a new block if needed."""
+        if self._table is not None and (table != self._table or tuple(columns) != self._columns):
+            self.flush_rows()
+        if self._table is None:
+            self._table = table
+            self._columns = tuple(columns)
+            self._file.write(f"COPY {table} ({', '.join(columns)}) FROM STDIN;\n")
+        self._file.write('\t'.join(copy_value(value) for value in values) + '\n')
+        self.rows += 1
+
+    def flush_rows(self) -> None:
+        """End the open COPY block."""
+        if self._table is None:
+            return
+        self._file.write('\\.\n')
+        self._table = None
+        self._columns = None
+
+    def write_line(self, text: str) -> None:
+        """Write a raw line such as a comment or an update statement."""
+        self.flush_rows()
+        self._file.write(text + '\n')
+
+    def section(self, title: str) -> None:
+        """Start a new commented section of the file."""
+        self.flush_rows()
+        self._file.write(f"\n-- {title}\n")
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush_rows()
+        if self._file is sys.stdout:
+            self._file.flush()
+        else:
+            self._file.close()
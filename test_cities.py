@@ -0,0 +1,100 @@
+import copy
+import io
+import os
+import stat
+import tempfile
+import unittest
+
+import countries_data
+from cities import NO_STATE, GazetteerMerge, print_countries, write_countries_file
+
+
+def reference_update(countries, data_structure):
+    """The update_countries_data() GazetteerMerge replaced: every country gets
+    the empty state fixups and is re-sorted.  City states are stored as lists,
+    the countries_data.py format."""
+    countries = copy.deepcopy(countries)
+    for country in data_structure:
+        if country not in countries:
+            countries[country] = {'name': country, 'states': [], 'cities': {}}
+    for country, states in data_structure.items():
+        country_info = countries[country]
+        for state in states:
+            if state not in country_info['states']:
+                country_info['states'].append(state)
+        for state, cities in states.items():
+            for city in cities:
+                if city not in country_info['cities']:
+                    effective_state = state if state and state.strip() else NO_STATE
+                    country_info['cities'][city] = [effective_state]
+                    if effective_state == NO_STATE and effective_state not in country_info['states']:
+                        country_info['states'].append(effective_state)
+    for country_info in countries.values():
+        for city, state in list(country_info['cities'].items()):
+            if not state or (isinstance(state, str) and not state.strip()):
+                country_info['cities'][city] = [NO_STATE]
+                if NO_STATE not in country_info['states']:
+                    country_info['states'].append(NO_STATE)
+    countries = dict(sorted(countries.items(), key=lambda x: (-len(x[0].split()), x[0])))
+    for country_info in countries.values():
+        country_info['states'].sort(key=lambda state: (-state.count('/'), state))
+        country_info['cities'] = dict(sorted(country_info['cities'].items(), key=lambda item: (item[1], item[0])))
+        if 'state_variations' in country_info:
+            country_info['state_variations'] = dict(sorted(country_info['state_variations'].items()))
+    return countries
+
+
+def render(countries):
+    out = io.StringIO()
+    print_countries(countries, out)
+    return out.getvalue()
+
+
+class TestGazetteerMerge(unittest.TestCase):
+    def setUp(self):
+        self.countries = copy.deepcopy(countries_data.countries)
+        # Cities with an empty state in countries the workers list does not touch
+        self.countries['Canada']['cities']['Nowhere Junction'] = []
+        self.countries['Mexico']['cities']['Blank Flats'] = ' '
+        self.data_structure = {
+            'Canada': {'Alberta': {'Calgary', 'Brand New Town'}, 'Nunavut Territory': {'Iqaluit'}},
+            'United States': {NO_STATE: {'Somewhere'}},
+            'Atlantis': {'Poseidonia': {'Atlantis City'}},
+        }
+
+    def test_merge_matches_update_countries_data(self):
+        """Test merging into a copy of countries_data renders the same as the old full update"""
+        expected = render(reference_update(self.countries, self.data_structure))
+        merge = GazetteerMerge(copy.deepcopy(self.countries))
+        for country, states in self.data_structure.items():
+            for state, cities in states.items():
+                for city in sorted(cities):
+                    merge.add(country, state, city)
+        self.assertEqual(render(merge.finish()), expected)
+
+    def test_empty_states_fixed_in_unchanged_countries(self):
+        """Test cities with an empty state are fixed even when nothing is merged into their country"""
+        merged = GazetteerMerge(copy.deepcopy(self.countries)).finish()
+        self.assertEqual(merged['Mexico']['cities']['Blank Flats'], [NO_STATE])
+        self.assertIn(NO_STATE, merged['Canada']['states'])
+
+
+class TestWriteCountriesFile(unittest.TestCase):
+    def test_keeps_file_mode(self):
+        """Test a rewritten countries_data.py keeps its mode and a new one gets the umask default"""
+        countries = {'Canada': {'name': 'Canada', 'states': ['Alberta'], 'cities': {'Calgary': ['Alberta']}}}
+        umask = os.umask(0o022)
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = os.path.join(tmpdir, 'countries_data.py')
+                write_countries_file(countries, path)
+                self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o644)
+                os.chmod(path, 0o664)
+                write_countries_file(countries, path)
+                self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o664)
+        finally:
+            os.umask(umask)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import random
+import unittest
+
+from colocation import colocations, format_colocation
+from interval_index import Interval, make_interval
+
+
+def row(perp, start, end, row_type='Convention', location='Regina', state='Saskatchewan'):
+    return Interval(start, end, perp, 'Canada', state, location, row_type)
+
+
+class TestColocation(unittest.TestCase):
+    def setUp(self):
+        self.rows = [
+            row('Jane Doe', '1950-01-01', '1952-12-31'),
+            row('John Roe', '1952-12-31', '1953-12-31', 'Workers List'),
+            row('Jane Doe', '1953-06-01', '1953-06-30'),
+            row('Ann Poe', '1954-01-01', '1954-12-31'),
+            row('Ann Poe', '1950-01-01', '1950-12-31', location='Moose Jaw'),
+        ]
+
+    def test_pairs_and_windows(self):
+        """Test rows sharing a day at the same location are paired with their overlap window"""
+        self.assertEqual([format_colocation(pair) for pair in colocations(self.rows)], [
+            'Jane Doe|John Roe|Canada|Saskatchewan|Regina|1952-12-31|1952-12-31|Convention|Workers List',
+            'Jane Doe|John Roe|Canada|Saskatchewan|Regina|1953-06-01|1953-06-30|Convention|Workers List',
+        ])
+
+    def test_type_filter_and_level(self):
+        """Test both rows must have a wanted type and wider levels pair across locations"""
+        self.assertEqual(list(colocations(self.rows, types=['Convention'])), [])
+        pairs = list(colocations(self.rows, level='state', types=['Convention']))
+        self.assertEqual([(pair.first.perp, pair.second.perp, pair.start) for pair in pairs],
+                         [('Ann Poe', 'Jane Doe', '1950-01-01')])
+
+    def test_single_month_row_covers_the_month(self):
+        """Test a row with only a start month is paired with a convention later that month"""
+        month_row = make_interval('Jane Doe', 'Canada', 'Saskatchewan', 'Regina', 'Visit', '1950-07-01', None)
+        convention = row('John Roe', '1950-07-15', '1950-07-20')
+        pairs = list(colocations([month_row, convention]))
+        self.assertEqual([(pair.start, pair.end) for pair in pairs], [('1950-07-15', '1950-07-20')])
+
+    def test_matches_brute_force(self):
+        """Test the sweep finds exactly the overlapping pairs of different perps, with many
+        overlapping rows of the same perp"""
+        rng = random.Random(3)
+        dates = [f"{year}-{month:02d}-01" for year in range(1950, 1956) for month in range(1, 13)]
+        rows = [row(rng.choice(['A'] * 8 + ['B', 'C']), *sorted(rng.sample(dates, 2))) for _ in range(200)]
+        expected = []
+        for i, first in enumerate(rows):
+            for second in rows[i + 1:]:
+                if first.perp != second.perp and first.start <= second.end and second.start <= first.end:
+                    expected.append(tuple(sorted((first, second), key=lambda r: (r.perp, r.start))))
+        found = [(pair.first, pair.second) for pair in colocations(rows)]
+        self.assertEqual(sorted(found), sorted(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from date_utils import parse_month_range, resolve_dates
+
+
+class TestDateUtils(unittest.TestCase):
+    def test_month_ranges(self):
+        """Test months, seasons and ranges of either, in any case and spacing"""
+        self.assertEqual(parse_month_range('Jul'), (7, None))
+        self.assertEqual(parse_month_range('Sept'), (9, None))
+        self.assertEqual(parse_month_range('jan - July'), (1, 7))
+        self.assertEqual(parse_month_range('Winter'), (12, 2))
+        self.assertEqual(parse_month_range('Winter-Spring'), (12, 5))
+        self.assertEqual(parse_month_range('Someday'), (None, None))
+
+    def test_resolve_dates(self):
+        """Test the order of precedence: year range, day range, month, whole year"""
+        self.assertEqual(resolve_dates('1950-1952', '07/07', '07/09', 'July'), ('1950-01-01', '1952-12-31'))
+        self.assertEqual(resolve_dates('1967', '06/29', '07/02', 'June'), ('1967-06-29', '1967-07-02'))
+        self.assertEqual(resolve_dates('1983', '07/07', '', 'July'), ('1983-07-01', None))
+        self.assertEqual(resolve_dates('1973', '', '', 'Jul-Dec'), ('1973-07-01', '1973-12-28'))
+        self.assertEqual(resolve_dates('1969', '', '', 'Winter-Spring'), ('1969-12-01', '1970-05-28'))
+        self.assertEqual(resolve_dates('1981'), ('1981-01-01', '1981-12-31'))
+        with self.assertRaises(ValueError):
+            resolve_dates('19xx')
+
+
+if __name__ == '__main__':
+    unittest.main()
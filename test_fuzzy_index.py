@@ -0,0 +1,46 @@
+import unittest
+
+from fuzzy_index import FuzzyIndex, candidate_terms, edit_distance, suggest
+
+
+class TestFuzzyIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = FuzzyIndex.from_countries({
+            'Canada': {
+                'states': ['Alberta', 'Saskatchewan'],
+                'cities': {'High River, Claresholm': ['Alberta'], 'Assiniboia': ['Saskatchewan'],
+                           '--Not Specified--': ['Alberta']},
+                'state_variations': {'AB': 'Alberta'},
+            },
+        })
+
+    def test_edit_distance(self):
+        """Test edits, adjacent swaps and the early exit"""
+        self.assertEqual(edit_distance('surray', 'surrey', 2), 1)
+        self.assertEqual(edit_distance('albreta', 'alberta', 2), 1)
+        self.assertEqual(edit_distance('calgary', 'toronto', 2), 3)
+
+    def test_lookup_finds_misspellings(self):
+        """Test the hard-coded text_fixes misspellings are found"""
+        self.assertEqual(self.index.lookup('Assinibboia')[0], (('Assiniboia', 'city', 'Canada'), 1))
+        self.assertEqual(self.index.lookup('Charesholm')[0], (('Claresholm', 'city', 'Canada'), 1))
+
+    def test_lookup_exact_and_short_terms(self):
+        """Test exact names come back with distance 0 and short words are not guessed at"""
+        self.assertEqual(self.index.lookup('alberta'), [(('Alberta', 'state', 'Canada'), 0)])
+        self.assertEqual(self.index.lookup('AC'), [])
+        self.assertNotIn('--not specified--', self.index.entries)
+
+    def test_candidate_terms(self):
+        """Test runs of capitalized words are generated and lowercase words and keywords end a run"""
+        self.assertEqual(list(candidate_terms('Workers List High Rivr (field) Albrta')),
+                         ['High', 'High Rivr', 'Rivr', 'Albrta'])
+
+    def test_suggest(self):
+        """Test only the words that are close to but not exactly a name are suggested"""
+        suggestions = suggest(self.index, 'Visiting Charesholm, Alberta')
+        self.assertEqual(suggestions, [('Charesholm', ('Claresholm', 'city', 'Canada'), 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
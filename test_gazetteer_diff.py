@@ -0,0 +1,72 @@
+import unittest
+
+from gazetteer_diff import Snapshot, diff, gazetteer_places, stable_recid
+
+
+class TestGazetteerDiff(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = Snapshot()
+        self.snapshot.add_country('c-canada', 'Canada')
+        self.snapshot.add_state('s-alberta', 'c-canada', 'Alberta')
+        self.snapshot.add_location('l-calgary', 's-alberta', 'Calgary')
+        self.snapshot.add_location('l-banff', 's-alberta', 'Banff')
+
+    def test_existing_places_produce_no_changes(self):
+        """Test places already in the snapshot are not inserted again"""
+        changes = diff(self.snapshot, [('Canada', 'Alberta', 'Calgary')])
+        self.assertFalse(changes)
+
+    def test_missing_rows_are_inserted_once_in_dependency_order(self):
+        """Test a new state and its locations are inserted once under the existing country"""
+        changes = diff(self.snapshot, [
+            ('Canada', 'Ontario', 'Toronto'),
+            ('Canada', 'Ontario', 'Ottawa'),
+            ('Canada', 'Ontario', 'Toronto'),
+            ('Canada', 'Alberta', 'Edmonton'),
+        ])
+        ontario = stable_recid('state', 'Canada', 'Ontario')
+        self.assertEqual(changes.countries, [])
+        self.assertEqual(changes.states, [(ontario, 'c-canada', 'Ontario')])
+        self.assertEqual([(state, name) for _, state, name in changes.locations],
+                         [(ontario, 'Toronto'), (ontario, 'Ottawa'), ('s-alberta', 'Edmonton')])
+
+    def test_recids_are_deterministic(self):
+        """Test the same place gets the same recid on every run"""
+        first = diff(Snapshot(), [('Peru', 'Lima', 'Lima')])
+        second = diff(Snapshot(), [('Peru', 'Lima', 'Lima')])
+        self.assertEqual(first, second)
+        self.assertEqual(len({first.countries[0][0], first.states[0][0], first.locations[0][0]}), 3)
+
+    def test_unknown_countries_can_be_skipped(self):
+        """Test add_countries=False reports places in unknown countries instead of adding them"""
+        changes = diff(self.snapshot, [('Peru', 'Lima', 'Lima')], add_countries=False)
+        self.assertFalse(changes)
+        self.assertEqual(changes.skipped, [('Peru', 'Lima', 'Lima')])
+
+    def test_remap_same_name_locations(self):
+        """Test snapshot locations that move to another state are remapped, kept ones are not"""
+        changes = diff(self.snapshot, [('Canada', 'Alberta', 'Calgary'), ('Canada', 'Rockies', 'Banff'),
+                                       ('Canada', 'Rockies', 'Calgary')], remap_locations=True)
+        banff = stable_recid('location', 'Canada', 'Rockies', 'Banff')
+        self.assertEqual(changes.location_remaps, [('Banff', 'l-banff', banff)])
+
+    def test_gazetteer_places(self):
+        """Test --No State--, --Not Specified-- and city-less countries expand like insert_csl.py"""
+        countries = {
+            'Canada': {'states': ['Alberta', 'Yukon'], 'cities': {'Calgary': ['Alberta'], '--Not Specified--': ['Alberta']}},
+            'Malta': {'states': ['--No State--'], 'cities': {'Valletta': ['--No State--']}},
+            'Fiji': {'states': [], 'cities': {}},
+        }
+        self.assertEqual(list(gazetteer_places(countries)), [
+            ('Canada', 'Alberta', None),
+            ('Canada', 'Yukon', None),
+            ('Canada', 'Alberta', 'Calgary'),
+            ('Canada', 'Alberta', 'Alberta'),
+            ('Malta', 'Malta', None),
+            ('Malta', 'Malta', 'Valletta'),
+            ('Fiji', 'Fiji', 'Fiji'),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from golden import FileDiff, diff_rows, format_report, row_type
+
+
+class TestGolden(unittest.TestCase):
+    def test_diff_rows_lines_up_rows(self):
+        """Test one changed row does not make the following rows differ"""
+        expected = ['header', 'a', 'b', 'c', 'd']
+        actual = ['header', 'a', 'B', 'c', 'd', 'e']
+        self.assertEqual(diff_rows(expected, actual), (['b'], ['B', 'e']))
+
+    def test_row_type(self):
+        """Test the Type column is read from quoted rows"""
+        self.assertEqual(row_type('MATCHED|Jane Doe|1950|Convention|Canada|"A|B"|Calgary|x|||||'), 'Convention')
+        self.assertEqual(row_type('Status|Perp Name|Year|Type'), '(header)')
+
+    def test_format_report_counts_by_type(self):
+        """Test changes are summarized per type"""
+        diffs = [FileDiff('a_from_pdf.txt', ['MATCHED|A|1950|Visit|Canada'], ['MATCHED|A|1950|Convention|Canada'],
+                          False, False),
+                 FileDiff('b_from_pdf.txt', [], [], False, False)]
+        report = format_report(diffs)
+        self.assertIn('Files: 2  Changed: 1  Rows removed: 1  Rows added: 1', report)
+        self.assertIn('-0      +1      Convention', report)
+        self.assertIn('-1      +0      Visit', report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from gazetteer_diff import Snapshot
+from importer_backends import LOCATION_COLUMNS, PERP_LOCATION_COLUMNS, LazyBackend, SnapshotBackend, SqliteBackend
+
+
+class TestSqliteBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = SqliteBackend()
+        self.calgary = self.backend.add_location('Canada', 'Alberta', 'Calgary')
+        self.backend.add_location('Canada', 'Saskatchewan')
+        self.backend.add_location('Guam')
+        self.perp = self.backend.add_perp('Jane Doe')
+
+    def tearDown(self):
+        self.backend.close()
+
+    def test_get_locations_matches_rpc_shape(self):
+        """Test countries and states without children come back with None columns"""
+        rows = self.backend.get_locations()
+        self.assertEqual([(row['country_name'], row['state_name'], row['location_name']) for row in rows],
+                         [('Canada', 'Alberta', 'Calgary'), ('Canada', 'Saskatchewan', None), ('Guam', None, None)])
+        snapshot = Snapshot.from_location_rows(rows)
+        self.assertIn('Calgary', snapshot.locations_by_name)
+
+    def test_find_perps(self):
+        """Test only existing perps are returned"""
+        self.assertEqual(self.backend.find_perps(['Jane Doe', 'Nobody']), {'Jane Doe': self.perp})
+
+    def test_insert_and_fetch(self):
+        """Test inserted rows are read back with the requested columns"""
+        row = dict.fromkeys(PERP_LOCATION_COLUMNS)
+        row.update(perp_recid=self.perp, location_recid=self.calgary, start_date='1950-01-01', note="O'Brien")
+        self.backend.insert_perp_locations([row, dict(row, note=None)])
+        self.assertEqual(self.backend.fetch_perp_locations([self.perp], ('location_recid', 'note')),
+                         [{'location_recid': self.calgary, 'note': "O'Brien"},
+                          {'location_recid': self.calgary, 'note': None}])
+        self.assertEqual(self.backend.requests, 2)
+        with self.assertRaises(ValueError):
+            self.backend.fetch_perp_locations([self.perp], ('recid; drop table perp',))
+
+
+class TestSnapshotBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.write('insert_perp_location_check.csv', LOCATION_COLUMNS,
+                   [('Canada', 'c1', 'Alberta', 's1', 'Calgary', 'l1'), ('Guam', 'c2', '', '', '', '')])
+        self.write('perp.csv', ('recid', 'name'), [('p1', 'Jane Doe')])
+        self.backend = SnapshotBackend(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, filename, header, rows):
+        with open(os.path.join(self.tmpdir.name, filename), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def test_reads_snapshots(self):
+        """Test locations and perps come from the CSV files with blanks as None"""
+        rows = self.backend.get_locations()
+        self.assertEqual(rows[1], {'country_name': 'Guam', 'country_recid': 'c2', 'state_name': None,
+                                   'state_recid': None, 'location_name': None, 'location_recid': None})
+        self.assertEqual(self.backend.find_perps(['Jane Doe', 'Nobody']), {'Jane Doe': 'p1'})
+
+    def test_missing_file_and_insert(self):
+        """Test perp_location.csv is only needed when asked for and inserts are refused"""
+        with self.assertRaises(FileNotFoundError):
+            self.backend.fetch_perp_locations(['p1'], ('note',))
+        with self.assertRaises(RuntimeError):
+            self.backend.insert_perp_locations([{}])
+
+    def test_lazy_backend_connects_on_first_call(self):
+        """Test the factory is only called once data is needed"""
+        calls = []
+        lazy = LazyBackend(lambda: calls.append(1) or self.backend)
+        self.assertEqual(calls, [])
+        self.assertEqual(lazy.find_perps(['Jane Doe']), {'Jane Doe': 'p1'})
+        lazy.get_locations()
+        self.assertEqual(calls, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
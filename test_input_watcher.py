@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from input_watcher import InputWatcher
+
+
+class TestInputWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.watcher = InputWatcher(self.tmpdir.name, lambda filename: filename.endswith('_from_pdf.txt'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, filename, text, mtime):
+        path = os.path.join(self.tmpdir.name, filename)
+        with open(path, 'w') as f:
+            f.write(text)
+        os.utime(path, ns=(mtime, mtime))
+        return path
+
+    def test_new_file_is_reported_once_settled(self):
+        """Test a file is reported after it stops changing, and only once"""
+        path = self.write('A_from_pdf.txt', '1950 Calgary', 1_000_000_000)
+        self.write('notes.txt', 'ignored', 1_000_000_000)
+        self.assertEqual(self.watcher.poll(), [])
+        self.write('A_from_pdf.txt', '1950 Calgary Alberta', 2_000_000_000)
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.watcher.poll(), [path])
+        self.assertEqual(self.watcher.poll(), [])
+
+    def test_existing_files_and_modifications(self):
+        """Test files present at startup are skipped until they are modified"""
+        path = self.write('A_from_pdf.txt', '1950 Calgary', 1_000_000_000)
+        self.watcher.mark_all_processed()
+        self.assertEqual(self.watcher.poll(), [])
+        self.write('A_from_pdf.txt', '1950 Calgary\n1951 Regina', 2_000_000_000)
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.watcher.poll(), [path])
+
+    def test_saved_state_survives_restart(self):
+        """Test a restarted watcher only reports the files that changed since the state was saved"""
+        a = self.write('A_from_pdf.txt', '1950 Calgary', 1_000_000_000)
+        b = self.write('B_from_pdf.txt', '1950 Regina', 1_000_000_000)
+        self.assertEqual(self.watcher.changed(), [a, b])
+        state = os.path.join(self.tmpdir.name, 'out.txt.watch')
+        self.watcher.save(state)
+        # Saving again keeps the mode of the saved state
+        os.chmod(state, 0o640)
+        self.watcher.save(state)
+        self.assertEqual(os.stat(state).st_mode & 0o777, 0o640)
+
+        self.write('B_from_pdf.txt', '1950 Regina\n1951 Moose Jaw', 2_000_000_000)
+        c = self.write('C_from_pdf.txt', '1952 Banff', 2_000_000_000)
+        restarted = InputWatcher(self.tmpdir.name, lambda filename: filename.endswith('_from_pdf.txt'))
+        restarted.load(state)
+        self.assertEqual(restarted.changed(), [b, c])
+        self.assertEqual(restarted.changed(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# insert_csl.py parses the command line when imported
+with mock.patch.object(sys, 'argv', ['insert_csl.py']):
+    import insert_csl
+
+
+def existing_records(countries, states, locations):
+    """The load_existing_records() structure for (recid, name), (recid, country_recid, name)
+    and (recid, state_recid, name) rows."""
+    existing = {'countries': {}, 'states': {}, 'locations': {}, 'locations_by_name': {},
+                'curr_countries': {}, 'curr_states': {}, 'curr_locations': {}}
+    for recid, name in countries:
+        existing['curr_countries'][recid] = {'name': name, 'recid': recid}
+        existing['countries'].setdefault(name, recid)
+    for recid, country_recid, name in states:
+        existing['curr_states'][recid] = {'name': name, 'recid': recid, 'country_recid': country_recid}
+        existing['states'].setdefault((country_recid, name), recid)
+    for recid, state_recid, name in locations:
+        existing['curr_locations'][recid] = {'name': name, 'recid': recid, 'state_recid': state_recid}
+        existing['locations'].setdefault((state_recid, name), recid)
+        existing['locations_by_name'].setdefault(name, []).append(recid)
+    return existing
+
+
+class TestWriteLocations(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def run_write_locations(self, countries, existing):
+        registry = insert_csl.RecidRegistry(existing)
+        sql = insert_csl.SqlOutputs()
+        with mock.patch.object(insert_csl.countries_data, 'countries', countries):
+            registry.country_ordinals = {name: ordinal for ordinal, name in enumerate(countries, 1)}
+            try:
+                insert_csl.write_locations(existing, registry, sql)
+            finally:
+                sql.close()
+        with open('inserts_perp_location.sql', 'r', encoding='utf-8') as f:
+            return registry, f.read()
+
+    def test_same_name_in_another_state_is_not_remapped(self):
+        """Test a location countries_data keeps under its own state is not remapped to a new
+        location with the same name elsewhere, while a same-name location under a state
+        countries_data does not have is"""
+        countries = {'United States': {'states': ['Kentucky', 'Illinois'],
+                                       'cities': {'Mt. Sterling': ['Kentucky', 'Illinois']}}}
+        existing = existing_records(
+            [('C-US', 'United States')],
+            [('S-IL', 'C-US', 'Illinois'), ('S-OLD', 'C-US', 'Ilinois')],
+            [('L-IL', 'S-IL', 'Mt. Sterling'), ('L-OLD', 'S-OLD', 'Mt. Sterling')])
+        registry, perp_location_sql = self.run_write_locations(countries, existing)
+
+        new_recid = registry.new_location_recids['Mt. Sterling']
+        self.assertIn('L-IL', registry.matched_locations)
+        self.assertNotIn("where location_recid='L-IL'", perp_location_sql)
+        self.assertIn(f"set location_recid='{new_recid}' where location_recid='L-OLD'", perp_location_sql)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import contextlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import insert_perp_locations
+from importer_backends import PERP_LOCATION_COLUMNS, SqliteBackend
+from output_writers import OUTPUT_COLUMNS
+
+
+def pipe_row(perp, country, state, location, note, iso_start, iso_end):
+    values = dict.fromkeys(OUTPUT_COLUMNS, '')
+    values.update({'Status': 'MATCHED', 'Perp Name': perp, 'Year': iso_start[:4], 'Type': 'Convention',
+                   'Country': country, 'State': state, 'Location': location, 'Note': note,
+                   'ISO Start Date': iso_start, 'ISO End Date': iso_end})
+    return '|'.join(values[column] for column in OUTPUT_COLUMNS)
+
+
+class TestDelta(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # The run writes insert_perp_location_check.csv to the current directory
+        os.chdir(self.tmpdir.name)
+        # Start from empty caches
+        importlib.reload(insert_perp_locations)
+        self.db_path = os.path.join(self.tmpdir.name, 'test.db')
+        db = SqliteBackend(self.db_path)
+        self.calgary = db.add_location('Canada', 'Alberta', 'Calgary')
+        self.perp = db.add_perp('Jane Doe')
+        existing = [
+            ('1950-07-01', '1950-07-31', 'Convention'),
+            ('1951-01-01', '1951-12-31', None),
+        ]
+        rows = []
+        for start, end, note in existing:
+            row = dict.fromkeys(PERP_LOCATION_COLUMNS)
+            row.update(perp_recid=self.perp, location_recid=self.calgary, start_date=start, end_date=end, note=note)
+            rows.append(row)
+        db.insert_perp_locations(rows)
+        db.close()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def run_importer(self, *rows):
+        stdin = io.StringIO('|'.join(OUTPUT_COLUMNS) + '\n' + ''.join(row + '\n' for row in rows))
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        argv = ['insert_perp_locations.py', '--sqlite', self.db_path, '--delta']
+        with mock.patch.object(sys, 'argv', argv), mock.patch.object(sys, 'stdin', stdin), \
+                contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            insert_perp_locations.main()
+        return stdout.getvalue().splitlines(), stderr.getvalue()
+
+    def test_delta(self):
+        """Test existing rows are skipped, a NULL note matches an empty Note, a changed
+        note is emitted and repeats within the input are emitted once"""
+        statements, messages = self.run_importer(
+            pipe_row('Jane Doe', 'Canada', 'Alberta', 'Calgary', 'Convention', '1950-07-01', '1950-07-31'),
+            pipe_row('Jane Doe', 'Canada', 'Alberta', 'Calgary', '', '1951-01-01', '1951-12-31'),
+            pipe_row('Jane Doe', 'Canada', 'Alberta', 'Calgary', 'Convention (Jul 5)', '1950-07-01', '1950-07-31'),
+            pipe_row('Jane Doe', 'Canada', 'Alberta', 'Calgary', 'Convention (Jul 5)', '1950-07-01', '1950-07-31'),
+        )
+        self.assertEqual(len(statements), 1)
+        self.assertIn("'Convention (Jul 5)'", statements[0])
+        self.assertIn(f"'{self.calgary}'", statements[0])
+        self.assertIn('Skipped 3 rows already in perp_location', messages)
+
+    def test_perp_location_key(self):
+        """Test missing, None and empty values hash the same and other columns are ignored"""
+        key = insert_perp_locations.perp_location_key
+        row = {'perp_recid': 'p1', 'location_recid': 'l1', 'start_date': '1950-01-01', 'end_date': None}
+        self.assertEqual(key(dict(row, note=None)), key(dict(row, note='')))
+        self.assertEqual(key(row), key(dict(row, note=None, created_date='2024-01-01')))
+        self.assertNotEqual(key(dict(row, note='a')), key(dict(row, note='b')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import random
+import tempfile
+import unittest
+
+from interval_index import Interval, IntervalIndex, IntervalTree, make_interval, read_intervals
+
+
+def interval(perp, start, end, location='Calgary', state='Alberta', country='Canada'):
+    return Interval(start, end, perp, country, state, location, 'Convention')
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def test_tree_matches_brute_force(self):
+        """Test tree queries return exactly the overlapping intervals"""
+        rng = random.Random(7)
+        dates = [f"{year}-{month:02d}-01" for year in range(1950, 1960) for month in range(1, 13)]
+        intervals = [interval(str(i), *sorted(rng.sample(dates, 2))) for i in range(300)]
+        tree = IntervalTree(intervals)
+        for _ in range(200):
+            start, end = sorted(rng.sample(dates, 2))
+            expected = sorted(i for i in intervals if i.start <= end and i.end >= start)
+            self.assertEqual(sorted(tree.overlapping(start, end)), expected)
+
+    def test_levels(self):
+        """Test queries per location, state and country"""
+        index = IntervalIndex([
+            interval('A', '1950-01-01', '1952-12-31'),
+            interval('B', '1952-06-01', '1952-06-30'),
+            interval('C', '1952-01-01', '1952-12-31', location='Banff'),
+            interval('D', '1952-01-01', '1952-12-31', location='Regina', state='Saskatchewan'),
+            interval('E', '1953-01-01', '1953-12-31'),
+        ])
+        self.assertEqual([i.perp for i in index.overlapping('location', ('Canada', 'Alberta', 'Calgary'),
+                                                             '1952-01-01', '1952-12-31')], ['A', 'B'])
+        self.assertEqual(len(index.overlapping('state', ('Canada', 'Alberta'), '1952-01-01', '1952-12-31')), 3)
+        self.assertEqual(len(index.overlapping('country', ('Canada',), '1952-01-01', '1952-12-31')), 4)
+        self.assertEqual([(a.perp, b.perp) for a, b in index.colocated_with('A')], [('A', 'B')])
+
+    def test_make_interval(self):
+        """Test rows with only a start cover the start month (or year) and rows without a date are skipped"""
+        self.assertEqual(make_interval('A', 'Canada', 'Alberta', 'Calgary', 'Visit', '1983-07-01', None).end,
+                         '1983-07-31')
+        self.assertEqual(make_interval('A', 'Canada', 'Alberta', 'Calgary', 'Visit', '1952-02-01', '').end,
+                         '1952-02-29')
+        self.assertEqual(make_interval('A', 'Canada', 'Alberta', 'Calgary', 'Visit', '1952', None).end,
+                         '1952-12-31')
+        self.assertIsNone(make_interval('A', 'Canada', 'Alberta', 'Calgary', 'Visit', '', ''))
+
+    def test_single_month_row_overlaps_within_month(self):
+        """Test a 'Jul 1950' row overlaps a convention later in July"""
+        month_row = make_interval('A', 'Canada', 'Alberta', 'Calgary', 'Visit', '1950-07-01', None)
+        convention = interval('B', '1950-07-15', '1950-07-20')
+        index = IntervalIndex([month_row, convention])
+        self.assertEqual([(a.perp, b.perp) for a, b in index.colocated_with('A')], [('A', 'B')])
+
+    def test_read_both_formats(self):
+        """Test process_locations.py output and --resolved-csv files are both read"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pipe_path = os.path.join(tmpdir, 'abc2.txt')
+            with open(pipe_path, 'w') as f:
+                f.write("Status|Perp Name|Year|Type|Country|State|Location|Note|Start Date|End Date|Month|"
+                        "Original Text|Fixed Text|ISO Start Date|ISO End Date\n"
+                        "MATCHED|Jane Doe|1950|Convention|Canada|Alberta|Calgary||||||x|1950-01-01|1950-12-31\n")
+            csv_path = os.path.join(tmpdir, 'resolved.csv')
+            with open(csv_path, 'w') as f:
+                f.write("perp_name,perp_recid,country,state,location,location_recid,type,start_date,end_date,note\n"
+                        "Jane Doe,p1,Canada,Alberta,Calgary,l1,Convention,1950-01-01,1950-12-31,\n")
+            self.assertEqual(list(read_intervals(pipe_path)), list(read_intervals(csv_path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from line_tokens import (ASTERISK, DAY_RANGE, KEYWORD, MONTH, MONTH_RANGE, PAREN, WITH, YEAR,
+                         first_token, leading_month, line_keywords, tokenize_line, tokens_of)
+
+
+class TestLineTokens(unittest.TestCase):
+    def test_token_stream(self):
+        """Test one scan finds every kind of token in position order"""
+        line = 'Jan-July 1950 Workers List (Calgary) *Winter/Spring* Mar 5-7 with Jane Doe'
+        kinds = [token.kind for token in tokenize_line(line) if token.kind != 'WORD']
+        self.assertEqual(kinds, [MONTH_RANGE, YEAR, KEYWORD, PAREN, ASTERISK, MONTH, MONTH, MONTH, DAY_RANGE, WITH])
+        self.assertEqual(first_token(line, PAREN).value, 'Calgary')
+        self.assertEqual(first_token(line, ASTERISK).value, 'Winter/Spring')
+        self.assertEqual(first_token(line, WITH).value, 'Jane Doe')
+
+    def test_nested_tokens(self):
+        """Test a month inside parentheses is also a token of its own"""
+        line = 'Convention (July 4-6)'
+        self.assertEqual(first_token(line, PAREN).value, 'July 4-6')
+        self.assertEqual(first_token(line, MONTH).text, 'July')
+        self.assertEqual(first_token(line, DAY_RANGE).text, '4-6')
+
+    def test_leading_month(self):
+        """Test only a month, season or range at the very start is returned"""
+        self.assertEqual(leading_month('Jan-July Workers List'), 'Jan-July')
+        self.assertEqual(leading_month('spring - summer list'), 'spring - summer')
+        self.assertIsNone(leading_month('Sept Workers List'))
+        self.assertIsNone(leading_month('Workers List Jan'))
+
+    def test_keywords(self):
+        """Test keywords match inside words and the cased keywords need their capitals"""
+        self.assertEqual(line_keywords('Visiting Workers List staff'), {'visit', 'workers list', 'staff'})
+        self.assertEqual(line_keywords('Special Meeting'), {'Special Meeting'})
+        self.assertEqual(line_keywords('special meeting'), frozenset())
+        self.assertEqual(len(tokens_of('(a) (b)', PAREN)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
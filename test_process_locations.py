@@ -1,7 +1,11 @@
+import csv
+import io
+import json
 import unittest
+import output_writers
 import process_locations
 
-process_locations.validate_mode = True
+process_locations.DEFAULT_CONTEXT.validate = True
 
 from process_locations import handle_started_work, handle_workers_meeting, handle_special_meeting, handle_photo, handle_workers_list, handle_location_only, handle_convention, text_fixes, get_state_country
 from countries_data import countries
@@ -1267,5 +1271,204 @@ class TestGetStateCountry(unittest.TestCase):
 
 
 
+class TestPerpHomeCountry(unittest.TestCase):
+    def test_known_perp(self):
+        """Test home country comes from perps_data"""
+        self.assertEqual(process_locations.get_perp_home_country('Marion Crawford'), 'Canada')
+        self.assertEqual(process_locations.get_perp_home_country('Robert Flippo'), 'United States')
+
+    def test_unknown_perp(self):
+        """Test unknown perps fall back to the default home country"""
+        self.assertEqual(process_locations.get_perp_home_country('Nobody'), '--United States--')
+
+    def test_home_country_passed_to_handler(self):
+        """Test the home country is used when the line has no country"""
+        result = handle_workers_meeting("Workers Meeting", countries, 'Canada')
+        self.assertEqual(result['country'], 'Canada')
+        self.assertEqual(result['state'], 'Canada')
+        self.assertEqual(result['location'], 'Canada')
+
+
+class TestBatchProcessing(unittest.TestCase):
+    def setUp(self):
+        self.lines = [
+            "Mt. Sterling Illinois Convention",
+            "Rocanville Saskatchewan Special Meeting (Dec. 19th)",
+            "Insurgents Mexico Convention",
+            "glenvalley 2 Workers List",
+            "Mt. Sterling Illinois Convention",
+            "Guestbook",
+            "Workers Meeting",
+        ]
+
+    def test_batch_text_fixes_match_text_fixes(self):
+        """Test the prefiltered text fixes of the batch give the same lines as text_fixes"""
+        results = process_locations.process_text_patterns_batch(self.lines, None, 'Canada')
+        self.assertEqual(results['fixed'], [process_locations.clean_pattern_line(text_fixes(line)) for line in self.lines])
+
+    def test_text_fixes_prefilter_covers_corpus(self):
+        """Test text_fixes leaves every test corpus line the prefilter skips unchanged"""
+        import ast
+        corpus = set(self.lines)
+        for filename in ('test_process_locations.py', 'test_process_locations_trial.py'):
+            with open(filename, 'r', encoding='utf-8') as f:
+                tree = ast.parse(f.read())
+            corpus.update(node.value for node in ast.walk(tree)
+                          if isinstance(node, ast.Constant) and isinstance(node.value, str))
+        skipped = [line for line in corpus if not process_locations.TEXT_FIX_TRIGGER_PATTERN.search(line)]
+        self.assertTrue(skipped)
+        for line in skipped:
+            self.assertEqual(text_fixes(line), line)
+
+    def test_batch_line_error_only_fails_that_line(self):
+        """Test a line that raises while being fixed does not abort the batch"""
+        from unittest import mock
+        clean = process_locations.clean_pattern_line
+
+        def failing_clean(line):
+            if line == 'Guestbook':
+                raise ValueError('bad line')
+            return clean(line)
+
+        with mock.patch.object(process_locations, 'clean_pattern_line', failing_clean):
+            results = process_locations.process_text_patterns_batch(self.lines, None, 'Canada')
+        guestbook = self.lines.index('Guestbook')
+        self.assertEqual(results['error'][guestbook], 'bad line')
+        self.assertIsNone(results['type'][guestbook])
+        self.assertEqual(results['country'][0], 'United States')
+        self.assertTrue(all(error is None for i, error in enumerate(results['error']) if i != guestbook))
+
+    def test_batch_matches_single_line(self):
+        """Test the batch API gives the same results as process_text_patterns"""
+        years = [str(1950 + i) for i in range(len(self.lines))]
+        results = process_locations.process_text_patterns_batch(self.lines, years, 'Canada')
+        self.assertEqual(len(results['type']), len(self.lines))
+        for i, line in enumerate(self.lines):
+            single = process_locations.process_text_patterns(text_fixes(line), line, 'Canada')
+            self.assertEqual(results['year'][i], years[i])
+            self.assertIsNone(results['error'][i])
+            for column in ['type', 'country', 'state', 'location', 'note', 'start_date', 'end_date', 'original_text', 'fixed']:
+                self.assertEqual(results[column][i], single.get(column), f"{column} for {line}")
+
+
+class TestParserContext(unittest.TestCase):
+    def setUp(self):
+        self.lines = ["Mt. Sterling Illinois Convention", "Calgary Alberta Workers List", "Workers Meeting",
+                      "Rocanville Saskatchewan Special Meeting (Dec. 19th)"] * 5
+
+    def test_contexts_in_threads(self):
+        """Test batches parsed concurrently with their own contexts match sequential parsing
+        and each context's debug output goes to its own stream"""
+        from concurrent.futures import ThreadPoolExecutor
+        homes = ['Canada', 'United States', 'Australia', None]
+        expected = [process_locations.process_text_patterns_batch(self.lines, home_country=home) for home in homes]
+
+        def parse(home):
+            ctx = process_locations.ParserContext(home_country=home, validate=True, debug_stream=io.StringIO())
+            return process_locations.process_text_patterns_batch(self.lines, ctx=ctx), ctx.debug_stream.getvalue()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(parse, homes * 3))
+        for i, (columns, debug_output) in enumerate(results):
+            self.assertEqual(columns, expected[i % len(homes)])
+            self.assertIn('BOB', debug_output)
+        self.assertIs(process_locations.current_context(), process_locations.DEFAULT_CONTEXT)
+
+    def test_for_perp(self):
+        """Test a context for a perp gets the home country from perps_data"""
+        ctx = process_locations.ParserContext.for_perp('Marion Crawford')
+        self.assertEqual((ctx.perp_name, ctx.home_country), ('Marion Crawford', 'Canada'))
+        self.assertIs(ctx.countries, countries)
+
+
+class TestSuggestions(unittest.TestCase):
+    def test_resolved_to_city(self):
+        """Test only results naming a gazetteer city of their state count as resolved"""
+        resolved = process_locations.resolved_to_city
+        self.assertTrue(resolved('Workers List', 'Canada', 'Alberta', 'Calgary', countries))
+        self.assertFalse(resolved('Workers List', 'Canada', 'Ontario', 'Ontario', countries))
+        self.assertFalse(resolved('Workers List', 'Canada', 'Canada', 'Canada', countries))
+        self.assertFalse(resolved('Workers List', 'Canada', 'Ontario', 'Renfew', countries))
+        self.assertFalse(resolved(None, None, None, None, countries))
+
+    def test_state_fallback_gets_suggestion(self):
+        """Test a misspelled city the handler fell back to the state for gets a suggestion"""
+        import os
+        import tempfile
+        from fuzzy_index import FuzzyIndex
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'Marion Crawford_from_txt.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("1950 Renfew Ontario Workers List\n1951 Calgary Alberta Workers List\n")
+            output = io.StringIO()
+            rejects = io.StringIO()
+            process_locations.process_file(path, writer=output_writers.PipeWriter(output, rejects),
+                                           fuzzy=FuzzyIndex.from_countries(countries))
+        suggestions = rejects.getvalue().splitlines()
+        self.assertEqual(len(suggestions), 1)
+        self.assertTrue(suggestions[0].startswith('SUGGEST - Renfew -> Renfrew (city, Canada, distance 1)'))
+
+
+class TestOutputWriters(unittest.TestCase):
+    def setUp(self):
+        self.values = ['MATCHED', 'Marion Crawford', '1950', 'Convention', 'Canada', 'Alberta', 'Calgary',
+                       'Note | with pipe', '', '', '', 'Calgary "Alberta" Convention', 'Calgary Alberta Convention']
+
+    def test_pipe_writer_round_trip(self):
+        """Test pipe output with | and quotes in fields parses back with csv.DictReader"""
+        stream = io.StringIO()
+        writer = output_writers.PipeWriter(stream, io.StringIO())
+        writer.write_header()
+        writer.write_header()
+        writer.write_row(self.values)
+        writer.flush()
+        rows = list(csv.DictReader(io.StringIO(stream.getvalue()), delimiter='|'))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['Note'], 'Note | with pipe')
+        self.assertEqual(rows[0]['Original Text'], 'Calgary "Alberta" Convention')
+        self.assertEqual(rows[0]['Fixed Text'], 'Calgary Alberta Convention')
+
+    def test_ndjson_writer(self):
+        """Test ndjson output has no header and one object per row"""
+        stream = io.StringIO()
+        writer = output_writers.NdjsonWriter(stream, io.StringIO())
+        writer.write_header()
+        writer.write_row(self.values)
+        writer.flush()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['Note'], 'Note | with pipe')
+
+    def test_rejects_go_to_reject_stream(self):
+        """Test NOMATCH and error lines are kept out of the main stream"""
+        stream = io.StringIO()
+        rejects = io.StringIO()
+        writer = output_writers.CsvWriter(stream, rejects)
+        writer.write_reject('1950 garbage')
+        writer.write_error('Error processing line: 1951 junk')
+        writer.flush()
+        self.assertEqual(stream.getvalue(), '')
+        self.assertEqual(rejects.getvalue(), 'NOMATCH - 1950 garbage\nError processing line: 1951 junk\n')
+
+    def test_sink_writes_in_chunks(self):
+        """Test the sink holds rows until the chunk size is reached or it is flushed"""
+        stream = io.StringIO()
+        sink = output_writers.OutputSink(stream, chunk_size=10)
+        sink.write('abc\n')
+        self.assertEqual(stream.getvalue(), '')
+        sink.write('defghij\n')
+        self.assertEqual(stream.getvalue(), 'abc\ndefghij\n')
+        sink.write('k\n')
+        sink.flush()
+        self.assertEqual(stream.getvalue(), 'abc\ndefghij\nk\n')
+
+    def test_sink_line_buffered(self):
+        """Test line buffered sinks write every row immediately"""
+        stream = io.StringIO()
+        sink = output_writers.OutputSink(stream, line_buffered=True)
+        sink.write('abc\n')
+        self.assertEqual(stream.getvalue(), 'abc\n')
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -1,7 +1,7 @@
 import unittest
 import process_locations
-# Set validate_mode to True in the process_locations module
-process_locations.validate_mode = True
+# Turn on debug output for the default parser context
+process_locations.DEFAULT_CONTEXT.validate = True
 from process_locations import handle_started_work, handle_workers_meeting, handle_special_meeting, handle_photo, handle_workers_list, handle_location_only, handle_convention, text_fixes, get_state_country
 from countries_data import countries
 
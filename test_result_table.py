@@ -0,0 +1,55 @@
+import io
+import unittest
+
+from result_table import ResultTable, format_summary
+
+
+class TestResultTable(unittest.TestCase):
+    def setUp(self):
+        self.table = ResultTable()
+        self.table.append('Marion Crawford', '1950', 'Convention', 'Canada', 'Alberta', 'Calgary', 'Convention')
+        self.table.append('Marion Crawford', '1951-1953', 'Workers List', 'Canada', 'Alberta', 'Calgary', 'Workers List')
+        self.table.append('Marion Crawford', '1954', None)
+        self.table.append('Robert Flippo', '1960', 'Convention', 'United States', 'Oregon', 'Boring 1', 'Convention')
+
+    def test_count_by_type(self):
+        """Test matched rows are counted per type"""
+        self.assertEqual(self.table.count_by_type(), {'Convention': 2, 'Workers List': 1})
+
+    def test_count_by_place(self):
+        """Test matched rows are counted per country/state/location"""
+        self.assertEqual(self.table.count_by_place(), {
+            ('Canada', 'Alberta', 'Calgary'): 2,
+            ('United States', 'Oregon', 'Boring 1'): 1,
+        })
+
+    def test_unmatched_rate_by_perp(self):
+        """Test unmatched rate per perp"""
+        rates = self.table.unmatched_rate_by_perp()
+        self.assertEqual(rates['Marion Crawford'][:2], (1, 3))
+        self.assertAlmostEqual(rates['Marion Crawford'][2], 1 / 3)
+        self.assertEqual(rates['Robert Flippo'], (0, 1, 0.0))
+
+    def test_dictionary_encoding(self):
+        """Test repeated strings are stored once"""
+        self.assertEqual(len(self.table.countries), 3)  # '', Canada, United States
+        self.assertEqual(self.table.location[0], self.table.location[1])
+        self.assertEqual(self.table.year_range(), (1950, 1960))
+
+    def test_from_pipe_output(self):
+        """Test loading a table from pipe delimited output"""
+        output = ("Status|Perp Name|Year|Type|Country|State|Location|Note|Start Date|End Date|Month|Original Text|Fixed Text\n"
+                  "MATCHED|Marion Crawford|1950|Convention|Canada|Alberta|Calgary|Convention||||x|x\n")
+        table = ResultTable.from_pipe_output(io.StringIO(output))
+        self.assertEqual(table.count_by_country(), {'Canada': 1})
+        summary = format_summary(table)
+        self.assertIn('Convention', summary)
+        # Saved output has no NOMATCH rows, so no unmatched figures are printed
+        self.assertFalse(table.tracks_unmatched)
+        self.assertNotIn('Unmatched rate', summary)
+        self.assertIn('Matched rows: 1', summary)
+        self.assertIn('Unmatched rate', format_summary(self.table))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import io
+import os
+import tempfile
+import unittest
+
+from rollup import Rollup
+
+OUTPUT = ("Status|Perp Name|Year|Type|Country|State|Location|Note|Start Date|End Date|Month|Original Text|Fixed Text\n"
+          "MATCHED|Jane Doe|1950-1952|Convention|Canada|Saskatchewan|Regina||||||\n"
+          "MATCHED|John Roe|1955|Workers List|Canada|Saskatchewan|Assiniboia||||||\n"
+          "MATCHED|John Roe|1949|Visit|Canada|Alberta|Calgary||||||\n"
+          "MATCHED|Jane Doe|1960|Visit|United States|Texas|Dallas||||||\n")
+
+
+class TestRollup(unittest.TestCase):
+    def setUp(self):
+        self.rollup = Rollup.from_pipe_output(io.StringIO(OUTPUT))
+
+    def test_counts_perps_and_years(self):
+        """Test every level holds its rows, perps and year range"""
+        saskatchewan = self.rollup.node(('Canada', 'Saskatchewan'))
+        self.assertEqual(saskatchewan.count, 2)
+        self.assertEqual(self.rollup.perps_of(saskatchewan.perps), ['Jane Doe', 'John Roe'])
+        self.assertEqual((saskatchewan.first_year, saskatchewan.last_year), (1950, 1955))
+        canada = self.rollup.node(('Canada',))
+        self.assertEqual((canada.count, canada.first_year), (3, 1949))
+        self.assertEqual(self.rollup.root.count, 4)
+        self.assertIsNone(self.rollup.node(('Canada', 'Manitoba')))
+        self.assertEqual([path for path, _ in self.rollup.walk('state')],
+                         [('Canada', 'Alberta'), ('Canada', 'Saskatchewan'), ('United States', 'Texas')])
+
+    def test_batch_columns(self):
+        """Test process_text_patterns_batch columns skip NOMATCH and error rows"""
+        rollup = Rollup()
+        rollup.append_batch('Jane Doe', {'year': ['1950', '1951', '1952'], 'type': ['Visit', None, 'Visit'],
+                                         'error': [None, None, 'boom'], 'country': ['Canada', None, 'Canada'],
+                                         'state': ['Alberta', None, 'Alberta'], 'location': ['Calgary', None, 'Calgary']})
+        self.assertEqual(rollup.node(('Canada', 'Alberta', 'Calgary')).count, 1)
+
+    def test_save_and_load(self):
+        """Test a saved rollup gets the umask default mode and loads back the same"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'rollup.json')
+            umask = os.umask(0o022)
+            try:
+                self.rollup.save(path)
+            finally:
+                os.umask(umask)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+            loaded = Rollup.load(path)
+        self.assertEqual(loaded.to_json(), self.rollup.to_json())
+        self.assertEqual(loaded.perps_of(loaded.node(('United States',)).perps), ['Jane Doe'])
+
+    def test_source_parsed_again_replaces_its_rows(self):
+        """Test a source added again is not counted twice and survives save and load"""
+        def columns(years, locations):
+            return {'year': years, 'type': ['Visit'] * len(years), 'error': [None] * len(years),
+                    'country': ['Canada'] * len(years), 'state': ['Alberta'] * len(years), 'location': locations}
+
+        rollup = Rollup()
+        rollup.append_batch('Jane Doe', columns(['1950', '1951'], ['Calgary', 'Banff']), source='jane_from_txt.txt')
+        rollup.append_batch('John Roe', columns(['1960'], ['Calgary']), source='john_from_txt.txt')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'rollup.json')
+            rollup.save(path)
+            rollup = Rollup.load(path)
+        rollup.append_batch('Jane Doe', columns(['1955'], ['Calgary']), source='jane_from_txt.txt')
+
+        expected = Rollup()
+        expected.append_batch('Jane Doe', columns(['1955'], ['Calgary']), source='jane_from_txt.txt')
+        expected.append_batch('John Roe', columns(['1960'], ['Calgary']), source='john_from_txt.txt')
+        self.assertEqual(rollup.root.to_json(), expected.root.to_json())
+        calgary = rollup.node(('Canada', 'Alberta', 'Calgary'))
+        self.assertEqual((calgary.count, calgary.first_year, calgary.last_year), (2, 1955, 1960))
+        self.assertIsNone(rollup.node(('Canada', 'Alberta', 'Banff')))
+
+    def test_remove_source_matches_rebuild(self):
+        """Test taking sources out leaves the same tree as adding only the others"""
+        import random
+        rng = random.Random(7)
+        places = [('Canada', 'Alberta', 'Calgary'), ('Canada', 'Alberta', 'Banff'), ('Canada', 'Alberta', ''),
+                  ('Canada', '', ''), ('United States', 'Texas', 'Dallas'), ('', '', '')]
+        rows = {source: [(rng.choice(['Jane Doe', 'John Roe', 'Ann Poe']), str(rng.randint(1940, 1990)),
+                          *rng.choice(places)) for _ in range(rng.randint(1, 8))]
+                for source in ('a.txt', 'b.txt', 'c.txt', 'd.txt')}
+
+        rollup = Rollup()
+        for source, source_rows in rows.items():
+            for row in source_rows:
+                rollup.add(*row, source=source)
+        for removed in ('b.txt', 'd.txt'):
+            self.assertTrue(rollup.remove_source(removed))
+        self.assertFalse(rollup.remove_source('b.txt'))
+
+        expected = Rollup()
+        for perp in rollup.perp_names:
+            expected.perp_bit(perp)
+        for source in ('a.txt', 'c.txt'):
+            for row in rows[source]:
+                expected.add(*row, source=source)
+        self.assertEqual(rollup.to_json(), expected.to_json())
+        self.assertEqual(Rollup.from_json(rollup.to_json()).to_json(), expected.to_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
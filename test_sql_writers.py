@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from sql_writers import CopyFileWriter, SqlFileWriter, copy_value, sql_literal
+
+
+class TestSqlWriters(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'out.sql')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_literals(self):
+        """Test SQL literals and COPY fields are escaped"""
+        self.assertEqual(sql_literal("O'Brien"), "'O''Brien'")
+        self.assertEqual(sql_literal(None), 'NULL')
+        self.assertEqual(copy_value(None), '\\N')
+        self.assertEqual(copy_value('a\tb\nc\\d'), 'a\\tb\\nc\\\\d')
+        self.assertEqual(copy_value("O'Brien"), "O'Brien")
+
+    def test_sql_writer_batches_rows(self):
+        """Test rows for the same table are batched into one INSERT"""
+        with SqlFileWriter(self.path, batch_size=2) as sql:
+            sql.insert('s.t', ('a', 'b'), (1, 'x'))
+            sql.insert('s.t', ('a', 'b'), (2, None))
+            sql.insert('s.t', ('a', 'b'), (3, 'z'))
+        self.assertEqual(self.read(), "INSERT INTO s.t (a, b) VALUES\n(1, 'x'),\n(2, NULL);\n"
+                                      "INSERT INTO s.t (a, b) VALUES (3, 'z');\n")
+
+    def test_copy_writer_blocks(self):
+        """Test rows go into one COPY block per table that is ended before other output"""
+        with CopyFileWriter(self.path) as copy:
+            copy.insert('s.t', ('a', 'note'), (1, 'tab\there'))
+            copy.insert('s.t', ('a', 'note'), (2, None))
+            copy.write_line('-- done with t')
+            copy.insert('s.u', ('a',), (3,))
+        self.assertEqual(self.read(), "COPY s.t (a, note) FROM STDIN;\n1\ttab\\there\n2\t\\N\n\\.\n"
+                                      "-- done with t\n"
+                                      "COPY s.u (a) FROM STDIN;\n3\n\\.\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from fuzzy_index import FuzzyIndex
+from unmatched_report import BoundedCounter, UnmatchedReport, line_template
+
+
+class TestUnmatchedReport(unittest.TestCase):
+    def test_line_template(self):
+        """Test numbers, months, seasons and parenthesized text become placeholders"""
+        self.assertEqual(line_template('Jan 5-7 Convention (Calgary)'), '<MONTH> #-# Convention (...)')
+        self.assertEqual(line_template('Spring  Visited (Banff'), '<SEASON> Visited (...)')
+
+    def test_bounded_counter_keeps_capacity(self):
+        """Test the counter never holds more than capacity keys and keeps the frequent ones"""
+        counter = BoundedCounter(capacity=2)
+        for key in ['a', 'a', 'a', 'b', 'c', 'd', 'a', 'e']:
+            counter.add(key)
+        self.assertLessEqual(len(counter.counts), 2)
+        self.assertEqual(counter.most_common(1)[0][0], 'a')
+        self.assertEqual(counter.total, 8)
+
+    def test_report(self):
+        """Test templates are counted together and misspelled words are listed with the closest name"""
+        fuzzy = FuzzyIndex.from_countries({'Canada': {'states': ['Alberta'], 'cities': {'Claresholm': ['Alberta']}}})
+        report = UnmatchedReport(fuzzy)
+        report.add('Jan 5 Charesholm (x)')
+        report.add('Feb 10 Charesholm (y)')
+        report.add('Qwerty Alberta')
+        text = report.format()
+        self.assertIn('       2  <MONTH> # Charesholm (...)', text)
+        self.assertIn('       2  Charesholm -> Claresholm (city, Canada, distance 1)', text)
+        self.assertNotIn('Qwerty ->', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""End of run triage report for the lines process_locations.py could not
+resolve: NOMATCH lines and lines that did not resolve to a gazetteer city.
+
+Each unresolved line is reduced to a template (numbers, months, seasons and
+parenthesized text replaced by placeholders) so lines that need the same fix
+are counted together.  The capitalized words of the lines that are not
+gazetteer names are counted as well and listed with the closest gazetteer
+name, which is usually the text_fixes or countries_data.py entry that would
+resolve them.
+
+Counting uses the Misra-Gries algorithm, so no matter how many distinct
+templates a corpus has only `capacity` of them are held in memory.  Counts
+are exact until that many distinct keys have been seen and lower bounds
+after that, which is plenty for picking the fixes that cover the most rows.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from fuzzy_index import FuzzyIndex, candidate_terms
+
+DEFAULT_CAPACITY = 1000
+
+_MONTH = (r'(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?'
+          r'|Sept?(?:ember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\b\.?')
+_SEASON = r'(?:Spring|Summer|Autumn|Fall|Winter)\b'
+_PARENS = re.compile(r'\([^)]*\)?')
+_MONTHS = re.compile(r'\b' + _MONTH)
+_SEASONS = re.compile(r'\b' + _SEASON)
+_NUMBERS = re.compile(r'\d+')
+_SPACES = re.compile(r'\s+')
+
+
+def line_template(text: str) -> str:
+    """Reduce a line to its shape, e.g. 'Jan 5-7 Convention (Calgary)' -> '<MONTH> #-# Convention (...)'."""
+    text = _PARENS.sub('(...)', text)
+    text = _MONTHS.sub('<MONTH>', text)
+    text = _SEASONS.sub('<SEASON>', text)
+    text = _NUMBERS.sub('#', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+class BoundedCounter:
+    """Misra-Gries frequent item counter holding at most capacity keys.
+
+    When a new key arrives and the counter is full every count is decreased
+    by one and the keys that reach zero are dropped, so each key's count is
+    a lower bound that is off by at most total / capacity.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        self.decrements = 0  # how many times every count was decreased
+        self.counts: Dict[str, int] = {}
+        self.examples: Dict[str, str] = {}
+
+    def add(self, key: str, example: Optional[str] = None) -> None:
+        self.total += 1
+        if key in self.counts:
+            self.counts[key] += 1
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[key] = 1
+            if example is not None:
+                self.examples[key] = example
+            return
+        self.decrements += 1
+        for other in list(self.counts):
+            self.counts[other] -= 1
+            if not self.counts[other]:
+                del self.counts[other]
+                self.examples.pop(other, None)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        items = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return items if n is None else items[:n]
+
+
+class UnmatchedReport:
+    """Collects unresolved lines during a run and renders the triage report."""
+
+    def __init__(self, fuzzy: Optional[FuzzyIndex] = None, capacity: int = DEFAULT_CAPACITY):
+        self.fuzzy = fuzzy
+        self.templates = BoundedCounter(capacity)
+        self.tokens = BoundedCounter(capacity)
+
+    def __len__(self) -> int:
+        return self.templates.total
+
+    def add(self, text: str) -> None:
+        """Record the text after the year of an unresolved line."""
+        self.templates.add(line_template(text), text)
+        if self.fuzzy is None:
+            return
+        terms = list(candidate_terms(text))
+        exact = {term.lower() for term in terms if term in self.fuzzy}
+        for term in terms:
+            # Only count runs that are not, and do not contain, a gazetteer name
+            if term.lower() in exact or any(word.lower() in exact for word in term.split()):
+                continue
+            self.tokens.add(term)
+
+    def nearest(self, term: str) -> str:
+        """Closest gazetteer name for term, or '-'."""
+        if self.fuzzy is None:
+            return '-'
+        matches = self.fuzzy.lookup(term)
+        if not matches:
+            return '-'
+        (name, kind, country), distance = matches[0]
+        return f"{name} ({kind}, {country}, distance {distance})"
+
+    def format(self, top: int = 20) -> str:
+        """Render the report as text."""
+        lines = [f"Unresolved lines: {self.templates.total}  Templates: {len(self.templates.counts)}"
+                 + ("  (counts are lower bounds)" if self.templates.decrements else '')]
+
+        lines.append(f"\nTop {top} unresolved line templates:")
+        for template, count in self.templates.most_common(top):
+            lines.append(f"  {count:>8}  {template}")
+            example = self.templates.examples.get(template)
+            if example and example != template:
+                lines.append(f"            e.g. {example}")
+
+        if self.fuzzy is not None:
+            lines.append(f"\nTop {top} unresolved words close to a gazetteer name:")
+            listed = 0
+            for term, count in self.tokens.most_common():
+                nearest = self.nearest(term)
+                if nearest == '-':
+                    continue
+                lines.append(f"  {count:>8}  {term} -> {nearest}")
+                listed += 1
+                if listed == top:
+                    break
+
+        return '\n'.join(lines) + '\n'